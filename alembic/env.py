@@ -56,7 +56,11 @@ def run_migrations_offline() -> None:
 
 
 def run_migrations_online():
-    connectable = create_engine(os.getenv("ALEMBIC_DB_URL", "sqlite:///./database.db"))
+    # the app passes the database it serves, the command line uses ALEMBIC_DB_URL
+    url = config.attributes.get("url") or os.getenv(
+        "ALEMBIC_DB_URL", "sqlite:///./database.db"
+    )
+    connectable = create_engine(url)
 
     with connectable.connect() as connection:
         context.configure(connection=connection, target_metadata=target_metadata)
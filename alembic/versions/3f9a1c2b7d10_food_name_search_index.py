@@ -0,0 +1,73 @@
+"""food name search index
+
+Revision ID: 3f9a1c2b7d10
+Revises:
+Create Date: 2026-10-17 09:12:41.203118
+
+SQLite gets an external-content FTS5 table with the trigram tokenizer, kept in
+sync with the food table by triggers; Postgres gets a pg_trgm GIN index.
+The food table itself is created by create_db_and_tables() before migrations run;
+on a database without it (ALEMBIC_DB_URL pointing elsewhere) there is nothing
+to index and the upgrade does nothing.
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9a1c2b7d10"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+food_table = os.environ.get("FOOD_TABLE_NAME", "testfood")
+fts_table = f"{food_table}_fts"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table(food_table):
+        return
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"name, content='{food_table}', content_rowid='rowid', "
+            "tokenize='trigram')"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {food_table} "
+            f"BEGIN INSERT INTO {fts_table}(rowid, name) VALUES (new.rowid, new.name); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {food_table} "
+            f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+            "VALUES ('delete', old.rowid, old.name); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au "
+            f"AFTER UPDATE OF name ON {food_table} "
+            f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+            "VALUES ('delete', old.rowid, old.name); "
+            f"INSERT INTO {fts_table}(rowid, name) VALUES (new.rowid, new.name); END"
+        )
+        op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{food_table}_name_trgm "
+            f"ON {food_table} USING gin (name gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts_table}")
+    elif dialect == "postgresql":
+        op.execute(f"DROP INDEX IF EXISTS ix_{food_table}_name_trgm")
@@ -0,0 +1,46 @@
+"""food nutrient indexes
+
+Revision ID: 8c4e2a9f5b31
+Revises: 3f9a1c2b7d10
+Create Date: 2026-10-17 11:40:05.771904
+
+Every nutrient range accepted by get_foodlist leads one of these indexes, the
+trailing columns let the other ranges be checked without touching the table.
+Like the search index, nothing to do on a database without the food table.
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4e2a9f5b31"
+down_revision: Union[str, None] = "3f9a1c2b7d10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+food_table = os.environ.get("FOOD_TABLE_NAME", "testfood")
+
+indexes = {
+    f"ix_{food_table}_calories_protein_carbohydrate": [
+        "calories",
+        "protein",
+        "total_carbohydrate",
+    ],
+    f"ix_{food_table}_protein_carbohydrate": ["protein", "total_carbohydrate"],
+    f"ix_{food_table}_carbohydrate": ["total_carbohydrate"],
+}
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table(food_table):
+        return
+    for name, columns in indexes.items():
+        op.create_index(name, food_table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name in indexes:
+        op.drop_index(name, table_name=food_table, if_exists=True)
@@ -0,0 +1,119 @@
+"""food name search on food_id
+
+Revision ID: d6c557ec2a7e
+Revises: 8c4e2a9f5b31
+Create Date: 2026-10-17 14:22:10.418503
+
+The FTS5 table was keyed on the implicit rowid of the food table, whose
+primary key is TEXT, so a VACUUM (or any rebuild of the table) could renumber
+the rows under the index and searches would return the wrong foods. The names
+now live in a side table with an INTEGER PRIMARY KEY, which SQLite never
+renumbers, next to the food_id they belong to; the FTS table indexes that one
+and searches join back on food_id. Postgres indexes the column itself and
+has nothing to change.
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d6c557ec2a7e"
+down_revision: Union[str, None] = "8c4e2a9f5b31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+food_table = os.environ.get("FOOD_TABLE_NAME", "testfood")
+fts_table = f"{food_table}_fts"
+names_table = f"{food_table}_names"
+
+
+def drop_search(suffixes: tuple) -> None:
+    for suffix in suffixes:
+        op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+    op.execute(f"DROP TABLE IF EXISTS {fts_table}")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite" or not sa.inspect(bind).has_table(food_table):
+        return
+    drop_search(("ai", "ad", "au"))
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS {names_table} ("
+        "docid INTEGER PRIMARY KEY, food_id TEXT NOT NULL UNIQUE, name TEXT)"
+    )
+    op.execute(
+        f"INSERT INTO {names_table}(food_id, name) "
+        f"SELECT food_id, name FROM {food_table}"
+    )
+    op.execute(
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+        f"name, content='{names_table}', content_rowid='docid', "
+        "tokenize='trigram')"
+    )
+    op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    # food table -> names, by food_id
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_food_ai AFTER INSERT ON {food_table} "
+        f"BEGIN INSERT INTO {names_table}(food_id, name) "
+        "VALUES (new.food_id, new.name); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_food_ad AFTER DELETE ON {food_table} "
+        f"BEGIN DELETE FROM {names_table} WHERE food_id = old.food_id; END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_food_au "
+        f"AFTER UPDATE OF food_id, name ON {food_table} "
+        f"BEGIN UPDATE {names_table} SET food_id = new.food_id, name = new.name "
+        "WHERE food_id = old.food_id; END"
+    )
+    # names -> FTS, by docid
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {names_table} "
+        f"BEGIN INSERT INTO {fts_table}(rowid, name) VALUES (new.docid, new.name); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {names_table} "
+        f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.docid, old.name); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF name ON {names_table} "
+        f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.docid, old.name); "
+        f"INSERT INTO {fts_table}(rowid, name) VALUES (new.docid, new.name); END"
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite" or not sa.inspect(bind).has_table(food_table):
+        return
+    drop_search(("food_ai", "food_ad", "food_au", "ai", "ad", "au"))
+    op.execute(f"DROP TABLE IF EXISTS {names_table}")
+    # the rowid-keyed index of 3f9a1c2b7d10
+    op.execute(
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+        f"name, content='{food_table}', content_rowid='rowid', "
+        "tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {food_table} "
+        f"BEGIN INSERT INTO {fts_table}(rowid, name) VALUES (new.rowid, new.name); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {food_table} "
+        f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.rowid, old.name); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF name ON {food_table} "
+        f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.rowid, old.name); "
+        f"INSERT INTO {fts_table}(rowid, name) VALUES (new.rowid, new.name); END"
+    )
+    op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
@@ -0,0 +1,87 @@
+"""Helpers shared by the benchmark scripts"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def use_temp_database(name: str = "bench.db") -> str:
+    """Point the app at a throwaway SQLite file.
+    Must be called before anything from `server` or `main` is imported.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="meal-bench-"), name)
+    url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    os.environ["ALEMBIC_DB_URL"] = url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    return path
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of `samples`"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+@contextmanager
+def timed(label: str):
+    """Print how long the block took"""
+    start = time.perf_counter()
+    yield
+    print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def random_food_rows(count: int, seed: int = 0, start: int = 0):
+    """Yield plain dicts for inserting `count` synthetic foods"""
+    rng = random.Random(seed)
+    for i in range(start, start + count):
+        protein = rng.uniform(0, 60)
+        carbohydrate = rng.uniform(0, 90)
+        fat = rng.uniform(0, 50)
+        yield {
+            # valid UUIDs that sort in insertion order
+            "food_id": f"{seed:08x}-0000-4000-8000-{i:012d}",
+            "name": f"food {i}",
+            "brand": f"brand {i % 997}",
+            "weight": 100.0,
+            "calories": round(4 * protein + 4 * carbohydrate + 9 * fat),
+            "protein": protein,
+            "total_carbohydrate": carbohydrate,
+            "total_fat": fat,
+            "sodium": rng.uniform(0, 2000) if rng.random() > 0.2 else None,
+        }
+
+
+def bulk_insert(engine, table, rows, batch_size: int = 50_000) -> int:
+    """Insert an iterable of dicts with multi-row executemany batches"""
+    total = 0
+    batch = []
+    with engine.begin() as conn:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.execute(table.insert(), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.execute(table.insert(), batch)
+            total += len(batch)
+    return total
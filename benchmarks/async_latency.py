@@ -0,0 +1,153 @@
+"""p99 latency of the food endpoints under many concurrent clients.
+
+Serves the FastAPI app with uvicorn on a background thread of this process and
+drives it from 200 client connections, once with the async sessions the
+handlers use now and once with a blocking session adapter that reproduces the
+old behaviour (sync queries executed right on the event loop). The clients
+live on their own event loop so a blocked server loop shows up as latency.
+
+    python -m benchmarks.async_latency --clients 200 --requests 20
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+from uuid import uuid4
+
+from benchmarks._common import summarize, use_temp_database
+
+use_temp_database("async_latency.db")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from main import app  # noqa: E402
+from server.database import (  # noqa: E402
+    FoodDB,
+    create_db_and_tables,
+    engine,
+    get_session,
+)
+from server.replicas import get_read_session  # noqa: E402
+from server.router import food_cache  # noqa: E402
+
+
+class BlockingSession:
+    """Async-looking wrapper around a sync Session, i.e. the pre-async handlers"""
+
+    def __init__(self, session: Session):
+        self._session = session
+        self.bind = session.bind
+
+    def add(self, instance):
+        self._session.add(instance)
+
+    async def exec(self, statement):
+        return self._session.exec(statement)
+
+    async def get(self, entity, ident):
+        return self._session.get(entity, ident)
+
+    async def commit(self):
+        self._session.commit()
+
+    async def refresh(self, instance):
+        self._session.refresh(instance)
+
+    async def delete(self, instance):
+        self._session.delete(instance)
+
+
+async def get_blocking_session():
+    with Session(engine) as session:
+        yield BlockingSession(session)
+
+
+def seed(rows: int) -> list:
+    create_db_and_tables()
+    ids = [str(uuid4()) for _ in range(rows)]
+    with Session(engine) as session:
+        session.add_all(
+            FoodDB(
+                food_id=food_id,
+                name=f"food {i}",
+                brand=f"brand {i % 50}",
+                calories=random.randint(0, 900),
+                protein=random.uniform(0, 80),
+            )
+            for i, food_id in enumerate(ids)
+        )
+        session.commit()
+    return ids
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int) -> tuple:
+    """Start uvicorn on a background thread and wait until it accepts requests"""
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+async def run(ids: list, port: int, clients: int, requests: int) -> list:
+    base_url = f"http://127.0.0.1:{port}"
+    samples = []
+
+    async def client(client_no: int):
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as c:
+            for n in range(requests):
+                # every 10th request is an unindexed search, the rest point lookups
+                if (client_no + n) % 10 == 0:
+                    url, params = "/api/food/get", {"name": "od 9", "limit": 50}
+                else:
+                    url, params = f"/api/food/get/{random.choice(ids)}", None
+                start = time.perf_counter()
+                await c.get(url, params=params)
+                samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    ids = seed(args.rows)
+    for label, write, read in (
+        ("blocking", get_blocking_session, get_blocking_session),
+        ("async", get_session, get_read_session),
+    ):
+        # the GET routes read through get_read_session
+        app.dependency_overrides[get_session] = write
+        app.dependency_overrides[get_read_session] = read
+        # point lookups served from the cache would never touch the session
+        food_cache.clear()
+        port = free_port()
+        server, thread = serve(port)
+        samples = asyncio.run(run(ids, port, args.clients, args.requests))
+        server.should_exit = True
+        thread.join()
+        print(label, summarize(samples))
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""CPU cost against bytes saved of each encoding and level, on a page of
+GET /api/food/get and on the full GET /api/food/export.
+
+The responses are captured once from the app, then fed through the
+middleware's encoders chunk by chunk, flushing after every chunk as it
+does, so the CPU time is compression's alone.
+
+python -m benchmarks.compression --rows 100000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks._common import bulk_insert, random_food_rows, use_temp_database
+
+use_temp_database("compression.db")
+
+from main import app  # noqa: E402
+from server.compression import ENCODERS, ENCODINGS  # noqa: E402
+from server.database import (
+    FoodDB,
+    async_engine,
+    create_db_and_tables,
+    engine,
+)  # noqa: E402
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 6), "zstd": (1, 3, 9)}
+TARGETS = {
+    "page": ("/api/food/get", b"limit=100"),
+    "export": ("/api/food/export", b"format=ndjson"),
+}
+
+
+async def response_chunks(path: str, query: bytes) -> list:
+    """The body messages of an uncompressed response"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"identity")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+        "root_path": "",
+    }
+    chunks = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:  # the client never disconnects
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return chunks
+
+
+def encode(chunks: list, encoding: str, level: int) -> int:
+    """Bytes sent for `chunks`, flushed like CompressionMiddleware does"""
+    encoder = ENCODERS[encoding](level)
+    size = 0
+    for chunk in chunks[:-1]:
+        size += len(encoder.compress(chunk)) + len(encoder.flush())
+    return size + len(encoder.compress(chunks[-1])) + len(encoder.finish())
+
+
+def measure(chunks: list, encoding: str, level: int, repeat: int) -> tuple:
+    """(bytes sent, CPU seconds per response)"""
+    start = time.process_time()
+    for _ in range(repeat):
+        size = encode(chunks, encoding, level)
+    return size, (time.process_time() - start) / repeat
+
+
+async def capture() -> dict:
+    try:
+        return {
+            target: await response_chunks(path, query)
+            for target, (path, query) in TARGETS.items()
+        }
+    finally:
+        await async_engine.dispose()
+
+
+def run(repeat: int):
+    for target, chunks in asyncio.run(capture()).items():
+        plain = sum(map(len, chunks))
+        print(f"{target}: {plain / 1024:.1f} KiB in {len(chunks)} chunks")
+        times = repeat if target == "page" else max(1, repeat // 10)
+        for encoding in ENCODINGS:
+            for level in LEVELS[encoding]:
+                size, cpu = measure(chunks, encoding, level, times)
+                saved = (plain - size) / 2**20
+                print(
+                    f"  {encoding:>4} {level}: {size / 1024:>9.1f} KiB "
+                    f"({size / plain:>5.1%}) {cpu * 1000:>8.2f} ms CPU, "
+                    f"{saved / cpu:>5.0f} MiB saved per CPU s"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    bulk_insert(engine, FoodDB.__table__, random_food_rows(args.rows))
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
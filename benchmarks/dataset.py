@@ -0,0 +1,432 @@
+"""Seeded synthetic foods and users, bulk loaded into the configured database.
+
+Loads into DATABASE_URL (server/database.py) rather than a temp file, so
+point it (and ALEMBIC_DB_URL) at the database to fill:
+
+    export DATABASE_URL=sqlite:///big.db ALEMBIC_DB_URL=sqlite:///big.db
+    python -m benchmarks.dataset --foods 1000000 --users 10000
+
+The same seed gives the same rows, and the first N rows are the same
+whatever the total. Foods follow per-category nutrient profiles: the macros
+of a row scale together, calories follow from them, sugars and fiber stay
+within the carbohydrates and micronutrients mostly show up only on
+"detailed" labels. Names come from a limited vocabulary, so popular ones
+repeat across brands, and a few products are listed twice. Users share a
+single password, hashed once.
+"""
+
+import argparse
+import time
+import uuid
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+# rows generated per seeded block, keeps the output independent of batch sizes
+CHUNK_ROWS = 10_000
+BRANDS = 2000
+DUPLICATE_SHARE = 0.03
+DETAILED_LABEL_SHARE = 0.3
+
+
+class Category(NamedTuple):
+    share: float
+    protein: float  # typical grams per 100 g
+    carbohydrate: float
+    fat: float
+    sugar_share: float  # of the carbohydrates
+    fiber_share: float
+    saturated_share: float  # of the fat
+    cholesterol: float  # mg per g protein
+    sodium: float  # median mg per 100 g
+    serving: float  # grams
+    bases: tuple
+    forms: tuple
+    rich_in: tuple = ()
+    flavours: tuple = ()
+
+
+# fmt: off
+SAVOURY = (
+    "Garlic", "Herb", "Chilli", "Lemon", "Pepper", "BBQ", "Smoky", "Spicy",
+    "Mediterranean", "Italian", "Mexican", "Thai", "Indian", "Cajun",
+    "Teriyaki", "Sesame", "Ginger", "Basil", "Tomato", "Cheese", "Onion",
+    "Mustard", "Truffle", "Rosemary", "Paprika",
+)
+SWEET = (
+    "Honey", "Maple", "Cinnamon", "Coconut", "Mint", "Orange", "Cherry",
+    "Apple", "Berry", "Peanut", "Almond", "Hazelnut", "Cocoa", "Vanilla",
+    "Mango", "Lemon", "Ginger", "Caramel",
+)
+
+CATEGORIES = (
+    Category(
+        0.12, 6, 6, 5, 0.8, 0.0, 0.62, 3.0, 80, 150,
+        ("Greek Yogurt", "Milk", "Cheddar", "Mozzarella", "Cottage Cheese",
+         "Kefir", "Butter", "Cream Cheese", "Skyr"),
+        ("Plain", "Low Fat", "Whole", "Sliced", "Shredded", "Light"),
+        ("calcium", "vitamin_d", "vitamin_b12", "phosphorus", "iodine"),
+        flavours=SWEET,
+    ),
+    Category(
+        0.12, 22, 1, 12, 0.5, 0.0, 0.38, 3.5, 450, 120,
+        ("Chicken Breast", "Beef Mince", "Pork Sausages", "Turkey Slices",
+         "Bacon", "Ham", "Meatballs", "Lamb Chops", "Salami"),
+        ("Smoked", "Grilled", "Cooked", "Raw", "Roasted", "Thin Cut"),
+        ("iron", "zinc", "vitamin_b12", "niacin", "selenium"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.06, 20, 0.5, 6, 0.3, 0.0, 0.22, 3.0, 350, 125,
+        ("Salmon Fillet", "Tuna", "Cod", "Sardines", "Mackerel", "Prawns",
+         "Fish Fingers"),
+        ("in Brine", "in Olive Oil", "Smoked", "Frozen", "Canned", "Fresh"),
+        ("vitamin_d", "selenium", "iodine", "vitamin_b12", "fluoride"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.14, 10, 65, 4, 0.08, 0.1, 0.2, 0.0, 400, 60,
+        ("Bread", "Rolled Oats", "Pasta", "Basmati Rice", "Bagels", "Crackers",
+         "Granola", "Tortillas", "Couscous", "Cornflakes"),
+        ("Wholegrain", "White", "Multigrain", "Gluten Free", "Sourdough",
+         "High Fibre"),
+        ("thiamin", "niacin", "iron", "magnesium", "folate", "vitamin_b1"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.1, 0.8, 13, 0.3, 0.75, 0.15, 0.15, 0.0, 2, 120,
+        ("Apple", "Banana", "Orange Juice", "Blueberries", "Mango", "Grapes",
+         "Dried Apricots", "Strawberries", "Fruit Salad"),
+        ("Fresh", "Frozen", "Dried", "Pressed", "Organic", "Sliced"),
+        ("vitamin_c", "potassium", "folate"),
+        flavours=SWEET,
+    ),
+    Category(
+        0.1, 2.5, 7, 0.4, 0.4, 0.35, 0.15, 0.0, 30, 100,
+        ("Broccoli", "Spinach", "Carrots", "Sweet Potato", "Peas", "Kale",
+         "Tomatoes", "Mixed Vegetables", "Peppers"),
+        ("Fresh", "Frozen", "Steamed", "Chopped", "Canned", "Baby"),
+        ("vitamin_a", "vitamin_k", "vitamin_c", "folate", "potassium"),
+    ),
+    Category(
+        0.06, 8, 20, 2, 0.1, 0.35, 0.15, 0.0, 250, 130,
+        ("Chickpeas", "Lentils", "Kidney Beans", "Black Beans", "Hummus",
+         "Tofu", "Baked Beans", "Edamame"),
+        ("Canned", "Dried", "Organic", "Spiced", "Smoked", "Reduced Salt"),
+        ("iron", "folate", "magnesium", "potassium", "zinc"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.07, 20, 18, 50, 0.25, 0.45, 0.12, 0.0, 10, 30,
+        ("Almonds", "Peanut Butter", "Cashews", "Walnuts", "Mixed Nuts",
+         "Sunflower Seeds", "Chia Seeds", "Pistachios"),
+        ("Roasted", "Salted", "Unsalted", "Crunchy", "Smooth", "Raw"),
+        ("magnesium", "vitamin_e", "phosphorus", "zinc", "selenium"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.12, 6, 58, 25, 0.45, 0.05, 0.45, 0.2, 350, 40,
+        ("Potato Chips", "Chocolate Bar", "Cookies", "Muesli Bar", "Popcorn",
+         "Pretzels", "Wafers", "Tortilla Chips", "Rice Cakes"),
+        ("Sea Salt", "Double Chocolate", "Sour Cream", "Caramel", "Honey",
+         "Sharing Size", "Mini"),
+        flavours=SAVOURY,
+    ),
+    Category(
+        0.07, 0.3, 8, 0.1, 0.95, 0.0, 0.1, 0.0, 10, 330,
+        ("Cola", "Lemonade", "Iced Tea", "Sports Drink", "Energy Drink",
+         "Sparkling Water", "Oat Drink", "Almond Drink"),
+        ("Zero Sugar", "Original", "Diet", "Lime", "Peach", "Unsweetened"),
+        ("calcium", "vitamin_d", "vitamin_b12"),
+        flavours=SWEET,
+    ),
+    Category(
+        0.04, 4, 45, 18, 0.7, 0.02, 0.6, 0.3, 60, 80,
+        ("Ice Cream", "Cheesecake", "Brownie", "Custard", "Muffin",
+         "Chocolate Mousse", "Doughnut"),
+        ("Vanilla", "Salted Caramel", "Chocolate", "Cookies and Cream",
+         "Raspberry", "Light"),
+        flavours=SWEET,
+    ),
+)
+
+ADJECTIVES = (
+    "Organic", "Classic", "Homestyle", "Original", "Premium", "Everyday",
+    "Farmhouse", "Traditional", "Family Pack", "Value", "Finest", "Simply",
+)
+SYLLABLES = (
+    "ar", "bel", "cor", "da", "el", "fen", "gra", "hal", "ix", "jo", "kel",
+    "lu", "mar", "nor", "ol", "pen", "qua", "ros", "sun", "tal", "ul", "ver",
+    "wil", "yor", "zen", "bro", "cre", "dun", "fal", "glen",
+)
+BRAND_SUFFIXES = (
+    "Farms", "Foods", "Kitchen", "Dairy", "& Co", "Naturals", "Bakery",
+    "Harvest", "Provisions", "Market", "", "", "",
+)
+
+# typical amount per 100 g of a detailed label, before the category's boost
+MICRONUTRIENTS = {
+    "chloride": 300, "potassium": 250, "iron": 1.5, "zinc": 1.0,
+    "selenium": 8, "calcium": 60, "iodine": 10, "magnesium": 30,
+    "phosphorus": 120, "fluoride": 20, "vitamin_a": 60, "vitamin_d": 0.5,
+    "vitamin_e": 1.0, "vitamin_k": 10, "thiamin": 0.1, "riboflavin": 0.15,
+    "niacin": 2, "vitamin_b1": 0.1, "vitamin_b6": 0.15, "vitamin_b12": 0.3,
+    "folate": 25, "vitamin_c": 5,
+}
+RICH_BOOST = 4.0
+
+# share of rows without the field, of those that can have it
+NULL_SHARES = {
+    "weight": 0.1, "calories": 0.01, "total_fat": 0.02, "saturated_fat": 0.08,
+    "trans_fat": 0.3, "cholesterol": 0.25, "protein": 0.02,
+    "dietary_fiber": 0.15, "total_carbohydrate": 0.02, "sodium": 0.05,
+    "sugars": 0.1,
+}
+MICRONUTRIENT_NULL_SHARE = 0.35
+
+FIRST_NAMES = (
+    "Ada", "Ben", "Chloe", "Dev", "Elena", "Farah", "Gus", "Hana", "Ivan",
+    "Jia", "Kofi", "Lena", "Mateo", "Nia", "Oscar", "Priya", "Quinn", "Rosa",
+    "Sam", "Tariq", "Uma", "Vera", "Wei", "Ximena", "Yusuf", "Zoe",
+)
+LAST_NAMES = (
+    "Adams", "Brown", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Haddad",
+    "Ito", "Jones", "Kim", "Lopez", "Muller", "Nguyen", "Okafor", "Patel",
+    "Rossi", "Smith", "Tanaka", "Usman", "Varga", "Walker", "Young", "Zhang",
+)
+EMAIL_DOMAINS = ("example.com", "example.org", "example.net")
+# fmt: on
+
+
+def _rng(seed: int, chunk: int, stream: str) -> np.random.Generator:
+    return np.random.default_rng([seed, chunk, sum(map(ord, stream))])
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def brand_names(seed: int = 0) -> list:
+    """BRANDS distinct brand names"""
+    rng = _rng(seed, 0, "brands")
+    names, seen = [], set()
+    while len(names) < BRANDS:
+        a, b = rng.choice(SYLLABLES, 2)
+        suffix = rng.choice(BRAND_SUFFIXES)
+        name = f"{(a + b).title()} {suffix}".strip()
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def _uuids(rng: np.random.Generator, count: int) -> list:
+    raw = rng.bytes(16 * count)
+    return [
+        str(uuid.UUID(bytes=raw[i : i + 16], version=4))
+        for i in range(0, 16 * count, 16)
+    ]
+
+
+def _column(values: np.ndarray, null: np.ndarray, decimals: int = 2) -> list:
+    column = np.round(values, decimals)
+    column = (column.astype(np.int64) if decimals == 0 else column).astype(object)
+    column[null] = None
+    return column.tolist()
+
+
+def _food_chunk(seed: int, chunk: int, count: int, brands: list) -> list:
+    rng = _rng(seed, chunk, "foods")
+    shares = np.array([c.share for c in CATEGORIES])
+    category = rng.choice(len(CATEGORIES), count, p=shares / shares.sum())
+
+    def per_row(field: str) -> np.ndarray:
+        return np.array([getattr(c, field) for c in CATEGORIES])[category]
+
+    def spread(sigma: float) -> np.ndarray:
+        return rng.lognormal(0.0, sigma, count)
+
+    # one density factor shared by the macros makes them move together
+    density = spread(0.3)
+    protein = per_row("protein") * density * spread(0.35)
+    carbohydrate = per_row("carbohydrate") * density * spread(0.3)
+    fat = per_row("fat") * density * spread(0.45)
+    overflow = np.maximum(1.0, (protein + carbohydrate + fat) / 95)
+    protein, carbohydrate, fat = (
+        protein / overflow,
+        carbohydrate / overflow,
+        fat / overflow,
+    )
+
+    values = {
+        "weight": np.round(per_row("serving") * spread(0.3) / 5) * 5,
+        "calories": np.maximum(
+            0, 4 * protein + 4 * carbohydrate + 9 * fat + rng.normal(0, 3, count)
+        ),
+        "protein": protein,
+        "total_carbohydrate": carbohydrate,
+        "total_fat": fat,
+        "saturated_fat": fat * np.minimum(1, per_row("saturated_share") * spread(0.3)),
+        "trans_fat": np.where(
+            rng.random(count) < 0.15, fat * rng.uniform(0, 0.05, count), 0.0
+        ),
+        "cholesterol": protein * per_row("cholesterol") * spread(0.3),
+        "sugars": carbohydrate * np.minimum(1, per_row("sugar_share") * spread(0.4)),
+        "dietary_fiber": carbohydrate
+        * np.minimum(0.9, per_row("fiber_share") * spread(0.4)),
+        "sodium": per_row("sodium") * spread(0.8),
+    }
+    nulls = {name: rng.random(count) < share for name, share in NULL_SHARES.items()}
+
+    detailed = rng.random(count) < DETAILED_LABEL_SHARE
+    for name, typical in MICRONUTRIENTS.items():
+        boost = np.array([RICH_BOOST if name in c.rich_in else 1.0 for c in CATEGORIES])
+        values[name] = typical * boost[category] * density * spread(0.6)
+        nulls[name] = ~detailed | (rng.random(count) < MICRONUTRIENT_NULL_SHARE)
+
+    # names: a common flavour and adjective vocabulary, so names recur
+    base = rng.integers(0, 1 << 30, count)
+    form = rng.integers(0, 1 << 30, count)
+    adjective = rng.integers(0, len(ADJECTIVES), count)
+    with_adjective = rng.random(count) < 0.5
+    flavours = max(len(SAVOURY), len(SWEET))
+    flavour = rng.choice(flavours, count, p=_zipf_weights(flavours))
+    has_flavours = np.array([bool(c.flavours) for c in CATEGORIES])[category]
+    flavoured = has_flavours & (rng.random(count) < 0.35)
+    brand = rng.choice(len(brands), count, p=_zipf_weights(len(brands)))
+    no_brand = rng.random(count) < 0.15
+    names = []
+    for i in range(count):
+        kind = CATEGORIES[category[i]]
+        words = [
+            ADJECTIVES[adjective[i]] if with_adjective[i] else "",
+            kind.flavours[flavour[i] % len(kind.flavours)] if flavoured[i] else "",
+            kind.bases[base[i] % len(kind.bases)],
+        ]
+        names.append(
+            " ".join(w for w in words if w)
+            + f", {kind.forms[form[i] % len(kind.forms)]}"
+        )
+
+    columns = {
+        "food_id": _uuids(rng, count),
+        "name": names,
+        "brand": [None if no_brand[i] else brands[b] for i, b in enumerate(brand)],
+    }
+    for name, column in values.items():
+        null = nulls.get(name, np.zeros(count, bool))
+        # whole kcal, as on labels (and as the importer expects)
+        columns[name] = _column(column, null, 0 if name == "calories" else 2)
+    rows = [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    # the same product listed again with its numbers slightly off
+    for i in np.flatnonzero(rng.random(count) < DUPLICATE_SHARE):
+        if i == 0:
+            continue
+        original = rows[rng.integers(0, i)]
+        rows[i] = {
+            **original,
+            "food_id": rows[i]["food_id"],
+            "calories": (
+                None
+                if original["calories"] is None
+                else round(original["calories"] * 1.02)
+            ),
+        }
+    return rows
+
+
+def food_rows(count: int, seed: int = 0) -> Iterator[dict]:
+    """Yield `count` synthetic FoodDB rows as plain dicts"""
+    brands = brand_names(seed)
+    for chunk, start in enumerate(range(0, count, CHUNK_ROWS)):
+        # whole chunks only, a shorter run must repeat the same random draws
+        rows = _food_chunk(seed, chunk, CHUNK_ROWS, brands)
+        yield from rows[: count - start]
+
+
+def user_rows(
+    count: int, seed: int = 0, password: str = "password", hashed: Optional[str] = None
+) -> Iterator[dict]:
+    """Yield `count` synthetic UserDB rows, all with `password` hashed once"""
+    if hashed is None:
+        from server.database import UserDB
+
+        hashed = UserDB.hash_password(password)
+    for chunk, start in enumerate(range(0, count, CHUNK_ROWS)):
+        rng = _rng(seed, chunk, "users")
+        first = rng.integers(0, len(FIRST_NAMES), CHUNK_ROWS)
+        last = rng.integers(0, len(LAST_NAMES), CHUNK_ROWS)
+        domain = rng.integers(0, len(EMAIL_DOMAINS), CHUNK_ROWS)
+        admin = rng.random(CHUNK_ROWS) < 0.01
+        user_ids = _uuids(rng, CHUNK_ROWS)[: count - start]
+        for i, user_id in enumerate(user_ids):
+            username = (
+                f"{FIRST_NAMES[first[i]]}.{LAST_NAMES[last[i]]}{start + i}".lower()
+            )
+            yield {
+                "user_id": user_id,
+                "username": username,
+                "password": hashed,
+                "email": f"{username}@{EMAIL_DOMAINS[domain[i]]}",
+                "first_name": FIRST_NAMES[first[i]],
+                "last_name": LAST_NAMES[last[i]],
+                "is_admin": bool(admin[i]),
+            }
+
+
+def load(rows: Iterator[dict], table, batch_size: int, label: str) -> int:
+    """Insert `rows` through the configured engine, a transaction per batch"""
+    from server.database import engine
+
+    start = time.perf_counter()
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += _insert(engine, table, batch)
+            batch = []
+            rate = total / (time.perf_counter() - start)
+            print(f"\r{label}: {total:,} rows, {rate:,.0f} rows/s", end="", flush=True)
+    if batch:
+        total += _insert(engine, table, batch)
+    elapsed = time.perf_counter() - start
+    print(
+        f"\r{label}: {total:,} rows in {elapsed:.1f} s, {total / max(elapsed, 1e-9):,.0f} rows/s"
+    )
+    return total
+
+
+def _insert(engine, table, batch: list) -> int:
+    with engine.begin() as conn:
+        conn.execute(table.insert(), batch)
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--password", default="password", help="of every user")
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    from server.database import FoodDB, UserDB, create_db_and_tables
+    from server.startup import migrate_if_needed
+
+    create_db_and_tables()
+    load(food_rows(args.foods, args.seed), FoodDB.__table__, args.batch_size, "foods")
+    users = user_rows(args.users, args.seed, args.password)
+    load(users, UserDB.__table__, args.batch_size, "users")
+    # on a fresh database the search and nutrient indexes are built once,
+    # over the loaded rows, rather than updated with every insert (5x slower)
+    start = time.perf_counter()
+    if migrate_if_needed():
+        print(f"indexes: built in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Throughput and memory of GET /api/food/export over a large food table.
+
+python -m benchmarks.export --rows 1000000
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+
+from benchmarks._common import bulk_insert, random_food_rows, use_temp_database
+
+use_temp_database("export.db")
+
+from main import app  # noqa: E402
+from server.database import (
+    FoodDB,
+    async_engine,
+    create_db_and_tables,
+    engine,
+)  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def export(format: str) -> tuple:
+    """Call the ASGI app directly, httpx's ASGI transport buffers whole bodies"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/food/export",
+        "raw_path": b"/api/food/export",
+        "query_string": f"format={format}".encode(),
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+        "root_path": "",
+    }
+    size = 0
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:  # the client never disconnects
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return size, time.perf_counter() - start
+
+
+async def run(rows: int):
+    try:
+        for format in ("ndjson", "csv"):
+            before = peak_rss_mb()
+            size, elapsed = await export(format)
+            print(
+                f"{format:>6}: {rows / elapsed:>10.0f} rows/s "
+                f"{size / elapsed / 2**20:>7.1f} MiB/s "
+                f"{size / 2**20:>8.1f} MiB, peak RSS {before:.0f} -> {peak_rss_mb():.0f} MiB"
+            )
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    bulk_insert(engine, FoodDB.__table__, random_food_rows(args.rows))
+    asyncio.run(run(args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""Throughput and p50/p95/p99 of every API route under a workload mix.
+
+Drives the app in this process over ASGI, or a running server with --url.
+Each run creates its own users and imports seeded foods (benchmarks.dataset)
+through the API, then `--concurrency` clients pick operations from the mix
+until `--duration` seconds or `--requests` requests are done. Results can be
+saved as a baseline and later runs compared against it: a route whose p95
+grew, or a run whose throughput fell, by more than `--tolerance` fails the
+run, as does any unexpected status.
+
+    python -m benchmarks.load --mix browse --concurrency 32 --duration 10
+    python -m benchmarks.load --mix all --save-baseline load-baseline.json
+    python -m benchmarks.load --mix all --baseline load-baseline.json
+    python -m benchmarks.load --url http://127.0.0.1:8000 --mix login
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from uuid import uuid4
+
+from benchmarks._common import summarize, use_temp_database
+
+PASSWORD = "load-test-password"
+LOGIN_USERS = 8
+MIN_SAMPLES = 20  # fewer samples than this are too noisy to compare
+MIN_REGRESSION_MS = 1.0  # p95 growth below this is noise whatever the ratio
+
+# operation -> weight; every Food, User and Auth route is in at least one
+MIXES = {
+    "browse": {
+        "food.list": 20,
+        "food.search_name": 5,
+        "food.get": 30,
+        "food.batch_get": 5,
+        "food.batch_post": 5,
+        "food.similar": 5,
+        "food.search": 10,
+        "food.stats": 2,
+        "food.popular": 2,
+        "food.plan_totals": 5,
+        "food.plan_optimize": 1,
+        "food.export": 0.2,
+        "user.list": 3,
+        "user.get": 5,
+    },
+    "login": {
+        "auth.login": 70,
+        "auth.login_failed": 10,
+        "user.get": 10,
+        "user.update": 5,
+        "user.add": 5,
+    },
+    "writes": {
+        "food.add": 30,
+        "food.update": 30,
+        "food.delete": 10,
+        "food.import": 5,
+        "food.get": 5,
+        "user.add": 5,
+        "user.update": 10,
+        "user.delete": 5,
+    },
+}
+
+
+@dataclass
+class Context:
+    """What the operations need: the client, test data and the results"""
+
+    client: object
+    food_ids: list
+    user_ids: list
+    usernames: list
+    token: str
+    seed: int
+    latencies: dict = field(default_factory=lambda: defaultdict(list))
+    statuses: dict = field(default_factory=lambda: defaultdict(Counter))
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def new_food(rng: random.Random) -> dict:
+    return {
+        "food_id": str(uuid4()),
+        "name": f"load food {rng.randrange(10**6)}",
+        "weight": 100.0,
+        "calories": rng.uniform(0, 900),
+        "protein": rng.uniform(0, 60),
+    }
+
+
+def new_user(rng: random.Random) -> dict:
+    name = f"load-{uuid4().hex[:12]}"
+    return {
+        "username": name,
+        "password": PASSWORD,
+        "email": f"{name}@example.com",
+        "first_name": "Load",
+        "last_name": str(rng.randrange(1000)),
+    }
+
+
+def _ids(rng: random.Random, ctx: Context, count: int) -> list:
+    return rng.sample(ctx.food_ids, min(count, len(ctx.food_ids)))
+
+
+# each operation returns (method, url, request kwargs, expected statuses),
+# a few run untimed preparation of their own first
+async def food_list(ctx, rng):
+    params = {
+        "limit": 50,
+        **rng.choice([{}, {"min_protein": 5}, {"max_calories": 300}]),
+    }
+    return "GET", "/api/food/get", {"params": params}, (200, 404)
+
+
+async def food_search_name(ctx, rng):
+    params = {"name": rng.choice(["yogurt", "chicken", "oats", "apple"]), "limit": 20}
+    return "GET", "/api/food/get", {"params": params}, (200, 404)
+
+
+async def food_get(ctx, rng):
+    return "GET", f"/api/food/get/{rng.choice(ctx.food_ids)}", {}, (200, 404)
+
+
+async def food_batch_get(ctx, rng):
+    params = {"food_id": _ids(rng, ctx, 20)}
+    return "GET", "/api/food/batch", {"params": params}, (200,)
+
+
+async def food_batch_post(ctx, rng):
+    body = {"food_ids": _ids(rng, ctx, 100)}
+    return "POST", "/api/food/batch", {"json": body}, (200,)
+
+
+async def food_similar(ctx, rng):
+    url = f"/api/food/similar/{rng.choice(ctx.food_ids)}"
+    # 400 for foods without a weight to compare per gram
+    return "GET", url, {"params": {"k": 10}}, (200, 400, 404)
+
+
+async def food_search(ctx, rng):
+    ranges = {"protein": {"min": rng.uniform(0, 20)}, "calories": {"max": 400}}
+    return (
+        "POST",
+        "/api/food/search",
+        {"json": {"ranges": ranges, "limit": 50}},
+        (200, 404),
+    )
+
+
+async def food_stats(ctx, rng):
+    params = {"min_calories": rng.randrange(0, 400), "fields": "calories,protein"}
+    return "GET", "/api/food/stats", {"params": params}, (200,)
+
+
+async def food_popular(ctx, rng):
+    return "GET", "/api/food/popular", {"params": {"k": 10}}, (200,)
+
+
+async def food_plan_totals(ctx, rng):
+    plans = [[[f, rng.uniform(10, 300)] for f in _ids(rng, ctx, 5)] for _ in range(10)]
+    return "POST", "/api/food/plan/totals", {"json": {"plans": plans}}, (200,)
+
+
+async def food_plan_optimize(ctx, rng):
+    body = {
+        "targets": {"calories": {"target": 2000}, "protein": {"min": 100}},
+        "time_budget_ms": 50,
+    }
+    return "POST", "/api/food/plan/optimize", {"json": body}, (200,)
+
+
+async def food_export(ctx, rng):
+    return "GET", "/api/food/export", {}, (200,)
+
+
+async def food_add(ctx, rng):
+    return "POST", "/api/food/add", {"json": new_food(rng)}, (200,)
+
+
+async def food_update(ctx, rng):
+    url = f"/api/food/update/{rng.choice(ctx.food_ids)}"
+    return "PUT", url, {"json": {"weight": rng.uniform(50, 500)}}, (200, 404)
+
+
+async def food_delete(ctx, rng):
+    food = new_food(rng)
+    await ctx.client.post("/api/food/add", json=food)
+    url = f"/api/food/delete/{food['food_id']}"
+    return "DELETE", url, {"headers": ctx.auth}, (200,)
+
+
+async def food_import(ctx, rng):
+    body = "\n".join(json.dumps(new_food(rng)) for _ in range(100))
+    kwargs = {"content": body.encode(), "headers": ctx.auth}
+    return "POST", "/api/food/import", kwargs, (200,)
+
+
+async def user_list(ctx, rng):
+    return "GET", "/api/user/get", {"params": {"limit": 50}}, (200,)
+
+
+async def user_get(ctx, rng):
+    return "GET", f"/api/user/get/{rng.choice(ctx.user_ids)}", {}, (200,)
+
+
+async def user_add(ctx, rng):
+    return "POST", "/api/user/add", {"json": new_user(rng)}, (200,)
+
+
+async def user_update(ctx, rng):
+    url = f"/api/user/update/{rng.choice(ctx.user_ids)}"
+    return "PUT", url, {"json": {"last_name": str(rng.randrange(1000))}}, (200,)
+
+
+async def user_delete(ctx, rng):
+    user = (await ctx.client.post("/api/user/add", json=new_user(rng))).json()
+    url = f"/api/user/delete/{user['data']['user_id']}"
+    return "DELETE", url, {"headers": ctx.auth}, (200,)
+
+
+async def auth_login(ctx, rng):
+    params = {"username": rng.choice(ctx.usernames), "password": PASSWORD}
+    return "POST", "/api/auth/login", {"params": params}, (200,)
+
+
+async def auth_login_failed(ctx, rng):
+    params = {"username": rng.choice(ctx.usernames), "password": "wrong"}
+    return "POST", "/api/auth/login", {"params": params}, (401,)
+
+
+OPERATIONS = {
+    "food.list": food_list,
+    "food.search_name": food_search_name,
+    "food.get": food_get,
+    "food.batch_get": food_batch_get,
+    "food.batch_post": food_batch_post,
+    "food.similar": food_similar,
+    "food.search": food_search,
+    "food.stats": food_stats,
+    "food.popular": food_popular,
+    "food.plan_totals": food_plan_totals,
+    "food.plan_optimize": food_plan_optimize,
+    "food.export": food_export,
+    "food.add": food_add,
+    "food.update": food_update,
+    "food.delete": food_delete,
+    "food.import": food_import,
+    "user.list": user_list,
+    "user.get": user_get,
+    "user.add": user_add,
+    "user.update": user_update,
+    "user.delete": user_delete,
+    "auth.login": auth_login,
+    "auth.login_failed": auth_login_failed,
+}
+MIXES["all"] = dict.fromkeys(OPERATIONS, 1)
+
+
+async def setup(client, foods: int, seed: int) -> Context:
+    """A load-test admin, users to log in as and `foods` imported foods"""
+    from benchmarks.dataset import food_rows
+
+    rng = random.Random(seed)
+    users = [new_user(rng) for _ in range(LOGIN_USERS)]
+    users[0]["is_admin"] = True
+    user_ids = []
+    for user in users:
+        resp = await client.post("/api/user/add", json=user)
+        resp.raise_for_status()
+        user_ids.append(resp.json()["data"]["user_id"])
+    login = {"username": users[0]["username"], "password": PASSWORD}
+    resp = await client.post("/api/auth/login", params=login)
+    resp.raise_for_status()
+    token = resp.json()["data"]
+
+    rows = list(food_rows(foods, seed))
+    body = "\n".join(json.dumps(row) for row in rows).encode()
+    resp = await client.post(
+        "/api/food/import",
+        content=body,
+        params={"batch_size": 5000},
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=600,
+    )
+    resp.raise_for_status()
+    # rows already there from an earlier run against the same server are fine
+    invalid = [
+        error
+        for error in resp.json()["data"]["errors"]
+        if not error["detail"].startswith("Rejected by the database")
+    ]
+    if invalid:
+        raise RuntimeError(f"the test foods failed to import: {invalid[:3]}")
+    return Context(
+        client=client,
+        food_ids=[row["food_id"] for row in rows],
+        user_ids=user_ids,
+        usernames=[user["username"] for user in users],
+        token=token,
+        seed=seed,
+    )
+
+
+async def worker(ctx: Context, mix: dict, number: int, budget: dict):
+    rng = random.Random(ctx.seed * 1000 + number)
+    names, weights = list(mix), list(mix.values())
+    while budget["requests"] > 0 and time.perf_counter() < budget["until"]:
+        budget["requests"] -= 1
+        name = rng.choices(names, weights)[0]
+        try:
+            method, url, kwargs, expected = await OPERATIONS[name](ctx, rng)
+            start = time.perf_counter()
+            resp = await ctx.client.request(method, url, **kwargs)
+            await resp.aread()
+            elapsed = time.perf_counter() - start
+        except Exception as exc:  # a failed request is a result, not a crash
+            ctx.errors[f"{name}: {type(exc).__name__}"] += 1
+            continue
+        ctx.statuses[name][resp.status_code] += 1
+        if resp.status_code in (429, 503):
+            continue  # rate limited or shed by the hashing queue, counted not timed
+        if resp.status_code not in expected:
+            ctx.errors[f"{name}: HTTP {resp.status_code}"] += 1
+        ctx.latencies[name].append(elapsed)
+
+
+async def run(client, args) -> dict:
+    ctx = await setup(client, args.foods, args.seed)
+    mix = MIXES[args.mix]
+    budget = {
+        "requests": args.requests or float("inf"),
+        "until": time.perf_counter() + args.duration,
+    }
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker(ctx, mix, n, budget) for n in range(args.concurrency))
+    )
+    elapsed = time.perf_counter() - start
+
+    samples = [s for latencies in ctx.latencies.values() for s in latencies]
+    results = {
+        "overall": {**summarize(samples), "rps": round(len(samples) / elapsed, 1)}
+    }
+    for name in sorted(ctx.latencies):
+        latencies = ctx.latencies[name]
+        results[name] = {
+            **summarize(latencies),
+            "rps": round(len(latencies) / elapsed, 1),
+            "statuses": {str(k): v for k, v in sorted(ctx.statuses[name].items())},
+        }
+    return {"results": results, "errors": dict(ctx.errors)}
+
+
+async def run_in_process(args) -> dict:
+    import httpx
+
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load", timeout=60
+        ) as client:
+            return await run(client, args)
+
+
+async def run_remote(args) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=60, limits=limits
+    ) as client:
+        return await run(client, args)
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Routes whose p95 grew and a throughput that fell beyond `tolerance`"""
+    found = []
+    for name, now in results.items():
+        then = baseline.get(name)
+        if not then or min(now["count"], then["count"]) < MIN_SAMPLES:
+            continue
+        limit = then["p95_ms"] * (1 + tolerance)
+        if now["p95_ms"] > limit and now["p95_ms"] - then["p95_ms"] > MIN_REGRESSION_MS:
+            found.append(f"{name}: p95 {then['p95_ms']} ms -> {now['p95_ms']} ms")
+    then, now = baseline.get("overall", {}).get("rps"), results["overall"]["rps"]
+    if then and now < then * (1 - tolerance):
+        found.append(f"overall: throughput {then} -> {now} requests/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--url", help="a running server, in process when left out")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after this many")
+    parser.add_argument("--foods", type=int, default=5000, help="imported first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, help="JSON to compare against")
+    parser.add_argument("--save-baseline", type=Path, help="JSON to store this run in")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.url:
+        report = asyncio.run(run_remote(args))
+    else:
+        use_temp_database("load.db")
+        # every in-process client has the same address, the limits would turn
+        # most logins and the setup's signups away; RATE_LIMIT_*=... overrides
+        for name in ("LOGIN_IP", "LOGIN_USER", "SIGNUP_IP"):
+            os.environ.setdefault(f"RATE_LIMIT_{name}", "off")
+        report = asyncio.run(run_in_process(args))
+
+    target = args.url or "in process"
+    print(f"{args.mix} mix, {args.concurrency} clients, {target}")
+    for name, result in report["results"].items():
+        print(f"  {name}: {result}")
+    failed = False
+    for error, count in sorted(report["errors"].items()):
+        print(f"UNEXPECTED {error} x{count}")
+        failed = True
+
+    if args.baseline:
+        stored = json.loads(args.baseline.read_text()).get(args.mix)
+        if stored is None:
+            print(f"no {args.mix} results in {args.baseline}")
+            failed = True
+        else:
+            found = regressions(report["results"], stored, args.tolerance)
+            for regression in found:
+                print(f"REGRESSION {regression}")
+            if not found:
+                print(f"no regressions against {args.baseline}")
+            failed = failed or bool(found)
+    if args.save_baseline:
+        stored = {}
+        if args.save_baseline.exists():
+            stored = json.loads(args.save_baseline.read_text())
+        stored[args.mix] = report["results"]
+        args.save_baseline.write_text(json.dumps(stored, indent=2) + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
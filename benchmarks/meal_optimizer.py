@@ -0,0 +1,79 @@
+"""Time and quality of nutrient-target meal plans over a large food catalogue.
+
+python -m benchmarks.meal_optimizer --rows 100000 --budget 500
+"""
+
+import argparse
+import time
+
+from benchmarks._common import summarize, timed, use_temp_database
+
+use_temp_database("meal_optimizer.db")
+
+import numpy as np  # noqa: E402
+
+from server.matrix import NUMERIC_FIELDS, NutrientMatrix  # noqa: E402
+from server.models import NutrientTarget  # noqa: E402
+from server.optimizer import optimize  # noqa: E402
+
+# a rough daily reference intake
+TARGETS = {
+    "calories": NutrientTarget(target=2000),
+    "protein": NutrientTarget(min=50, target=90),
+    "total_fat": NutrientTarget(max=70),
+    "saturated_fat": NutrientTarget(max=20),
+    "total_carbohydrate": NutrientTarget(target=260),
+    "dietary_fiber": NutrientTarget(min=30),
+    "sugars": NutrientTarget(max=90),
+    "sodium": NutrientTarget(max=2300),
+    "potassium": NutrientTarget(min=3500),
+    "calcium": NutrientTarget(min=1000),
+    "iron": NutrientTarget(min=8),
+    "vitamin_c": NutrientTarget(min=90),
+}
+
+
+def build(rows: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    # per 100 g, scaled so a few hundred grams of a food is a sensible share
+    scale = {field: t.target or t.min or t.max for field, t in TARGETS.items()}
+    values = np.empty((len(NUMERIC_FIELDS), rows))
+    for i, field in enumerate(NUMERIC_FIELDS):
+        values[i] = rng.lognormal(0, 1.2, rows) * scale.get(field, 10) / 10
+    values[0] = 100
+    values[rng.random(values.shape) < 0.05] = np.nan  # 5% unknown nutrients
+    matrix = NutrientMatrix()
+    with timed(f"build matrix of {rows} foods"):
+        matrix.replace([str(i) for i in range(rows)], values)
+    return matrix, rng
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--budget", type=int, default=500, help="milliseconds")
+    parser.add_argument("--max-items", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matrix, rng = build(args.rows, args.seed)
+    samples, deviations, complete = [], [], 0
+    for _ in range(args.repeat):
+        exclude = set(rng.choice(matrix.ids, args.rows // 10).tolist())
+        start = time.perf_counter()
+        plan = optimize(
+            matrix, TARGETS, [], exclude, args.max_items, 10, 500, args.budget / 1000
+        )
+        samples.append(time.perf_counter() - start)
+        deviations.append(plan["deviation"])
+        complete += plan["complete"]
+    print(f"{len(TARGETS)} targets, budget {args.budget}ms:", summarize(samples))
+    print(
+        f"relative deviation: median {np.median(deviations):.4f},"
+        f" worst {max(deviations):.4f}; {complete}/{args.repeat} converged"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Latency of POST /api/food/plan/totals for many weekly meal plans at once.
+
+python -m benchmarks.meal_plans --plans 1000 --foods 5000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks._common import (
+    bulk_insert,
+    random_food_rows,
+    summarize,
+    use_temp_database,
+)
+
+use_temp_database("meal_plans.db")
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from server.database import (
+    FoodDB,
+    async_engine,
+    create_db_and_tables,
+    engine,
+)  # noqa: E402
+
+# a week of three meals of five ingredients
+ITEMS_PER_PLAN = 7 * 3 * 5
+
+
+def weekly_plans(count: int, foods: int, seed: int) -> list:
+    rng = random.Random(seed)
+    ids = [row["food_id"] for row in random_food_rows(foods)]
+    return [
+        [[rng.choice(ids), rng.uniform(10, 300)] for _ in range(ITEMS_PER_PLAN)]
+        for _ in range(count)
+    ]
+
+
+async def run(plans: list, repeat: int):
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://b", timeout=60
+        ) as client:
+            # encoded once, the client's JSON encoding isn't what is measured
+            body = json.dumps({"plans": plans})
+            headers = {"Content-Type": "application/json"}
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                resp = await client.post(
+                    "/api/food/plan/totals", content=body, headers=headers
+                )
+                resp.raise_for_status()
+                samples.append(time.perf_counter() - start)
+        items = len(plans) * ITEMS_PER_PLAN
+        print(f"{len(plans)} plans, {items} items:", summarize(samples))
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=1000)
+    parser.add_argument("--foods", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    bulk_insert(engine, FoodDB.__table__, random_food_rows(args.foods))
+    plans = weekly_plans(args.plans, args.foods, args.seed)
+    asyncio.run(run(plans, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Latency of every get_foodlist nutrient filter combination, before and after
+the nutrient index migration, over a large synthetic food table.
+
+    python -m benchmarks.nutrient_filters --rows 1000000
+"""
+
+import argparse
+import itertools
+import os
+import time
+
+from benchmarks._common import bulk_insert, random_food_rows, timed, use_temp_database
+
+use_temp_database("nutrient_filters.db")
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlmodel import select  # noqa: E402
+
+from server.database import FoodDB, create_db_and_tables, engine  # noqa: E402
+from server.router import Food  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# narrow ranges, so a scan can't get lucky and fill the page early
+BOUNDS = {
+    "min_calories": 400,
+    "max_calories": 405,
+    "min_protein": 20.0,
+    "max_protein": 21.0,
+    "min_carbohydrates": 30.0,
+    "max_carbohydrates": 31.0,
+}
+
+
+def migrate(revision: str):
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    command.upgrade(config, revision)
+    engine.dispose()
+
+
+def combinations():
+    for n in range(1, len(BOUNDS) + 1):
+        for keys in itertools.combinations(BOUNDS, n):
+            yield {k: BOUNDS[k] for k in keys}
+
+
+def measure(repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for bounds in combinations():
+            query = select(FoodDB).where(*Food.nutrient_filters(**bounds)).limit(5)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(query).all()
+            results[",".join(bounds)] = (time.perf_counter() - start) / repeat
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with timed(f"insert {args.rows} rows"):
+        bulk_insert(engine, FoodDB.__table__, random_food_rows(args.rows))
+    with timed("search index migration"):
+        migrate("3f9a1c2b7d10")
+    before = measure(args.repeat)
+    with timed("nutrient index migration"):
+        migrate("head")
+    after = measure(args.repeat)
+
+    print(f"{'filters':<90} {'before ms':>10} {'after ms':>10}")
+    for key in before:
+        print(f"{key:<90} {before[key] * 1000:>10.2f} {after[key] * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Latency of multi-nutrient range searches on the in-memory nutrient matrix.
+
+python -m benchmarks.nutrient_search --rows 1000000 --constraints 20
+"""
+
+import argparse
+import time
+
+from benchmarks._common import summarize, timed, use_temp_database
+
+use_temp_database("nutrient_search.db")
+
+import numpy as np  # noqa: E402
+
+from server.matrix import NUMERIC_FIELDS, NutrientMatrix  # noqa: E402
+
+
+def build(rows: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(2, 1, (len(NUMERIC_FIELDS), rows))
+    values[rng.random(values.shape) < 0.1] = np.nan  # 10% unknown nutrients
+    matrix = NutrientMatrix()
+    with timed(f"build matrix of {rows} foods"):
+        matrix.replace([str(i) for i in range(rows)], values)
+    return matrix, rng
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--constraints", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matrix, rng = build(args.rows, args.seed)
+    print(f"matrix: {matrix.stats()['bytes'] / 2**20:.0f} MiB")
+    # each range keeps the given share of the foods that have the nutrient
+    for keep in (0.96, 0.8, 0.4):
+        samples = []
+        matches = 0
+        for _ in range(args.repeat):
+            fields = rng.choice(NUMERIC_FIELDS, args.constraints, replace=False)
+            ranges = {}
+            for field in fields:
+                column = matrix.values[matrix.column[field], : matrix.size]
+                low = rng.uniform(0, 1 - keep)
+                ranges[field] = tuple(np.nanquantile(column, [low, low + keep]))
+            start = time.perf_counter()
+            matches += len(matrix.search(ranges))
+            samples.append(time.perf_counter() - start)
+        print(
+            f"keep {keep:.0%} per range, {matches // args.repeat} matches:",
+            summarize(samples),
+        )
+
+
+if __name__ == "__main__":
+    main()
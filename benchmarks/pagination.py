@@ -0,0 +1,70 @@
+"""Latency of deep pages of GET /api/food/get, legacy offset vs cursor.
+
+python -m benchmarks.pagination --rows 500000
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks._common import bulk_insert, random_food_rows, use_temp_database
+
+use_temp_database("pagination.db")
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from server.database import (
+    FoodDB,
+    async_engine,
+    create_db_and_tables,
+    engine,
+)  # noqa: E402
+from server.pagination import encode_cursor  # noqa: E402
+
+
+async def page_latency(params: dict, repeat: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://b") as client:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            resp = await client.get("/api/food/get", params=params)
+            resp.raise_for_status()
+        return (time.perf_counter() - start) / repeat
+
+
+async def run(rows: int, repeat: int, limit: int):
+    try:
+        await report(rows, repeat, limit)
+    finally:
+        await async_engine.dispose()
+
+
+async def report(rows: int, repeat: int, limit: int):
+    print(f"{'depth':>10} {'offset ms':>10} {'cursor ms':>10}")
+    depth = 1
+    while depth < rows:
+        # ids from random_food_rows sort in insertion order, so this is row `depth`
+        last_id = next(random_food_rows(1, start=depth - 1))["food_id"]
+        by_offset = await page_latency({"limit": limit, "offset": depth}, repeat)
+        by_cursor = await page_latency(
+            {"limit": limit, "cursor": encode_cursor({"k": last_id})}, repeat
+        )
+        print(f"{depth:>10} {by_offset * 1000:>10.2f} {by_cursor * 1000:>10.2f}")
+        depth *= 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    bulk_insert(engine, FoodDB.__table__, random_food_rows(args.rows))
+    asyncio.run(run(args.rows, args.repeat, args.limit))
+
+
+if __name__ == "__main__":
+    main()
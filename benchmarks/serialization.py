@@ -0,0 +1,76 @@
+"""CPU cost of rendering food responses, Pydantic response_model vs the fast path.
+
+python -m benchmarks.serialization --items 1 5 100 --repeat 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks._common import random_food_rows, use_temp_database
+
+use_temp_database("serialization.db")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from server.database import FoodDB  # noqa: E402
+from server.models import FoodModel  # noqa: E402
+from server.responses import FoodResponses  # noqa: E402
+from server.serializers import (  # noqa: E402
+    FOOD_FIELDS,
+    encode,
+    food_payload,
+    list_response,
+)
+
+FIELD = create_model_field(name="Response", type_=FoodResponses, mode="serialization")
+
+
+async def pydantic_path(foods: list) -> bytes:
+    """What the handlers did before: build models, then FastAPI re-validates them"""
+    content = FoodResponses(
+        data=[FoodModel.model_validate(f.model_dump()) for f in foods]
+    )
+    value = await serialize_response(field=FIELD, response_content=content)
+    return JSONResponse(value).body
+
+
+async def fast_path(foods: list) -> bytes:
+    return list_response((encode(food_payload(f)) for f in foods), None).body
+
+
+async def per_call(render, foods: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await render(foods)
+    return (time.perf_counter() - start) / repeat
+
+
+async def run(sizes: list, repeat: int):
+    rows = list(random_food_rows(max(sizes)))
+    # nutrients the generator leaves out are null, as they would be in the table
+    foods = [FoodDB(**{**dict.fromkeys(FOOD_FIELDS), **row}) for row in rows]
+    print(f"{'items':>6} {'pydantic/item':>14} {'fast/item':>10} {'speedup':>8}")
+    for size in sizes:
+        batch = foods[:size]
+        assert await pydantic_path(batch) == await fast_path(batch)
+        slow = await per_call(pydantic_path, batch, repeat) / size
+        fast = await per_call(fast_path, batch, repeat) / size
+        print(
+            f"{size:>6} {slow * 1e6:>12.1f}us {fast * 1e6:>8.1f}us "
+            f"{slow / fast:>7.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 100])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.items, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
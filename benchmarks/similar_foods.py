@@ -0,0 +1,53 @@
+"""Latency of nearest-food searches on the in-memory nutrient matrix.
+
+python -m benchmarks.similar_foods --rows 1000000 --k 10
+"""
+
+import argparse
+import time
+
+from benchmarks._common import summarize, timed, use_temp_database
+
+use_temp_database("similar_foods.db")
+
+import numpy as np  # noqa: E402
+
+from server.matrix import NUMERIC_FIELDS, NutrientMatrix  # noqa: E402
+from server.mealplan import NUTRIENT_FIELDS  # noqa: E402
+from server.similar import METRICS, feature_scales, similar  # noqa: E402
+
+
+def build(rows: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(2, 1, (len(NUMERIC_FIELDS), rows))
+    values[rng.random(values.shape) < 0.1] = np.nan  # 10% unknown nutrients
+    values[0] = rng.uniform(10, 500, rows)  # every food has a weight
+    matrix = NutrientMatrix()
+    with timed(f"build matrix of {rows} foods"):
+        matrix.replace([str(i) for i in range(rows)], values)
+    with timed("feature scales"):
+        feature_scales(matrix)
+    return matrix, rng
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matrix, rng = build(args.rows, args.seed)
+    for features in (NUTRIENT_FIELDS, NUTRIENT_FIELDS[:4]):
+        for metric in METRICS:
+            samples = []
+            for position in rng.integers(0, args.rows, args.repeat).tolist():
+                start = time.perf_counter()
+                similar(matrix, position, args.k, metric, features)
+                samples.append(time.perf_counter() - start)
+            print(f"{metric}, {len(features)} features:", summarize(samples))
+
+
+if __name__ == "__main__":
+    main()
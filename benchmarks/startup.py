@@ -0,0 +1,88 @@
+"""Time from launching uvicorn to the first served request, and to the docs schema.
+
+python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks._common import summarize
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                return resp.read()
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def start_once(env: dict, workers: int) -> tuple:
+    """Seconds to the first /api/ping and then to /openapi.json"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        wait_for(f"{base}/api/ping", start + 60)
+        ready = time.perf_counter() - start
+        wait_for(f"{base}/openapi.json", start + 60)
+        return ready, time.perf_counter() - start - ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    for state in ("cold", "warm"):
+        ready, schema = [], []
+        for _ in range(args.repeat):
+            directory = tempfile.mkdtemp(prefix="meal-bench-")
+            url = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+            env = {
+                **os.environ,
+                "DATABASE_URL": url,
+                "ALEMBIC_DB_URL": url,
+                "SECRET_KEY": "benchmark-secret",
+                "ALGORITHM": "HS256",
+                "TMPDIR": directory,
+            }
+            if state == "warm":
+                # a previous start migrated the database and cached the schema
+                start_once(env, args.workers)
+            times = start_once(env, args.workers)
+            ready.append(times[0])
+            schema.append(times[1])
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"{state} start, first request:", summarize(ready))
+        print(f"{state} start, then /openapi.json:", summarize(schema))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Mixed read/write workload under each storage profile.
+
+python -m benchmarks.storage_profiles --clients 32 --ops 200 --writes 0.2
+python -m benchmarks.storage_profiles --url postgresql://user:pw@host/db --profiles default postgres
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from benchmarks._common import (
+    bulk_insert,
+    random_food_rows,
+    summarize,
+    use_temp_database,
+)
+
+use_temp_database("storage_profiles.db")
+
+from sqlalchemy import create_engine, select, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from server.database import FoodDB, async_url  # noqa: E402
+from server.storage import storage_profile  # noqa: E402
+
+table = FoodDB.__table__
+
+
+def prepare(url: str, profile, rows: int) -> list:
+    engine = create_engine(url, **profile.engine_options(url, False))
+    profile.configure(engine)
+    SQLModel.metadata.drop_all(engine, tables=[table])
+    SQLModel.metadata.create_all(engine, tables=[table])
+    bulk_insert(engine, table, random_food_rows(rows))
+    engine.dispose()
+    return [row["food_id"] for row in random_food_rows(rows)]
+
+
+async def client(engine, ids: list, ops: int, writes: float, seed: int, result: dict):
+    rng = random.Random(seed)
+    for _ in range(ops):
+        food_id = rng.choice(ids)
+        write = rng.random() < writes
+        start = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                if write:
+                    query = update(table).where(table.c.food_id == food_id)
+                    await conn.execute(query.values(calories=rng.uniform(0, 900)))
+                else:
+                    query = select(table).where(table.c.food_id == food_id)
+                    (await conn.execute(query)).one()
+        except OperationalError:
+            result["errors"] += 1
+            continue
+        result["writes" if write else "reads"].append(time.perf_counter() - start)
+
+
+async def run(url: str, profile, ids: list, args) -> dict:
+    engine = create_async_engine(async_url(url), **profile.engine_options(url, True))
+    profile.configure(engine.sync_engine)
+    result = {"reads": [], "writes": [], "errors": 0}
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(
+                client(engine, ids, args.ops, args.writes, seed, result)
+                for seed in range(args.clients)
+            )
+        )
+    finally:
+        await engine.dispose()
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="database to use instead of a temp SQLite file")
+    parser.add_argument("--profiles", nargs="+", default=["default", "sqlite"])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200, help="per client")
+    parser.add_argument("--writes", type=float, default=0.2, help="share of writes")
+    args = parser.parse_args()
+
+    for name in args.profiles:
+        url = args.url
+        if url is None:
+            # a fresh file each, WAL mode sticks to the database file
+            path = os.path.join(tempfile.mkdtemp(prefix="meal-bench-"), f"{name}.db")
+            url = f"sqlite:///{path}"
+        profile = storage_profile(url, name)
+        ids = prepare(url, profile, args.rows)
+        result = asyncio.run(run(url, profile, ids, args))
+        done = len(result["reads"]) + len(result["writes"])
+        print(
+            f"{name}: {done / result['elapsed']:.0f} ops/s,"
+            f" {result['errors']} failed (database is locked)"
+        )
+        print("  reads: ", summarize(result["reads"]))
+        print("  writes:", summarize(result["writes"]))
+
+
+if __name__ == "__main__":
+    main()
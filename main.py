@@ -1,37 +1,37 @@
-import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.openapi.docs import get_swagger_ui_html
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
-from server.database import create_db_and_tables
-from alembic import command
-from alembic.config import Config
+from server.database import async_engine, create_db_and_tables, storage
 from fastapi.openapi.utils import get_openapi  # Ensure this import is present
 
 # from server.routes import Food
-from server.router import Food, User
-from server.auth import Auth
+from server.router import Food, User, food_cache, stats_cache
+from server.auth import Auth, user_cache
 from server.errors import NotFoundError, register_exceptions
-from server.responses import APIResponse
-
-MIGRATION_FLAG_FILE = "/tmp/migrations_applied.flag"  # Change path as needed
-
-
-def run_migrations_once():
-    """Run Alembic migrations only if they haven't been applied yet."""
-    if not os.path.exists(MIGRATION_FLAG_FILE):
-        alembic_cfg = Config("alembic.ini")
-        command.upgrade(alembic_cfg, "head")
-        with open(MIGRATION_FLAG_FILE, "w") as f:
-            f.write("Migrations applied")
+from server.hashing import hasher
+from server.responses import APIResponse, MainResponse
+from server.matrix import nutrient_matrix
+from server.search import food_search
+from server.replicas import ReadYourWritesMiddleware, replicas
+from server.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from server.compression import CompressionMiddleware
+from server.ratelimit import limiter
+from server.popularity import popularity
+from server.startup import cached_openapi, migrate_if_needed, upgrade
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):  # Replace 'app' with '_' to indicate it's unused
     create_db_and_tables()
-    run_migrations_once()
+    migrate_if_needed()
+    popularity.start()
     yield
+    await popularity.stop()
+    hasher.shutdown()
+    await async_engine.dispose()
+    await replicas.dispose()
 
 
 app = FastAPI(lifespan=lifespan, title="Plan-a-meal API")
@@ -39,6 +39,9 @@ app.include_router(Food().router, prefix="/api", tags=["Food"])
 app.include_router(User().router, prefix="/api", tags=["User"])
 app.include_router(Auth().router, prefix="/api", tags=["Auth"])
 register_exceptions(app)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 security_scheme = {
     "type": "http",
@@ -51,6 +54,11 @@ security_scheme = {
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
+    app.openapi_schema = cached_openapi(app, build_openapi)
+    return app.openapi_schema
+
+
+def build_openapi() -> dict:
     openapi_schema = get_openapi(
         title="Plan-a-meal",
         version="1.0.0",
@@ -71,8 +79,7 @@ The API supports authentication and authorization mechanisms to ensure secure ac
     for path in openapi_schema["paths"].values():
         for method in path.values():
             method["security"] = [{"BearerAuth": []}]  # Apply BearerAuth globally
-    app.openapi_schema = openapi_schema
-    return app.openapi_schema
+    return openapi_schema
 
 
 app.openapi = custom_openapi
@@ -104,12 +111,37 @@ def ping():
     return "pong"
 
 
+@app.get("/api/status", tags=["Status"], response_model=MainResponse)
+async def status():
+    """Runtime numbers of the server's worker pools and caches."""
+    return MainResponse(
+        data={
+            "hashing": hasher.stats(),
+            "auth_cache": user_cache.stats(),
+            "food_cache": food_cache.stats(),
+            "stats_cache": stats_cache.stats(),
+            "nutrient_matrix": nutrient_matrix.stats(),
+            "storage": storage.stats(),
+            "replicas": replicas.stats(),
+            "rate_limits": limiter.stats(),
+            "popularity": popularity.stats(),
+        }
+    )
+
+
+@app.get("/api/metrics", tags=["Status"], response_class=Response)
+async def metrics():
+    """Request latency, database and hashing metrics for Prometheus to scrape."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/api/migrate", tags=["Admin"], response_model=APIResponse)
 async def run_migrations():
     """Run Alembic migrations."""
     try:
-        alembic_cfg = Config("alembic.ini")
-        command.upgrade(alembic_cfg, "head")
+        upgrade()
+        food_search.reset()
+        await async_engine.dispose()  # pooled connections keep the old schema
         return APIResponse(result="ok", message="Migrations applied successfully")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -129,4 +161,4 @@ async def catch_all(request: Request):
 
 if __name__ == "__main__":
     create_db_and_tables()
-    run_migrations_once()
+    migrate_if_needed()
@@ -0,0 +1,58 @@
+"""Count, mean, spread, percentiles and histogram of nutrients over a set of
+foods, computed on the nutrient matrix.
+
+Each field is one numpy pass over its values for the chosen foods; nulls
+are left out of every aggregate and counted apart. Results only depend on
+the matrix, so callers cache them keyed on `NutrientMatrix.version`.
+"""
+
+import numpy as np
+
+from .matrix import NutrientMatrix
+
+PERCENTILES = (5, 25, 50, 75, 95)
+MAX_BINS = 100
+
+
+def field_stats(values: np.ndarray, bins: int) -> dict:
+    """Aggregates of one field's values, NaN for null"""
+    present = values[~np.isnan(values)]
+    stats = {"count": len(present), "nulls": len(values) - len(present)}
+    if not len(present):
+        return {
+            **stats,
+            **dict.fromkeys(("mean", "std", "min", "max")),
+            "percentiles": dict.fromkeys(f"p{p}" for p in PERCENTILES),
+            "histogram": {"edges": [], "counts": []},
+        }
+    counts, edges = np.histogram(present, bins)
+    return {
+        **stats,
+        "mean": float(present.mean()),
+        "std": float(present.std()),
+        "min": float(present.min()),
+        "max": float(present.max()),
+        "percentiles": dict(
+            zip(
+                (f"p{p}" for p in PERCENTILES),
+                np.percentile(present, PERCENTILES).tolist(),
+            )
+        ),
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+def nutrient_stats(
+    matrix: NutrientMatrix, rows: np.ndarray, fields: tuple, bins: int = 10
+) -> dict:
+    """Aggregates of `fields` over the foods at positions `rows`. Histograms
+    have `bins` equal-width bins between the field's min and max.
+    """
+    columns = [matrix.column[field] for field in fields]
+    block = matrix.values[np.ix_(columns, rows)]
+    return {
+        "foods": len(rows),
+        "fields": {
+            field: field_stats(values, bins) for field, values in zip(fields, block)
+        },
+    }
@@ -1,20 +1,35 @@
 import datetime
 import os
 from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 
+from .cache import TTLCache
 from .database import UserDB, get_session
 from .errors import BadRequestError, NotFoundError, UnauthorizedError
+from .hashing import hasher
+from .ratelimit import limit_login
 from .responses import AuthResponse
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")  # Define the token URL
 
 
+def _user_size(token: str, user: UserDB) -> int:
+    """Rough memory footprint of a cached token -> user entry, in bytes"""
+    return 512 + len(token) + sum(len(str(v)) for v in user.model_dump().values())
+
+
+# decoded tokens -> detached UserDB snapshots, so protected routes skip the DB
+user_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", 60)),
+    max_bytes=int(os.environ.get("AUTH_CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+    sizeof=_user_size,
+)
+
+
 class Auth:
     """Handles authentication processes including login and token management."""
 
@@ -23,11 +38,14 @@ class Auth:
         self._add_routes()
 
     def _add_routes(self):
-        self.router.post("/login", response_model=AuthResponse)(self.login)
+        self.router.post(
+            "/login", response_model=AuthResponse, dependencies=[Depends(limit_login)]
+        )(self.login)
 
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str):
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        """Verify the password on the hashing pool, off the event loop"""
+        return await hasher.verify(plain_password, hashed_password)
 
     @staticmethod
     def create_access_token(username: str) -> str:
@@ -43,21 +61,24 @@ class Auth:
         )
 
     async def login(
-        self, username: str, password: str, session: Session = Depends(get_session)
+        self,
+        username: str,
+        password: str,
+        session: AsyncSession = Depends(get_session),
     ) -> AuthResponse:
         """Login and create a JWT token.
         This function verifies the username and password, and if valid, returns an access token.
         """
         query = select(UserDB).where(UserDB.username == username)
-        user = session.exec(query).first()
-        if not user or not self.verify_password(password, user.password):
+        user = (await session.exec(query)).first()
+        if not user or not await self.verify_password(password, user.password):
             raise UnauthorizedError(detail="Incorrect username or password")
         return AuthResponse(data=self.create_access_token(user.username))
 
     @staticmethod
     async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_session),
     ) -> UserDB:
         """Get the current user from the token.
         This function decodes the JWT token and retrieves the user from the database.
@@ -67,7 +88,11 @@ class Auth:
         The token is then decoded to get the username, which is used to fetch the user from the database.
         If the token is invalid or the user does not exist, it raises an error.
         This function is used to protect routes that require authentication.
+        Users are cached per token until the cache TTL or the token expires.
         """
+        cached = user_cache.get(token)
+        if cached is not None:
+            return cached
         try:
             payload = jwt.decode(
                 token,
@@ -80,7 +105,15 @@ class Auth:
         except JWTError:
             raise BadRequestError(detail="Invalid token")
         query = select(UserDB).where(UserDB.username == username)
-        user = session.exec(query).first()
+        user = (await session.exec(query)).first()
         if not user:
             raise NotFoundError(detail="User not found")
-        return user
+        snapshot = UserDB.model_validate(user.model_dump())
+        expires_in = payload["exp"] - datetime.datetime.now().timestamp()
+        user_cache.set(token, snapshot, ttl=min(user_cache.ttl, expires_in))
+        return snapshot
+
+    @staticmethod
+    def invalidate_user(user_id: str) -> int:
+        """Drop every cached token of a user, call this after changing the user."""
+        return user_cache.discard_where(lambda _, user: user.user_id == user_id)
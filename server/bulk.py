@@ -0,0 +1,207 @@
+"""Streaming bulk import and export of foods"""
+
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Optional
+
+from pydantic import ValidationError as PydanticValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import FoodDB
+from .replicas import replicas
+from .errors import BadRequestError
+from .matrix import nutrient_matrix
+from .models import FoodImportModel
+
+# longest line accepted in an upload, so a missing newline can't eat all memory
+MAX_LINE_BYTES = 1024 * 1024
+# per-row errors kept in the report, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# rows fetched from the database cursor and written per chunk of an export
+EXPORT_BATCH_ROWS = 2000
+
+IMPORT_FIELDS = set(FoodImportModel.model_fields)
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of UTF-8 bytes into lines without reading it all"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(pending) > MAX_LINE_BYTES:
+            raise BadRequestError(detail=f"Line longer than {MAX_LINE_BYTES} bytes")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """Yield (line number, row dict or error message) for each NDJSON line"""
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, "Expected a JSON object"
+            continue
+        yield line_no, row
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """Yield (line number, row dict) for each CSV record, the first line is the header.
+    Quoted fields may span lines; empty fields are read as null.
+    """
+    header: Optional[list] = None
+    record: list = []
+    line_no = start = 0
+    async for line in lines:
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:  # inside a quoted field, the record continues
+            if len(text) > MAX_LINE_BYTES:
+                raise BadRequestError(detail=f"Record at line {start} is too long")
+            continue
+        record = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            unknown = set(header) - IMPORT_FIELDS
+            if unknown:
+                raise BadRequestError(
+                    detail=f"Unknown columns: {', '.join(sorted(unknown))}"
+                )
+            continue
+        if len(values) != len(header):
+            yield start, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        yield start, {k: v for k, v in zip(header, values) if v != ""}
+
+
+def _describe(error: PydanticValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+class ImportReport:
+    """Counts and (a bounded number of) per-row errors of an import"""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list = []
+
+    def error(self, line: int, detail: str, food_id: Optional[str] = None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "food_id": food_id, "detail": detail})
+
+    def as_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def _insert_batch(session: AsyncSession, batch: list, report: ImportReport):
+    """Insert a batch in one transaction, or row by row if any row is rejected"""
+    table = FoodDB.__table__
+    try:
+        await session.exec(table.insert(), params=[row for _, row in batch])
+        await session.commit()
+        report.inserted += len(batch)
+        nutrient_matrix.upsert(row for _, row in batch)
+        return
+    except IntegrityError:
+        await session.rollback()
+    for line, row in batch:
+        try:
+            await session.exec(table.insert(), params=[row])
+            await session.commit()
+            report.inserted += 1
+            nutrient_matrix.upsert([row])
+        except IntegrityError as e:
+            await session.rollback()
+            report.error(line, f"Rejected by the database: {e.orig}", row["food_id"])
+
+
+async def load_foods(
+    session: AsyncSession, rows: AsyncIterator[tuple], batch_size: int
+) -> ImportReport:
+    """Validate rows as they arrive and insert them `batch_size` at a time"""
+    report = ImportReport()
+    batch: list = []
+    async for line, row in rows:
+        report.received += 1
+        if isinstance(row, str):
+            report.error(line, row)
+            continue
+        try:
+            food = FoodImportModel.model_validate(row)
+        except PydanticValidationError as e:
+            report.error(line, _describe(e), row.get("food_id"))
+            continue
+        values = food.model_dump()
+        values["food_id"] = str(food.food_id)
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            await _insert_batch(session, batch, report)
+            batch = []
+    if batch:
+        await _insert_batch(session, batch, report)
+    return report
+
+
+async def export_foods(format: str = "ndjson") -> AsyncIterator[bytes]:
+    """Stream every food as NDJSON or CSV, `EXPORT_BATCH_ROWS` rows per chunk.
+    Rows come straight off a server-side cursor as tuples, no models are built.
+    The session is opened here because the response outlives the request's one.
+    """
+    table = FoodDB.__table__
+    columns = [c.name for c in table.columns]
+    query = select(table).execution_options(yield_per=EXPORT_BATCH_ROWS)
+    async with replicas.session() as session:
+        result = await session.stream(query)
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(columns)
+            async for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+            async for rows in result.partitions():
+                yield "".join(
+                    dumps(dict(zip(columns, row))) + "\n" for row in rows
+                ).encode()
@@ -0,0 +1,238 @@
+"""Negotiated, streaming response compression (zstd, brotli, gzip).
+
+The encoding is picked from the client's Accept-Encoding, in the server's
+order of preference (COMPRESSION_ENCODINGS, default "zstd,br,gzip"; an
+empty value turns compression off). zstd and brotli come from the
+`zstandard` and `brotli` packages in requirements.txt; an install without
+them still serves gzip.
+Bodies shorter than COMPRESSION_MIN_SIZE bytes go out as they are; only
+that much is ever held back to decide, everything after it is compressed
+and sent chunk by chunk, so streamed exports stay streamed. ROUTES tunes
+single routes by path template.
+"""
+
+import os
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip still works
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # gzip still works
+    zstandard = None
+
+MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+# for large streamed bodies, where CPU per byte matters more than ratio
+FAST_LEVELS = {"zstd": 1, "br": 1, "gzip": 1}
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._brotli = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data)
+
+    def flush(self) -> bytes:
+        return self._brotli.flush()
+
+    def finish(self) -> bytes:
+        return self._brotli.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._zstd = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zstd.compress(data)
+
+    def flush(self) -> bytes:
+        return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+ENCODERS = {
+    "zstd": ZstdEncoder if zstandard is not None else None,
+    "br": BrotliEncoder if brotli is not None else None,
+    "gzip": GzipEncoder,
+}
+ENCODINGS = tuple(
+    name.strip()
+    for name in os.environ.get("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    if ENCODERS.get(name.strip()) is not None
+)
+
+
+class RouteCompression(NamedTuple):
+    """Compression settings of one route, None keeps the default"""
+
+    enabled: bool = True
+    minimum_size: Optional[int] = None
+    levels: Optional[Dict[str, int]] = None
+
+
+# path template -> settings, routes not listed use the defaults
+ROUTES = {
+    "/api/food/export": RouteCompression(levels=FAST_LEVELS),
+    "/api/ping": RouteCompression(enabled=False),
+}
+
+
+def negotiate(accept_encoding: str, encodings: tuple = ENCODINGS) -> Optional[str]:
+    """The client's most wanted of `encodings`, ties going to the earlier"""
+    wanted = {}
+    for part in accept_encoding.lower().split(","):
+        name, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        wanted[name.strip()] = quality
+    fallback = wanted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = wanted.get(name, fallback)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and (
+        content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+    )
+
+
+class CompressionMiddleware:
+    """Compresses compressible responses the client accepts an encoding for"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = MIN_SIZE,
+        encodings: tuple = ENCODINGS,
+        routes: dict = ROUTES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = encodings
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        responder = _Responder(self, scope, accept, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _Responder:
+    """Sends one response, holding back at most `minimum_size` bytes"""
+
+    def __init__(self, middleware, scope, accept: str, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.accept = accept
+        self._send = send
+        self.start = None
+        self.pending = []
+        self.pending_size = 0
+        self.encoder = None
+        self.passthrough = False
+        self.minimum_size = middleware.minimum_size
+
+    async def send(self, message):
+        if self.passthrough:
+            return await self._send(message)
+        if message["type"] == "http.response.start":
+            return await self.begin(message)
+        if message["type"] != "http.response.body":
+            return await self._send(message)
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.encoder is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more and self.pending_size < self.minimum_size:
+                return
+            if not more and self.pending_size < self.minimum_size:
+                await self._send(self.start)
+                self.passthrough = True
+                return await self._send({**message, "body": b"".join(self.pending)})
+            await self.start_encoding()
+            body = b"".join(self.pending)
+            self.pending = []
+        data = self.encoder.compress(body)
+        data += self.encoder.flush() if more else self.encoder.finish()
+        if data or not more:
+            await self._send(
+                {"type": "http.response.body", "body": data, "more_body": more}
+            )
+
+    async def begin(self, message):
+        """Decide from the response headers whether to compress at all"""
+        headers = MutableHeaders(scope=message)
+        route = getattr(self.scope.get("route"), "path_format", None)
+        settings = self.middleware.routes.get(route, RouteCompression())
+        name = None
+        if (
+            settings.enabled
+            and self.scope["method"] != "HEAD"
+            and message["status"] not in (204, 304)
+            and compressible(headers)
+        ):
+            headers.add_vary_header("Accept-Encoding")
+            name = negotiate(self.accept, self.middleware.encodings)
+        if settings.minimum_size is not None:
+            self.minimum_size = settings.minimum_size
+        length = headers.get("content-length")
+        if name is None or (length is not None and int(length) < self.minimum_size):
+            self.passthrough = True
+            return await self._send(message)
+        self.start = message
+        self.name = name
+        self.level = (settings.levels or LEVELS)[name]
+
+    async def start_encoding(self):
+        headers = MutableHeaders(scope=self.start)
+        del headers["content-length"]
+        headers["content-encoding"] = self.name
+        self.encoder = ENCODERS[self.name](self.level)
+        await self._send(self.start)
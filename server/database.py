@@ -4,18 +4,54 @@ import os
 from passlib.context import CryptContext
 from uuid import uuid4
 from typing import Optional
-from sqlmodel import Field, Session, SQLModel, create_engine
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Field, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
 
+from .metrics import instrument_engine
+from .storage import storage_profile
+
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 # Password hashing context (argon2id by default)
 load_dotenv()
 # load environment variables from .env file
 
-# create SQLAlchemy compatible engine
-engine = create_engine(
-    os.environ.get("DATABASE_URL", "sqlite:///database.db"),
-    connect_args={"check_same_thread": False},
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///database.db")
+
+# async drivers used by the request handlers, keyed by the sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str) -> str:
+    """Translate a sync database URL to the matching async driver URL"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+# engine settings for the backend, see server/storage.py
+storage = storage_profile(DATABASE_URL)
+
+# create SQLAlchemy compatible engine (used for DDL, migrations and scripts)
+engine = create_engine(DATABASE_URL, **storage.engine_options(DATABASE_URL, False))
+storage.configure(engine)
+instrument_engine(engine, "primary-sync")
+
+# async engine used by the API so queries never block the event loop
+async_engine = create_async_engine(
+    async_url(DATABASE_URL), **storage.engine_options(DATABASE_URL, True)
+)
+storage.configure(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine, "primary")
+async_session = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
 
@@ -24,10 +60,19 @@ def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 
-def get_session():
-    """Get a session for the database"""
-    with Session(engine) as session:
+async def get_session(request: Request):
+    """Get an async session for the database (the primary, for writes).
+    A request that commits is flagged for the read-your-writes cookie.
+    """
+    async with async_session() as session:
         yield session
+        if session.info.get("committed"):
+            request.state.committed = True
+
+
+@event.listens_for(AsyncSession.sync_session_class, "after_commit")
+def _flag_commit(session):
+    session.info["committed"] = True
 
 
 class UserDB(SQLModel, table=True):
@@ -65,19 +110,20 @@ class UserDB(SQLModel, table=True):
         return self.verify_password(self.password, password)
 
 
-# class StatsDB(SQLModel, table=True):
-#     """Stats database model for managing statistics."""
-
-#     __tablename__: str = os.environ.get("STATS_TABLE_NAME", "teststats")  # type: ignore
+class StatsDB(SQLModel, table=True):
+    """Stats database model for managing statistics.
+    Hits of each food, kept by server/popularity.py in batched upserts rather
+    than a write per read; no foreign key, so a batch never fails on a food
+    deleted meanwhile.
+    """
 
-#     stats_id: str = Field(primary_key=True, default_factory=lambda: str(uuid4()))
-#     food_id: str = Field(foreign_key="testfood.food_id", unique=True)
-#     food: "FoodDB" = Relationship("FoodModel", backref="stats", foreign_keys=[food_id])
+    __tablename__: str = os.environ.get("STATS_TABLE_NAME", "teststats")  # type: ignore
 
-#     hits: int = Field(default=0)
+    food_id: str = Field(primary_key=True)
+    hits: int = Field(default=0, nullable=False, index=True)
 
-#     def __repr__(self):
-#         return f"<StatsDB(stats_id={self.stats_id}, hits={self.hits})>"
+    def __repr__(self):
+        return f"<StatsDB(food_id={self.food_id}, hits={self.hits})>"
 
 
 class FoodDB(SQLModel, table=True):
@@ -86,8 +132,6 @@ class FoodDB(SQLModel, table=True):
     __tablename__: str = os.environ.get("FOOD_TABLE_NAME", "testfood")  # type: ignore
 
     food_id: str = Field(default_factory=lambda: str(uuid4()), primary_key=True)
-    # stats_id: Optional[str] = Field(unique=True, foreign_key="teststats.stats_id")
-    # stats: Optional[StatsDB] = Relationship(back_populates="food")
 
     name: str = Field(nullable=False)
     brand: str = Field(nullable=True)
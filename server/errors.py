@@ -1,3 +1,4 @@
+import math
 import uuid
 from typing import Optional
 from fastapi import HTTPException, status, Request
@@ -123,6 +124,44 @@ class ForbiddenError(BaseError):
         self.extra_info = extra_info
 
 
+class TooManyRequestsError(BaseError):
+    """Custom exception for clients over their rate limit."""
+
+    def __init__(
+        self,
+        detail: str = "Too many requests",
+        retry_after: float = 1,
+        context: Optional[str] = None,
+        extra_info: str = None,
+    ):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            title="http_exception",
+            detail=detail,
+            context=context,
+        )
+        self.retry_after = retry_after
+        self.extra_info = extra_info
+
+
+class ServiceUnavailableError(BaseError):
+    """Custom exception for temporarily overloaded services."""
+
+    def __init__(
+        self,
+        detail: str = "Service temporarily unavailable",
+        context: Optional[str] = None,
+        extra_info: str = None,
+    ):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            title="http_exception",
+            detail=detail,
+            context=context,
+        )
+        self.extra_info = extra_info
+
+
 def register_exceptions(app):
     """Register exception handlers for custom exceptions."""
 
@@ -162,9 +201,33 @@ def register_exceptions(app):
         content = format_error_response(exc, status.HTTP_403_FORBIDDEN)
         return JSONResponse(content=content, status_code=status.HTTP_403_FORBIDDEN)
 
+    async def too_many_requests_exception_handler(
+        _: Request, exc: TooManyRequestsError
+    ):
+        content = format_error_response(exc, status.HTTP_429_TOO_MANY_REQUESTS)
+        return JSONResponse(
+            content=content,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        )
+
+    async def service_unavailable_exception_handler(
+        _: Request, exc: ServiceUnavailableError
+    ):
+        content = format_error_response(exc, status.HTTP_503_SERVICE_UNAVAILABLE)
+        return JSONResponse(
+            content=content,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
     app.exception_handler(ValidationError)(validation_exception_handler)
     app.exception_handler(BadRequestError)(bad_request_exception_handler)
     app.exception_handler(NotFoundError)(not_found_exception_handler)
     app.exception_handler(UnauthorizedError)(unauthorized_exception_handler)
     app.exception_handler(ForbiddenError)(forbidden_exception_handler)
+    app.exception_handler(TooManyRequestsError)(too_many_requests_exception_handler)
+    app.exception_handler(ServiceUnavailableError)(
+        service_unavailable_exception_handler
+    )
     app.exception_handler(RequestValidationError)(validation_exception_handler)
@@ -0,0 +1,140 @@
+"""Runs Argon2 hashing and verification off the event loop"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from .database import UserDB
+from .errors import ServiceUnavailableError
+from .metrics import HASH_SECONDS, registry
+
+
+def _hash(password: str) -> str:
+    return UserDB.hash_password(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return UserDB.verify_password(hashed_password, password)
+
+
+class PasswordHasher:
+    """Bounded worker pool for password hashing.
+    argon2-cffi releases the GIL, so a thread pool already runs hashes in parallel;
+    a process pool is available for deployments that prefer isolation.
+    At most `max_pending` hashes may be running or queued, any further call is
+    rejected straight away with a 503 instead of piling up behind the others.
+    """
+
+    def __init__(
+        self,
+        executor: str = "thread",
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.kind = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._latencies: deque = deque(maxlen=1024)
+        self.completed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        """Build a hasher configured from the PASSWORD_HASH_* environment variables"""
+        workers = os.environ.get("PASSWORD_HASH_WORKERS")
+        max_pending = os.environ.get("PASSWORD_HASH_MAX_PENDING")
+        return cls(
+            executor=os.environ.get("PASSWORD_HASH_EXECUTOR", "thread"),
+            workers=int(workers) if workers else None,
+            max_pending=int(max_pending) if max_pending else None,
+        )
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            pool = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+            self._executor = pool(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ServiceUnavailableError(
+                detail="Too many password operations in progress, try again later"
+            )
+        self._pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+            elapsed = time.perf_counter() - start
+            self._latencies.append(elapsed)
+            HASH_SECONDS.observe(elapsed, operation)
+
+    async def hash(self, password: str) -> str:
+        """Hash the password using Argon2id"""
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify the password against the stored hash"""
+        return await self._run("verify", _verify, password, hashed_password)
+
+    def stats(self) -> dict:
+        """Queue depth and latency (over the last 1024 calls) of the pool"""
+        latencies = sorted(self._latencies)
+
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[int(p * (len(latencies) - 1))] * 1000, 3)
+
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._pending,
+            "queue_depth": max(0, self._pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_ms": pct(0.5),
+            "latency_p95_ms": pct(0.95),
+            "latency_max_ms": pct(1.0),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher.from_env()
+
+
+@registry.collector(
+    "meal_password_hash_operations",
+    "Password operations running or waiting for a worker",
+    labels=("state",),
+)
+def _hash_operations():
+    running = min(hasher._pending, hasher.workers)
+    yield ("running",), running
+    yield ("queued",), hasher._pending - running
+
+
+@registry.collector(
+    "meal_password_hash_rejected_total",
+    "Password operations turned away with a 503 because the queue was full",
+    kind="counter",
+)
+def _hash_rejected():
+    yield (), hasher.rejected
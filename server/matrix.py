@@ -0,0 +1,301 @@
+"""Columnar in-memory copy of the food nutrients for vectorized filtering"""
+
+import asyncio
+import os
+import time
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+from sqlalchemy import Float
+from sqlmodel import select
+
+from .database import FoodDB, async_session
+
+# weight and every nutrient, in table order
+NUMERIC_FIELDS = tuple(
+    c.name for c in FoodDB.__table__.columns if isinstance(c.type, Float)
+)
+
+# rows read per round trip while loading the matrix
+LOAD_BATCH_ROWS = 10_000
+# equal-frequency bins per field for the one-byte codes; the last code is null
+BINS = 255
+NULL_CODE = 255
+# values sampled per field to place the bin edges
+EDGE_SAMPLE_ROWS = 65_536
+# once fewer than 1/N of the foods are left, check the rest of them by position
+SPARSE_FRACTION = 16
+
+
+def _in_range(values: np.ndarray, low: Optional[float], high: Optional[float]):
+    """Mask of `values` within [low, high]; nulls (NaN) never match.
+    Without any bound the value only has to be present.
+    """
+    if low is None and high is None:
+        return ~np.isnan(values)
+    if high is None:
+        return values >= low
+    mask = values <= high
+    if low is not None:
+        mask &= values >= low
+    return mask
+
+
+def _edges(column: np.ndarray) -> np.ndarray:
+    """Bin edges splitting the present values of `column` into BINS equal parts"""
+    present = column[~np.isnan(column)]
+    if not len(present):
+        return np.empty(0)
+    if len(present) > EDGE_SAMPLE_ROWS:
+        present = present[:: len(present) // EDGE_SAMPLE_ROWS]
+    return np.unique(np.quantile(present, np.linspace(0, 1, BINS + 1)[1:-1]))
+
+
+class NutrientMatrix:
+    """NUMERIC_FIELDS of every food as one float64 row per field.
+    Nulls are NaN in `values` (so they fail every comparison) and True in
+    `null`. Every value also has a one-byte code, its bin among the field's
+    quantiles, which searches scan first. Foods are appended in load order
+    (food_id) and deleted ones are tombstoned, so positions are stable until
+    the next reload. The food write handlers keep the matrix current; writes
+    of other workers are picked up by a background reload once it is older
+    than `max_age` seconds. `version` changes with every change of the data,
+    for caches of results computed from it.
+    """
+
+    def __init__(self, fields: tuple = NUMERIC_FIELDS, max_age: float = 300.0):
+        self.fields = fields
+        self.column = {field: i for i, field in enumerate(fields)}
+        self.max_age = max_age
+        self._lock = asyncio.Lock()
+        self._reload: Optional[asyncio.Task] = None
+        # writes made while a load runs, replayed on the loaded matrix
+        self._pending: Optional[list] = None
+        self.version = 0
+        self.reset()
+
+    def replace(self, ids: list, values: np.ndarray):
+        """Swap in a new matrix, `values` shaped (len(fields), len(ids))"""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        self.edges = [_edges(column) for column in values]
+        self.values = values
+        self.null = np.isnan(values)
+        self.codes = self._encode(values)
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.ids = list(ids)
+        self.index = {food_id: row for row, food_id in enumerate(self.ids)}
+        self.size = len(self.ids)
+        self.deleted = 0
+        self.version += 1
+        self.loaded_at: Optional[float] = time.monotonic()
+
+    def reset(self):
+        """Forget the data, the next search loads it again"""
+        self.replace([], np.empty((len(self.fields), 0)))
+        self.loaded_at = None
+
+    def _encode(self, values: np.ndarray) -> np.ndarray:
+        codes = np.empty(values.shape, dtype=np.uint8)
+        for i, edges in enumerate(self.edges):
+            codes[i] = np.searchsorted(edges, values[i], side="right")
+        codes[np.isnan(values)] = NULL_CODE
+        return codes
+
+    def _grow(self, needed: int):
+        capacity = self.values.shape[1]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        shape = (len(self.fields), capacity)
+        grown = (
+            np.full(shape, np.nan),
+            np.ones(shape, dtype=bool),
+            np.full(shape, NULL_CODE, dtype=np.uint8),
+        )
+        for new, old in zip(grown, (self.values, self.null, self.codes)):
+            new[:, : self.size] = old[:, : self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self.size] = self.alive[: self.size]
+        self.values, self.null, self.codes = grown
+        self.alive = alive
+
+    def _upsert(self, foods: list):
+        rows = []
+        for food in foods:
+            food_id = str(food["food_id"])
+            row = self.index.get(food_id)
+            if row is None:
+                row = self.size
+                self._grow(row + 1)
+                self.size += 1
+                self.ids.append(food_id)
+                self.index[food_id] = row
+                self.alive[row] = True
+            rows.append(row)
+        values = np.array(
+            [[food.get(field) for food in foods] for field in self.fields],
+            dtype=float,
+        ).reshape(len(self.fields), len(rows))
+        self.values[:, rows] = values
+        self.null[:, rows] = np.isnan(values)
+        self.codes[:, rows] = self._encode(values)
+
+    def _discard(self, food_id: str):
+        row = self.index.pop(str(food_id), None)
+        if row is None:
+            return
+        self.ids[row] = None
+        self.values[:, row] = np.nan
+        self.null[:, row] = True
+        self.codes[:, row] = NULL_CODE
+        self.alive[row] = False
+        self.deleted += 1
+
+    def upsert(self, foods: Iterable[Mapping]):
+        """Add or overwrite foods, mappings with food_id and the fields"""
+        foods = list(foods)
+        self.version += 1
+        if self._pending is not None:
+            self._pending.append((self._upsert, foods))
+        if self.loaded_at is not None:
+            self._upsert(foods)
+
+    def discard(self, food_id: str):
+        """Drop a deleted food"""
+        self.version += 1
+        if self._pending is not None:
+            self._pending.append((self._discard, food_id))
+        if self.loaded_at is not None:
+            self._discard(food_id)
+
+    async def _load(self):
+        table = FoodDB.__table__
+        query = (
+            select(table.c.food_id, *(table.c[field] for field in self.fields))
+            .order_by(table.c.food_id)
+            .execution_options(yield_per=LOAD_BATCH_ROWS)
+        )
+        self._pending = pending = []
+        try:
+            ids: list = []
+            chunks = [np.empty((len(self.fields), 0))]
+            async with async_session() as session:
+                result = await session.stream(query)
+                async for rows in result.partitions():
+                    ids.extend(row[0] for row in rows)
+                    chunks.append(np.array([row[1:] for row in rows], dtype=float).T)
+            self.replace(ids, np.concatenate(chunks, axis=1))
+            for apply, arg in pending:
+                apply(arg)
+        finally:
+            self._pending = None
+
+    async def _reload_in_background(self):
+        try:
+            async with self._lock:
+                await self._load()
+        finally:
+            self._reload = None
+
+    async def ensure_loaded(self):
+        """Load on first use; refresh in the background once older than max_age"""
+        if self.loaded_at is None:
+            async with self._lock:
+                if self.loaded_at is None:
+                    await self._load()
+        elif (
+            self.max_age
+            and self._reload is None
+            and time.monotonic() - self.loaded_at > self.max_age
+        ):
+            self._reload = asyncio.create_task(self._reload_in_background())
+
+    def search(self, ranges: Mapping) -> np.ndarray:
+        """Positions, ascending, of the foods within every field -> (low, high).
+        Ranges are taken narrowest first (bins hold equal shares of the foods,
+        so the bins a range touches tell how selective it is). While many foods
+        are left, whole columns of codes narrow them down to the touched bins;
+        once few are, the remaining ranges and the exact bounds of the ones
+        already applied are checked on the values of the survivors alone.
+        """
+        size = self.size
+        constraints = []
+        for field, (low, high) in ranges.items():
+            i = self.column[field]
+            edges = self.edges[i]
+            first = 0 if low is None else int(np.searchsorted(edges, low, "right"))
+            last = len(edges)
+            if high is not None:
+                last = int(np.searchsorted(edges, high, "right"))
+            if first > last:
+                return np.empty(0, dtype=np.intp)
+            share = (last - first + 1) / (len(edges) + 1)
+            constraints.append((share, i, first, last, low, high))
+        constraints.sort(key=lambda c: c[0])
+
+        mask = self.alive[:size].copy()
+        rows = None
+        exact = []
+        for _, i, first, last, low, high in constraints:
+            values = self.values[i, :size]
+            if rows is not None:
+                rows = rows[_in_range(values[rows], low, high)]
+                continue
+            # first <= code <= last, as one unsigned comparison
+            mask &= self.codes[i, :size] - np.uint8(first) <= np.uint8(last - first)
+            if low is not None or high is not None:
+                exact.append((values, low, high))
+            if np.count_nonzero(mask) * SPARSE_FRACTION < size:
+                rows = np.flatnonzero(mask)
+        if rows is None:
+            for values, low, high in exact:
+                mask &= _in_range(values, low, high)
+            return np.flatnonzero(mask)
+        for values, low, high in exact:
+            rows = rows[_in_range(values[rows], low, high)]
+        return rows
+
+    def snapshot(self, fields: tuple, food_ids: Iterable = ()) -> "NutrientMatrix":
+        """Copy of `fields` of the foods as they are now, for work done in a
+        thread while reloads and writes change this matrix. Its index only
+        has `food_ids`; positions are this matrix's, as of the snapshot.
+        """
+        fields = tuple(dict.fromkeys(fields))
+        rows = [self.column[field] for field in fields]
+        copy = NutrientMatrix(fields, max_age=0)
+        copy.values = self.values[rows, : self.size]  # fancy indexing copies
+        copy.null = self.null[rows, : self.size]
+        copy.alive = self.alive[: self.size].copy()
+        copy.ids = self.ids[: self.size]
+        copy.index = {
+            food_id: self.index[food_id]
+            for food_id in food_ids
+            if food_id in self.index
+        }
+        copy.size, copy.deleted = self.size, self.deleted
+        copy.version, copy.loaded_at = self.version, self.loaded_at
+        return copy
+
+    def food_ids(self, rows) -> list:
+        return [self.ids[row] for row in rows]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded_at is not None,
+            "foods": self.size - self.deleted,
+            "deleted": self.deleted,
+            "fields": len(self.fields),
+            "bytes": sum(
+                a.nbytes for a in (self.values, self.null, self.codes, self.alive)
+            ),
+            "age_seconds": (
+                round(time.monotonic() - self.loaded_at, 1)
+                if self.loaded_at is not None
+                else None
+            ),
+        }
+
+
+nutrient_matrix = NutrientMatrix(
+    max_age=float(os.environ.get("NUTRIENT_MATRIX_MAX_AGE", 300))
+)
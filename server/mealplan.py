@@ -0,0 +1,89 @@
+"""Nutrient totals of meal plans"""
+
+from itertools import repeat
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import FoodDB
+from .matrix import NUMERIC_FIELDS
+
+NUTRIENT_FIELDS = tuple(field for field in NUMERIC_FIELDS if field != "weight")
+# food ids per IN (...) list, well under the bound-parameter limits
+IN_CHUNK = 5000
+# items accepted in one request, over all of its plans
+MAX_PLAN_ITEMS = 200_000
+
+
+async def load_nutrients(session: AsyncSession, food_ids: list) -> tuple:
+    """(food_id -> position, weights, nutrient values) of the foods that exist.
+    Only the numeric columns are read, no FoodDB objects are built; values are
+    shaped (foods, NUTRIENT_FIELDS) with NaN for nulls.
+    """
+    table = FoodDB.__table__
+    columns = [table.c.food_id, table.c.weight]
+    columns += [table.c[field] for field in NUTRIENT_FIELDS]
+    rows = []
+    for start in range(0, len(food_ids), IN_CHUNK):
+        chunk = food_ids[start : start + IN_CHUNK]
+        query = select(*columns).where(table.c.food_id.in_(chunk))
+        rows.extend((await session.exec(query)).all())
+    index = {row[0]: i for i, row in enumerate(rows)}
+    numbers = np.array([row[1:] for row in rows], dtype=float)
+    numbers = numbers.reshape(len(rows), len(NUTRIENT_FIELDS) + 1)
+    return index, numbers[:, 0], numbers[:, 1:]
+
+
+def plan_totals(plans: list, index: dict, weights, values) -> list:
+    """Totals of every plan, a list of (food_id, grams), as one pass over all items.
+    Nutrient values are per `weight` grams of a food, so each item counts
+    grams / weight times. Nutrients that are null for any food of a plan
+    are listed as missing; foods that don't exist or have no weight can't
+    be scaled and are listed as unknown.
+    """
+    items = [item for plan in plans for item in plan]
+    sizes = np.array([len(plan) for plan in plans], dtype=np.intp)
+    food_ids = [food_id for food_id, _ in items]
+    position = np.fromiter(
+        map(index.get, food_ids, repeat(-1)), dtype=np.intp, count=len(items)
+    )
+    grams = np.array([g for _, g in items], dtype=float)
+
+    # per food first, the few distinct rows are cheaper than every item; unknown
+    # foods (position -1) land on a trailing row that can't be scaled
+    weights = np.append(weights, np.nan)
+    scalable = weights > 0  # False for NaN too
+    null = np.vstack([np.isnan(values), np.zeros(len(NUTRIENT_FIELDS), bool)])
+    null &= scalable[:, None]
+    values = np.vstack([np.nan_to_num(values), np.zeros(len(NUTRIENT_FIELDS))])
+
+    usable = scalable[position]
+    factor = np.divide(grams, weights[position], out=np.zeros_like(grams), where=usable)
+    totals = np.zeros((len(plans), len(NUTRIENT_FIELDS)))
+    missing = np.zeros(totals.shape, dtype=bool)
+    plan_grams = np.zeros(len(plans))
+    filled = sizes > 0
+    if filled.any():
+        starts = (np.cumsum(sizes) - sizes)[filled]
+        contributions = values[position] * factor[:, None]
+        totals[filled] = np.add.reduceat(contributions, starts, axis=0)
+        missing[filled] = np.logical_or.reduceat(null[position], starts, axis=0)
+        plan_grams[filled] = np.add.reduceat(np.where(usable, grams, 0.0), starts)
+
+    unknown: list = [[] for _ in plans]
+    owner = np.repeat(np.arange(len(plans)), sizes)
+    for i in np.flatnonzero(~usable):
+        unknown[owner[i]].append(food_ids[i])
+
+    return [
+        {
+            "grams": grams_,
+            "totals": dict(zip(NUTRIENT_FIELDS, row)),
+            "missing": [f for f, m in zip(NUTRIENT_FIELDS, flags) if m],
+            "unknown_foods": unknown_,
+        }
+        for grams_, row, flags, unknown_ in zip(
+            plan_grams.tolist(), totals.tolist(), missing.tolist(), unknown
+        )
+    ]
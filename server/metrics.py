@@ -0,0 +1,275 @@
+"""Request, database and password hashing metrics in Prometheus text format.
+
+Recording is a bisect and a few additions under a lock per observation, so
+it stays on in production; METRICS_ENABLED=0 skips the middleware and the
+engine hooks altogether. Routes are labelled by their path template, which
+keeps the number of series bounded whatever paths clients ask for.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA", "BEGIN", "COMMIT"}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Bucketed observations per set of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(float(b) for b in buckets)
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [
+                (k, list(counts), total) for k, (counts, total) in self._series.items()
+            ]
+        for values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _labels(self.labels, values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Counter:
+    """Monotonic count per set of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: int = 1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, count in series:
+            yield f"{self.name}{_labels(self.labels, values)} {_number(count)}"
+
+
+class Collected:
+    """Values read from their owner at scrape time, gauges mostly"""
+
+    def __init__(
+        self, name: str, help: str, kind: str, labels: tuple, collect: Callable
+    ):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for values, value in self.collect():
+            yield f"{self.name}{_labels(self.labels, values)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def histogram(self, name: str, help: str, labels: tuple, buckets: tuple):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels: tuple = ()):
+        return self._add(Counter(name, help, labels))
+
+    def collector(self, name: str, help: str, kind: str = "gauge", labels: tuple = ()):
+        """Decorator registering a function that yields (label values, value)"""
+
+        def register(collect: Callable) -> Callable:
+            self._add(Collected(name, help, kind, labels, collect))
+            return collect
+
+        return register
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "meal_http_request_duration_seconds",
+    "Time to handle a request, by route template",
+    ("method", "route"),
+    LATENCY_BUCKETS,
+)
+RESPONSES = registry.counter(
+    "meal_http_responses_total",
+    "Responses sent, by route template and status code",
+    ("method", "route", "status"),
+)
+REQUEST_QUERIES = registry.histogram(
+    "meal_http_request_queries",
+    "Database statements run while handling a request",
+    ("method", "route"),
+    COUNT_BUCKETS,
+)
+QUERY_SECONDS = registry.histogram(
+    "meal_db_query_duration_seconds",
+    "Time to execute a database statement, by engine and statement type",
+    ("engine", "statement"),
+    QUERY_BUCKETS,
+)
+HASH_SECONDS = registry.histogram(
+    "meal_password_hash_duration_seconds",
+    "Time of an Argon2 hash or verify, waiting for a worker included",
+    ("operation",),
+    HASH_BUCKETS,
+)
+
+# statements run by the current request, set by MetricsMiddleware
+_request_queries: ContextVar[Optional[list]] = ContextVar(
+    "request_queries", default=None
+)
+_engines: dict = {}
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement `engine` runs (a sync Engine, for an AsyncEngine
+    its sync_engine) and report its connection pool
+    """
+    _engines[name] = engine
+    if not ENABLED:
+        return
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip()[:7].split(None, 1)
+        verb = verb[0].upper() if verb else ""
+        QUERY_SECONDS.observe(elapsed, name, verb if verb in VERBS else "OTHER")
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    def failed(context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", failed)
+
+
+@registry.collector(
+    "meal_db_pool_connections",
+    "Connections of each engine's pool by state",
+    labels=("engine", "state"),
+)
+def _pool_connections():
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue  # NullPool and StaticPool keep no counts
+        yield (name, "checked_out"), pool.checkedout()
+        yield (name, "idle"), pool.checkedin()
+        yield (name, "overflow"), max(0, pool.overflow())
+        yield (name, "size"), pool.size()
+
+
+class MetricsMiddleware:
+    """Records latency, status and statement count of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            return await self.app(scope, receive, send)
+
+        status = 500  # unless a response starts before an error escapes
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            # the router leaves the matched route in the scope
+            route = getattr(scope.get("route"), "path_format", None) or "unmatched"
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            REQUEST_SECONDS.observe(elapsed, method, route)
+            REQUEST_QUERIES.observe(queries[0], method, route)
+            RESPONSES.inc(method, route, str(status))
@@ -1,6 +1,6 @@
 """API Models"""
 
-from typing import Union, Optional
+from typing import Annotated, Dict, List, Tuple, Union, Optional
 from uuid import UUID, uuid4
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -131,3 +131,160 @@ class FoodModel(BaseModel):
     def __str__(self):
         """String representation of the Food object"""
         return f"Food(name={self.name}, brand={self.brand}, weight={self.weight})"
+
+
+class FoodImportModel(BaseModel):
+    """One row of a bulk food import"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    food_id: UUID = Field(default_factory=uuid4)
+    name: str
+    brand: Optional[str] = None
+    weight: Optional[float] = None
+
+    # Nutritional facts
+    calories: Optional[int] = None
+    total_fat: Optional[float] = None
+    saturated_fat: Optional[float] = None
+    trans_fat: Optional[float] = None
+    cholesterol: Optional[float] = None
+    protein: Optional[float] = None
+    dietary_fiber: Optional[float] = None
+    total_carbohydrate: Optional[float] = None
+
+    # Essential Minerals
+    sodium: Optional[float] = None
+    chloride: Optional[float] = None
+    potassium: Optional[float] = None
+    sugars: Optional[float] = None
+    iron: Optional[float] = None
+    zinc: Optional[float] = None
+    selenium: Optional[float] = None
+    calcium: Optional[float] = None
+    iodine: Optional[float] = None
+    magnesium: Optional[float] = None
+    phosphorus: Optional[float] = None
+    fluoride: Optional[float] = None
+
+    # Essential Vitamins
+    vitamin_a: Optional[float] = None
+    vitamin_d: Optional[float] = None
+    vitamin_e: Optional[float] = None
+    vitamin_k: Optional[float] = None
+    thiamin: Optional[float] = None
+    riboflavin: Optional[float] = None
+    niacin: Optional[float] = None
+    vitamin_b1: Optional[float] = None
+    vitamin_b6: Optional[float] = None
+    vitamin_b12: Optional[float] = None
+    folate: Optional[float] = None
+    vitamin_c: Optional[float] = None
+
+
+class NutrientRange(BaseModel):
+    """Inclusive bounds for one nutrient, either may be left out"""
+
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class NutrientSearchModel(BaseModel):
+    """Body of a nutrient search: field name -> range, plus paging"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    ranges: Dict[str, NutrientRange]
+    limit: int = Field(default=5, ge=1, le=1000)
+    cursor: Optional[str] = None
+
+
+class FoodBatchModel(BaseModel):
+    """Body of a batch lookup, the food ids in the order they should come back"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    food_ids: List[str] = Field(min_length=1, max_length=1000)
+
+
+class MealPlanModel(BaseModel):
+    """Body of a meal plan totals request, each plan a list of (food_id, grams)"""
+
+    plans: List[List[Tuple[str, Annotated[float, Field(ge=0)]]]]
+
+
+class MealPlanTotals(BaseModel):
+    """Nutrient totals of one meal plan"""
+
+    grams: float
+    totals: Dict[str, float]
+    missing: List[str]
+    unknown_foods: List[str]
+
+
+class NutrientTarget(NutrientRange):
+    """Daily target and/or bounds for one nutrient"""
+
+    target: Optional[float] = None
+
+
+class MealOptimizeModel(BaseModel):
+    """Body of a meal plan optimization"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    targets: Dict[str, NutrientTarget]
+    include: List[str] = []
+    exclude: List[str] = []
+    max_items: int = Field(default=5, ge=1, le=20)
+    min_portion: float = Field(default=10, ge=0)
+    max_portion: float = Field(default=500, gt=0)
+    time_budget_ms: int = Field(default=500, ge=10, le=5000)
+
+
+class OptimizedFood(BaseModel):
+    food_id: str
+    name: Optional[str]
+    grams: float
+
+
+class OptimizedNutrient(NutrientTarget):
+    value: float
+
+
+class MealOptimizeResult(BaseModel):
+    """A meal plan from the optimizer and how close it gets"""
+
+    foods: List[OptimizedFood]
+    nutrients: Dict[str, OptimizedNutrient]
+    deviation: float
+    candidates: int
+    complete: bool
+    elapsed_ms: float
+
+
+class Histogram(BaseModel):
+    """`counts[i]` values between `edges[i]` and `edges[i + 1]`"""
+
+    edges: List[float]
+    counts: List[int]
+
+
+class NutrientStats(BaseModel):
+    """Aggregates of one field, nulls left out"""
+
+    count: int
+    nulls: int
+    mean: Optional[float]
+    std: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    percentiles: Dict[str, Optional[float]]
+    histogram: Histogram
+
+
+class NutrientStatsResult(BaseModel):
+    """Aggregates of the fields over the foods matching a filter"""
+
+    foods: int
+    fields: Dict[str, NutrientStats]
@@ -0,0 +1,281 @@
+"""Meal plans that hit nutrient targets, solved over the nutrient matrix.
+
+The diet problem is posed as a bounded least-squares problem rather than an
+LP: portions (grams) minimize the squared relative deviation from each
+target, min/max bounds add a heavier penalty once crossed, and each portion
+is boxed between a minimum and maximum. That keeps it solvable with NumPy
+alone by projected Newton steps, and makes "as close as possible" well
+defined when no plan meets every bound. The number of foods is limited by a
+greedy choice of support followed by local swaps until the time budget runs
+out, always keeping the best plan found so far.
+"""
+
+import time
+from typing import Mapping, Optional
+
+import numpy as np
+
+from .matrix import NutrientMatrix
+
+# foods the solver sees after pre-filtering, and how many of them are the
+# best sources of each targeted nutrient rather than the best overall
+CANDIDATES = 256
+PER_NUTRIENT = 16
+# foods scored per block while pre-filtering, bounds the temporary arrays
+SCORE_BLOCK_ROWS = 100_000
+# a crossed bound costs this much more than the same miss of a target
+BOUND_WEIGHT = 10.0
+# Newton steps per solve, the smallest fraction of one tried, and the relative
+# gain below which a solve stops early
+SOLVE_ITERATIONS = 50
+MIN_STEP = 1e-3
+TOLERANCE = 1e-6
+
+
+class Objective:
+    """Squared relative deviation of A @ grams from targets and bounds.
+    Rows of A are the targeted nutrients per gram of each food, divided by
+    the nutrient's scale (its target, else its min, else its max), so every
+    target sits at 1 and a 10% miss costs the same for every nutrient.
+    """
+
+    def __init__(self, density: np.ndarray, targets: list):
+        scale = np.array([_scale(t) for t in targets])
+        self.A = density / scale[:, None]
+        self.target = np.array([_or(t.target, np.nan) for t in targets]) / scale
+        self.low = np.array([_or(t.min, -np.inf) for t in targets]) / scale
+        self.high = np.array([_or(t.max, np.inf) for t in targets]) / scale
+        self.has_target = ~np.isnan(self.target)
+        self.target = np.nan_to_num(self.target)
+
+    def residuals(self, y: np.ndarray) -> tuple:
+        miss = np.where(self.has_target, y - self.target, 0.0)
+        crossed = np.minimum(y - self.low, 0.0) + np.maximum(y - self.high, 0.0)
+        return miss, crossed
+
+    def _value(self, y: np.ndarray) -> float:
+        miss, crossed = self.residuals(y)
+        return float(miss @ miss + BOUND_WEIGHT * crossed @ crossed)
+
+    def value(self, columns, grams: np.ndarray) -> float:
+        return self._value(self.A[:, columns] @ grams)
+
+    def gradient(self, columns, grams: np.ndarray, of=None) -> np.ndarray:
+        """Gradient for the foods `of` (default: `columns`) at `grams` of `columns`"""
+        miss, crossed = self.residuals(self.A[:, columns] @ grams)
+        A = self.A[:, columns if of is None else of]
+        return 2 * A.T @ (miss + BOUND_WEIGHT * crossed)
+
+    def _piece(self, y: np.ndarray) -> tuple:
+        """Weight and aim per nutrient of the quadratic the objective is around y.
+        A target and a crossed bound on the same nutrient merge into one aim
+        in between, weighted by both.
+        """
+        weight = self.has_target.astype(float)
+        below, above = y < self.low, y > self.high
+        crossed = below | above
+        bound = np.where(below, self.low, 0.0) + np.where(above, self.high, 0.0)
+        aim = self.target * weight + BOUND_WEIGHT * bound
+        weight += BOUND_WEIGHT * crossed
+        return weight, np.divide(aim, weight, out=np.zeros_like(aim), where=weight > 0)
+
+    def solve(self, columns, low, high, grams=None, iterations=SOLVE_ITERATIONS):
+        """Portions of `columns` within [low, high] minimizing the objective.
+        Projected Newton: portions stuck at a bound they push against are
+        held, the rest jump to the least-squares optimum of the current
+        quadratic piece, and the step is halved until the objective drops.
+        """
+        A = self.A[:, columns]
+        low = np.broadcast_to(low, len(columns))
+        high = np.broadcast_to(high, len(columns))
+        x = np.clip(np.zeros(len(columns)) if grams is None else grams, low, high)
+        y = A @ x
+        value = self._value(y)
+        for _ in range(iterations):
+            weight, aim = self._piece(y)
+            slope = A.T @ (weight * (y - aim))
+            free = ~(((x <= low) & (slope > 0)) | ((x >= high) & (slope < 0)))
+            if not free.any():
+                break
+            root = np.sqrt(weight)
+            step = np.zeros(len(columns))
+            step[free] = np.linalg.lstsq(
+                root[:, None] * A[:, free], root * (aim - y), rcond=None
+            )[0]
+            scale = 1.0
+            while scale > MIN_STEP:
+                moved = np.clip(x + scale * step, low, high)
+                moved_y = A @ moved
+                moved_value = self._value(moved_y)
+                if moved_value < value:
+                    break
+                scale /= 2
+            else:
+                break
+            gain = value - moved_value
+            x, y, value = moved, moved_y, moved_value
+            if gain <= TOLERANCE * value:
+                break
+        return x
+
+
+def _or(value, default):
+    return default if value is None else value
+
+
+def _scale(target) -> float:
+    for value in (target.target, target.min, target.max):
+        if value:
+            return abs(value)
+    return 1.0
+
+
+def candidates(
+    matrix: NutrientMatrix,
+    fields: list,
+    objective_targets: list,
+    include: list,
+    exclude: set,
+    max_portion: float,
+    max_items: int,
+) -> np.ndarray:
+    """Positions in `matrix` of the foods worth handing to the solver.
+    Foods need a weight and every targeted nutrient. They are ranked by how
+    well their nutrient mix points at the targets (cosine similarity) times
+    how much of the way `max_items` portions of them could get; the best
+    sources of each nutrient that has a target or min are kept as well.
+    """
+    size = matrix.size
+    rows = [matrix.column[field] for field in fields]
+    weight = matrix.values[matrix.column["weight"], :size]
+    usable = matrix.alive[:size] & (weight > 0)
+    usable &= ~matrix.null[rows, :size].any(axis=0)
+    for food_id in exclude:
+        position = matrix.index.get(food_id)
+        if position is not None:
+            usable[position] = False
+    positions = np.flatnonzero(usable)
+
+    scale = np.array([_scale(t) for t in objective_targets])
+    wanted = np.array(
+        [t.target is not None or t.min is not None for t in objective_targets]
+    )
+    direction = wanted.astype(float)
+    scores = np.empty(len(positions))
+    best = [[] for _ in fields]
+    for start in range(0, len(positions), SCORE_BLOCK_ROWS):
+        block = positions[start : start + SCORE_BLOCK_ROWS]
+        density = matrix.values[np.ix_(rows, block)] / weight[block] / scale[:, None]
+        along = direction @ density
+        norm = np.linalg.norm(density, axis=0)
+        cosine = np.divide(along, norm, out=np.zeros_like(along), where=norm > 0)
+        reach = np.minimum(
+            1.0, along * max_portion * max_items / max(direction.sum(), 1)
+        )
+        scores[start : start + len(block)] = cosine * reach
+        for j in np.flatnonzero(wanted):
+            top = min(PER_NUTRIENT, len(block))
+            picked = np.argpartition(-density[j], top - 1)[:top]
+            best[j].append(np.stack([density[j, picked], block[picked]]))
+
+    chosen = set()
+    if len(positions):
+        top = min(CANDIDATES, len(positions))
+        chosen.update(positions[np.argpartition(-scores, top - 1)[:top]].tolist())
+    for pairs in best:
+        if pairs:
+            pairs = np.concatenate(pairs, axis=1)
+            order = np.argsort(-pairs[0])[:PER_NUTRIENT]
+            chosen.update(pairs[1, order].astype(np.intp).tolist())
+    chosen.update(matrix.index[food_id] for food_id in include)
+    return np.array(sorted(chosen), dtype=np.intp)
+
+
+def optimize(
+    matrix: NutrientMatrix,
+    targets: Mapping,
+    include: list,
+    exclude: set,
+    max_items: int,
+    min_portion: float,
+    max_portion: float,
+    budget: float,
+) -> Optional[dict]:
+    """Best plan found within `budget` seconds, None without any candidate.
+    Returns the chosen positions and grams, the objective value and whether
+    the local search finished before the deadline.
+    """
+    deadline = time.perf_counter() + budget
+    fields = list(targets)
+    specs = [targets[field] for field in fields]
+    pool = candidates(matrix, fields, specs, include, exclude, max_portion, max_items)
+    if not len(pool):
+        return None
+    rows = [matrix.column[field] for field in fields]
+    weight = matrix.values[matrix.column["weight"], pool]
+    density = matrix.values[np.ix_(rows, pool)] / weight
+    objective = Objective(density, specs)
+    forced = np.isin(pool, [matrix.index[food_id] for food_id in include])
+
+    everything = np.arange(len(pool))
+
+    def fit(columns, grams=None):
+        portions = objective.solve(columns, min_portion, max_portion, grams)
+        return portions, objective.value(columns, portions)
+
+    def improve(moves):
+        """Apply the best of (columns, starting grams) moves if it beats the plan"""
+        nonlocal support, best_grams, best_value, tried
+        fits = [fit(*move) for move in moves]
+        values = [value for _, value in fits]
+        if not values or min(values) >= best_value:
+            return False
+        i = int(np.argmin(values))
+        support, (best_grams, best_value) = moves[i][0], fits[i]
+        tried = set(support)
+        return True
+
+    # grown greedily from the included foods, then improved by swaps
+    support = np.flatnonzero(forced).tolist()
+    best_grams, best_value = fit(support)
+    tried: set = set(support)
+    dropped = True
+    complete = False
+    while time.perf_counter() < deadline:
+        # without one of the foods that weren't asked for, whose minimum
+        # portion may overshoot; once per plan, it doesn't depend on newcomers
+        optional = [i for i, c in enumerate(support) if not forced[c]]
+        if not dropped and len(support) > 1:
+            dropped = True
+            if improve([(support[:i] + support[i + 1 :], None) for i in optional]):
+                continue
+        # the untried food whose first gram would lower the deviation the most
+        # (or raise it the least, a swap can still pay off when it overshoots)
+        outside = np.array([c for c in everything if c not in tried], dtype=np.intp)
+        if not len(outside):
+            complete = True
+            break
+        slope = objective.gradient(support, best_grams, of=outside)
+        newcomer = int(outside[np.argmin(slope)])
+        tried.add(newcomer)
+        # add it, or put it in place of a food that wasn't asked for
+        moves = [
+            (
+                support[:i] + support[i + 1 :] + [newcomer],
+                np.append(np.delete(best_grams, i), min_portion),
+            )
+            for i in optional
+        ]
+        if len(support) < max_items:
+            moves.append((support + [newcomer], np.append(best_grams, min_portion)))
+        if improve(moves):
+            dropped = False
+
+    return {
+        "positions": pool[support],
+        "grams": best_grams,
+        "achieved": density[:, support] @ best_grams,
+        "deviation": best_value,
+        "candidates": len(pool),
+        "complete": complete,
+    }
@@ -0,0 +1,41 @@
+"""Opaque cursors for keyset pagination"""
+
+import base64
+import binascii
+import json
+from typing import Optional
+
+from .errors import BadRequestError
+
+# most rows a list route returns per page
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(position: dict) -> str:
+    """Encode a page position as an opaque, URL-safe string"""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> dict:
+    """Decode a cursor made by encode_cursor, an empty one is the first page"""
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequestError(detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise BadRequestError(detail="Invalid cursor")
+    return position
+
+
+def next_page(rows: list, limit: int, position) -> tuple:
+    """Split the `limit + 1` rows fetched for a page into the page and next cursor.
+    `position(last_row)` returns the position to encode in the cursor.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(position(rows[-1]))
@@ -0,0 +1,258 @@
+"""Food popularity: hits counted in memory, written behind in batches.
+
+GET /api/food/get/{food_id} only adds to a dict, so a read never waits on
+a write. A background task swaps the dict out every
+POPULARITY_FLUSH_INTERVAL seconds (sooner once POPULARITY_MAX_PENDING
+foods are waiting) and adds it to the stats table with one UPSERT per
+batch, whose RETURNING all-time totals feed a top-K heap that serves
+GET /api/food/popular. Foods other workers made popular are picked up by
+reloading the top from the table every POPULARITY_RELOAD_INTERVAL
+seconds. A failed flush keeps its hits for the next one, but never more
+than POPULARITY_MAX_PENDING foods are held: hits of foods beyond that
+are dropped and counted while the database is unreachable. Hits of the
+last interval are lost if the process dies.
+"""
+
+import asyncio
+import heapq
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import delete, select
+
+from .database import StatsDB, async_session
+
+UPSERT_BATCH_ROWS = 5000
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class TopK:
+    """The `capacity` largest counts, a min-heap of (count, key) whose entries
+    are dropped lazily once their key has moved on or left
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self._heap: list = []
+        self._ranked: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _prune(self):
+        heap = self._heap
+        while heap and self.counts.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def update(self, key: str, count: int):
+        """Set the count of `key`, which enters if it beats the smallest"""
+        if key not in self.counts and len(self.counts) >= self.capacity:
+            self._prune()
+            if not self._heap or count <= self._heap[0][0]:
+                return
+            del self.counts[heapq.heappop(self._heap)[1]]
+        self.counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 4 * self.capacity + 64:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+        self._ranked = None
+
+    def discard(self, key: str):
+        if self.counts.pop(key, None) is not None:
+            self._ranked = None
+
+    def top(self, k: int) -> list:
+        """(key, count) of the `k` largest, largest first"""
+        if self._ranked is None:
+            self._ranked = sorted(self.counts.items(), key=lambda i: (-i[1], i[0]))
+        return self._ranked[:k]
+
+
+class Popularity:
+    """Hits per food, flushed to StatsDB by a background task"""
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        interval: float = 5.0,
+        max_pending: int = 100_000,
+        capacity: int = 100,
+        reload_interval: float = 60.0,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_pending = max_pending
+        self.reload_interval = reload_interval
+        self.top = TopK(capacity)
+        self._pending: Counter = Counter()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._reloaded_at: Optional[float] = None
+        self.flushes = 0
+        self.flushed_hits = 0
+        self.failures = 0
+        self.dropped_hits = 0
+        self.last_flush_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Popularity":
+        """Configured from the POPULARITY_* environment variables"""
+        return cls(
+            interval=float(os.environ.get("POPULARITY_FLUSH_INTERVAL", 5)),
+            max_pending=int(os.environ.get("POPULARITY_MAX_PENDING", 100_000)),
+            capacity=int(os.environ.get("POPULARITY_TOP_SIZE", 100)),
+            reload_interval=float(os.environ.get("POPULARITY_RELOAD_INTERVAL", 60)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def hit(self, food_id: str):
+        """Count a read of `food_id`"""
+        if not self.enabled:
+            return
+        pending = self._pending
+        if food_id not in pending and len(pending) >= self.max_pending:
+            self.dropped_hits += 1
+            return
+        pending[food_id] += 1
+        if len(pending) >= self.max_pending:
+            self._wake.set()
+
+    def _keep(self, hits: Counter):
+        """Put back the hits of a failed flush, up to max_pending foods"""
+        pending = self._pending
+        for food_id, count in hits.items():
+            if food_id in pending or len(pending) < self.max_pending:
+                pending[food_id] += count
+            else:
+                self.dropped_hits += count
+
+    def discard(self, food_id: str):
+        """Forget a deleted food, the caller drops its stats row"""
+        self._pending.pop(food_id, None)
+        self.top.discard(food_id)
+
+    def popular(self, k: int) -> list:
+        """(food_id, hits) of the `k` most read foods, as of the last flush"""
+        return self.top.top(k)
+
+    async def flush(self):
+        """Add the pending hits to the stats table"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, Counter()
+            start = time.perf_counter()
+            try:
+                if self._reloaded_at is None or (
+                    time.monotonic() - self._reloaded_at > self.reload_interval
+                ):
+                    await self._reload()
+                totals = await self._upsert(list(pending.items())) if pending else []
+            except Exception:
+                self._keep(pending)  # for the next flush
+                self.failures += 1
+                raise
+            if not pending:
+                return
+            for food_id, hits in totals:
+                self.top.update(food_id, hits)
+            self.flushes += 1
+            self.flushed_hits += sum(pending.values())
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    async def _upsert(self, hits: list) -> list:
+        table = StatsDB.__table__
+        totals = []
+        async with self.session_factory() as session:
+            query = UPSERTS[session.bind.dialect.name](table)
+            # one compiled statement, sent as multi-row VALUES batches
+            query = query.on_conflict_do_update(
+                index_elements=[table.c.food_id],
+                set_={"hits": table.c.hits + query.excluded.hits},
+            ).returning(table.c.food_id, table.c.hits)
+            for start in range(0, len(hits), UPSERT_BATCH_ROWS):
+                batch = hits[start : start + UPSERT_BATCH_ROWS]
+                params = [
+                    {"food_id": food_id, "hits": count} for food_id, count in batch
+                ]
+                totals.extend((await session.exec(query, params=params)).all())
+            await session.commit()
+        return totals
+
+    async def _reload(self):
+        """Refill the top from the table, with the hits of every worker"""
+        query = (
+            select(StatsDB.food_id, StatsDB.hits)
+            .order_by(StatsDB.hits.desc())
+            .limit(self.top.capacity)
+        )
+        async with self.session_factory() as session:
+            rows = (await session.exec(query)).all()
+        top = TopK(self.top.capacity)
+        for food_id, hits in rows:
+            top.update(food_id, hits)
+        self.top = top
+        self._reloaded_at = time.monotonic()
+
+    async def forget(self, session, food_id: str):
+        """Drop a deleted food's counts, in the caller's transaction"""
+        self.discard(food_id)
+        await session.exec(delete(StatsDB).where(StatsDB.food_id == food_id))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # counted in failures, retried with the next flush
+
+    def start(self):
+        """Start the background flushes, from the running event loop"""
+        if self.enabled and self._task is None:
+            # bound to this loop, each app lifespan may run on its own
+            self._flush_lock = asyncio.Lock()
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flushes after a last one"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # counted in failures
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending_foods": len(self._pending),
+            "pending_hits": sum(self._pending.values()),
+            "flushes": self.flushes,
+            "flushed_hits": self.flushed_hits,
+            "failures": self.failures,
+            "dropped_hits": self.dropped_hits,
+            "last_flush_ms": self.last_flush_ms,
+            "top_size": len(self.top),
+        }
+
+
+popularity = Popularity.from_env()
@@ -0,0 +1,221 @@
+"""Token bucket rate limits for the endpoints that hash passwords.
+
+Login is limited per client IP and per username, signup per client IP, so a
+credential stuffing burst is turned away with a 429 before it reaches the
+Argon2 pool. The checks are route dependencies and cost a dict lookup.
+
+Each bucket is kept as a single float, the time at which it will be full
+again (the "generic cell rate algorithm" form of a token bucket), in an LRU
+of at most RATE_LIMIT_MAX_KEYS entries; forgetting a key only refills its
+bucket early. Workers on one host can share their buckets through a SQLite
+file named by RATE_LIMIT_STORE, updated with one atomic UPSERT per check.
+Limits are "attempts/seconds", e.g. RATE_LIMIT_LOGIN_IP=20/60, and "off"
+turns a rule off. Client IPs come from the connection, behind a proxy run
+uvicorn with --proxy-headers and --forwarded-allow-ips.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request
+
+from .errors import TooManyRequestsError
+from .metrics import registry
+
+DEFAULT_LIMITS = {
+    "login_ip": "20/60",
+    "login_user": "10/60",
+    "signup_ip": "5/60",
+}
+MAX_KEY_LENGTH = 128
+PRUNE_EVERY = 1000  # shared store checks between sweeps of full buckets
+
+
+class Limit(NamedTuple):
+    """`capacity` attempts at once, refilled over `period` seconds"""
+
+    capacity: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.capacity
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Limit"]:
+        """'20/60' -> Limit(20, 60.0), 'off' -> None"""
+        if value.strip().lower() in ("", "off"):
+            return None
+        capacity, _, period = value.partition("/")
+        if int(capacity) <= 0:
+            return None
+        return cls(int(capacity), float(period or 60))
+
+
+def wait_time(full_at: float, limit: Limit, now: float) -> tuple:
+    """(new full-at time, 0) for an allowed attempt, (full_at, seconds to
+    wait) for a rejected one
+    """
+    after = max(full_at, now) + limit.interval
+    if after - now > limit.period:
+        return full_at, after - now - limit.period
+    return after, 0.0
+
+
+class MemoryBuckets:
+    """Buckets of this process, least recently used ones forgotten first"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._full_at: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        """Take a token, the seconds to wait for one if there is none"""
+        with self._lock:
+            full_at, wait = wait_time(self._full_at.get(key, now), limit, now)
+            self._full_at[key] = full_at
+            self._full_at.move_to_end(key)
+            while len(self._full_at) > self.maxsize:
+                self._full_at.popitem(last=False)
+                self.evictions += 1
+            return wait
+
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file shared by the workers of a host.
+    A locked or unreadable file falls back to this process' own buckets.
+    """
+
+    def __init__(self, path: str, fallback: MemoryBuckets):
+        self.path = path
+        self.fallback = fallback
+        self.failures = 0
+        self._checks = 0
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=0.05, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # limits needn't survive a crash
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets"
+                " (key TEXT PRIMARY KEY, full_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM buckets").fetchone()[0]
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        try:
+            return self._take(key, limit, now)
+        except sqlite3.Error:
+            self.failures += 1
+            return self.fallback.take(key, limit, now)
+
+    def _take(self, key: str, limit: Limit, now: float) -> float:
+        conn = self.conn
+        params = {"key": key, "now": now, "step": limit.interval, "max": limit.period}
+        # the update only happens when the attempt is allowed, see wait_time
+        taken = conn.execute(
+            "INSERT INTO buckets (key, full_at) VALUES (:key, :now + :step)"
+            " ON CONFLICT (key) DO UPDATE SET full_at = max(full_at, :now) + :step"
+            " WHERE max(full_at, :now) + :step - :now <= :max"
+            " RETURNING full_at",
+            params,
+        ).fetchone()
+        self._checks += 1
+        if self._checks % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+        if taken is not None:
+            return 0.0
+        row = conn.execute("SELECT full_at FROM buckets WHERE key = ?", (key,))
+        return wait_time(row.fetchone()[0], limit, now)[1]
+
+
+class RateLimiter:
+    """Named limits over a bucket store"""
+
+    def __init__(self, limits: Dict[str, Optional[Limit]], store=None):
+        self.limits = limits
+        self.store = store if store is not None else MemoryBuckets()
+        self.allowed = dict.fromkeys(limits, 0)
+        self.rejected = dict.fromkeys(limits, 0)
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Configured from the RATE_LIMIT_* environment variables"""
+        limits = {
+            name: Limit.parse(os.environ.get(f"RATE_LIMIT_{name.upper()}", default))
+            for name, default in DEFAULT_LIMITS.items()
+        }
+        memory = MemoryBuckets(int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100_000)))
+        path = os.environ.get("RATE_LIMIT_STORE")
+        return cls(limits, SQLiteBuckets(path, memory) if path else memory)
+
+    def check(self, name: str, key: str):
+        """Count an attempt against `name` for `key`, 429 when over the limit"""
+        limit = self.limits.get(name)
+        if limit is None:
+            return
+        wait = self.store.take(f"{name}:{key[:MAX_KEY_LENGTH]}", limit, time.time())
+        if wait > 0:
+            self.rejected[name] += 1
+            raise TooManyRequestsError(
+                detail="Too many attempts, try again later", retry_after=wait
+            )
+        self.allowed[name] += 1
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "keys": len(self.store),
+            "limits": {
+                name: f"{limit.capacity}/{limit.period:g}s" if limit else "off"
+                for name, limit in self.limits.items()
+            },
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+limiter = RateLimiter.from_env()
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login(request: Request, username: str):
+    """Dependency of the login route, runs before the password is verified"""
+    limiter.check("login_ip", client_ip(request))
+    limiter.check("login_user", username.strip().lower())
+
+
+async def limit_signup(request: Request):
+    """Dependency of the signup route, runs before the password is hashed"""
+    limiter.check("signup_ip", client_ip(request))
+
+
+@registry.collector(
+    "meal_rate_limit_rejected_total",
+    "Attempts turned away with a 429, by limit",
+    kind="counter",
+    labels=("limit",),
+)
+def _rejected():
+    for name, count in limiter.rejected.items():
+        yield (name,), count
@@ -0,0 +1,181 @@
+"""Read replicas: read-only handlers query them, writes stay on the primary.
+
+Replicas are listed in DATABASE_REPLICA_URLS (comma separated, any URL the
+primary could use, SQLite copies included) and share its storage profile
+settings. Reads rotate over the healthy ones; a replica that can't be
+reached or fails a query sits out REPLICA_RETRY_SECONDS while its reads go
+to the primary. A client that just wrote gets a cookie that keeps its
+reads on the primary for READ_YOUR_WRITES_SECONDS, so it sees its own
+writes whatever the replication lag.
+"""
+
+import os
+import time
+from contextlib import asynccontextmanager
+from itertools import count
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import async_session, async_url
+from .metrics import instrument_engine
+from .storage import storage_profile
+
+STICKY_COOKIE = "read_primary_until"
+# errors that say the replica itself is unwell rather than the query
+REPLICA_ERRORS = (OperationalError, InterfaceError, OSError)
+
+
+class Replica:
+    def __init__(self, url: str):
+        storage = storage_profile(url)
+        self.engine = create_async_engine(
+            async_url(url), **storage.engine_options(url, True)
+        )
+        storage.configure(self.engine.sync_engine)
+        self.session = async_sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        instrument_engine(self.engine.sync_engine, self.name)
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaSet:
+    """The replicas to read from, their health and read-your-writes routing"""
+
+    def __init__(
+        self, urls: list, sticky_seconds: float = 5.0, retry_seconds: float = 30.0
+    ):
+        self.replicas = [Replica(url) for url in urls]
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._turn = count()
+        self.primary_reads = 0
+
+    @classmethod
+    def from_env(cls) -> "ReplicaSet":
+        """Configured from DATABASE_REPLICA_URLS, READ_YOUR_WRITES_SECONDS and
+        REPLICA_RETRY_SECONDS
+        """
+        urls = os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        return cls(
+            [url.strip() for url in urls if url.strip()],
+            sticky_seconds=float(os.environ.get("READ_YOUR_WRITES_SECONDS", 5)),
+            retry_seconds=float(os.environ.get("REPLICA_RETRY_SECONDS", 30)),
+        )
+
+    def pick(self) -> Optional[Replica]:
+        """The next healthy replica, None when there is none"""
+        now = time.monotonic()
+        healthy = [r for r in self.replicas if r.down_until <= now]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_down(self, replica: Replica):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.retry_seconds
+
+    def sticky(self, request: Request) -> bool:
+        """Whether the client wrote recently enough to read from the primary"""
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def sticky_cookie(self) -> bytes:
+        """Set-Cookie value for a client that just wrote"""
+        until = time.time() + self.sticky_seconds
+        return (
+            f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(self.sticky_seconds) + 1};"
+            " Path=/api; HttpOnly; SameSite=Lax"
+        ).encode()
+
+    @asynccontextmanager
+    async def session(self, request: Optional[Request] = None) -> AsyncIterator:
+        """A session on a replica, or on the primary when none is healthy or
+        the client of `request` wrote recently
+        """
+        replica = None
+        if self.replicas and not (request is not None and self.sticky(request)):
+            replica = self.pick()
+        session = None
+        if replica is not None:
+            session = replica.session()
+            try:
+                await session.connection()
+            except REPLICA_ERRORS:
+                await session.close()
+                self.mark_down(replica)
+                session = replica = None
+        if session is None:
+            session = async_session()
+            self.primary_reads += 1
+        else:
+            replica.reads += 1
+        try:
+            yield session
+        except REPLICA_ERRORS:
+            if replica is not None:
+                self.mark_down(replica)
+            raise
+        finally:
+            await session.close()
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": [
+                {
+                    "name": r.name,
+                    "healthy": r.down_until <= now,
+                    "reads": r.reads,
+                    "failures": r.failures,
+                }
+                for r in self.replicas
+            ],
+            "primary_reads": self.primary_reads,
+            "sticky_seconds": self.sticky_seconds,
+        }
+
+
+replicas = ReplicaSet.from_env()
+
+
+async def get_read_session(request: Request):
+    """Session for handlers that only read, see ReplicaSet.session"""
+    async with replicas.session(request) as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """Hands the read-your-writes cookie to clients whose request committed"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            replicas.replicas and replicas.sticky_seconds
+        ):
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            committed = scope.get("state", {}).get("committed")
+            if message["type"] == "http.response.start" and committed:
+                headers = [*message.get("headers", ())]
+                headers.append((b"set-cookie", replicas.sticky_cookie()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
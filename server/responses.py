@@ -1,4 +1,10 @@
-from .models import UserModel, FoodModel
+from .models import (
+    UserModel,
+    FoodModel,
+    MealOptimizeResult,
+    MealPlanTotals,
+    NutrientStatsResult,
+)
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
@@ -38,6 +44,19 @@ class FoodResponses(BaseModel):
     result: str = "ok"
     response: str = "list"
     data: List[FoodModel]
+    next_cursor: Optional[str] = None
+
+
+class FoodSearchResponses(FoodResponses):
+    total: int
+
+
+class SimilarFoodsResponses(FoodResponses):
+    distances: List[float]
+
+
+class PopularFoodsResponses(FoodResponses):
+    hits: List[int]
 
 
 class FoodResponse(BaseModel):
@@ -50,5 +69,32 @@ class UserResponses(BaseModel):
     result: str = "ok"
     response: str = "list"
     data: List[UserModel]
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class FoodBatchResponses(BaseModel):
+    result: str = "ok"
+    response: str = "list"
+    data: List[Optional[FoodModel]]
+    next_cursor: Optional[str] = None
+    not_found: List[str]
+
+
+class MealPlanResponses(BaseModel):
+    result: str = "ok"
+    response: str = "list"
+    data: List[MealPlanTotals]
+
+
+class MealOptimizeResponse(BaseModel):
+    result: str = "ok"
+    response: str = "entity"
+    data: MealOptimizeResult
+
+
+class NutrientStatsResponse(BaseModel):
+    result: str = "ok"
+    response: str = "entity"
+    data: NutrientStatsResult
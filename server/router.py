@@ -1,20 +1,79 @@
-from fastapi import APIRouter, Depends
+import os
+import time
+import numpy as np
+import orjson
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import literal_column
+from sqlalchemy import select as select_rows  # Row results, even of one column
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, Annotated
-from sqlmodel import Session, select
+from typing import List, Literal, Optional, Annotated
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from .aggregates import MAX_BINS, nutrient_stats
 from .auth import Auth
-from .models import FoodModel, UserModel
+from .bulk import (
+    EXPORT_MEDIA_TYPES,
+    export_foods,
+    iter_csv,
+    iter_lines,
+    iter_ndjson,
+    load_foods,
+)
+from .cache import TTLCache
+from .hashing import hasher
+from .matrix import NUMERIC_FIELDS, nutrient_matrix
+from .mealplan import (
+    IN_CHUNK,
+    MAX_PLAN_ITEMS,
+    NUTRIENT_FIELDS,
+    load_nutrients,
+    plan_totals,
+)
+from .optimizer import optimize
+from .pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, next_page
+from .popularity import popularity
+from .ratelimit import limit_signup
+from .replicas import get_read_session
+from .search import food_search, search_term
+from .similar import METRICS, similar
+from .serializers import (
+    FOOD_FIELDS,
+    encode,
+    entity_response,
+    food_payload,
+    json_response,
+    list_response,
+    user_payload,
+)
 from .database import UserDB, get_session, FoodDB
+from .models import (
+    FoodBatchModel,
+    MealOptimizeModel,
+    MealPlanModel,
+    NutrientSearchModel,
+)
 from .responses import (
     MainResponse,
     FoodResponse,
     FoodResponses,
+    FoodBatchResponses,
+    FoodSearchResponses,
+    SimilarFoodsResponses,
+    MealOptimizeResponse,
+    MealPlanResponses,
+    NutrientStatsResponse,
+    PopularFoodsResponses,
     UserResponse,
     UserResponses,
 )
 from .errors import (
     AlreadyExistsError,
+    BadRequestError,
     NotFoundError,
     ForbiddenError,
 )
@@ -22,9 +81,95 @@ from .errors import (
 auth = Auth()
 get_current_user = auth.get_current_user
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# replicas when configured, for handlers that don't write (server/replicas.py)
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
 CurrentUserDep = Annotated[UserDB, Depends(get_current_user)]
 
+# food_id -> encoded FoodModel JSON, kept in step by this worker's write handlers;
+# the TTL bounds how long writes made by other workers can go unseen
+food_cache = TTLCache(
+    maxsize=int(os.environ.get("FOOD_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("FOOD_CACHE_TTL", 300)),
+)
+# (matrix version, filters) -> encoded nutrient stats; every food write changes
+# the version, so entries of older data are never hit again and age out
+stats_cache = TTLCache(
+    maxsize=int(os.environ.get("NUTRIENT_STATS_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("NUTRIENT_STATS_CACHE_TTL", 300)),
+)
+
+
+def body_schema(model: type) -> dict:
+    """openapi_extra documenting the JSON body of a handler that uses parse_body"""
+    schema = model.model_json_schema()
+    content = {"application/json": {"schema": schema}}
+    return {"requestBody": {"required": True, "content": content}}
+
+
+async def parse_body(request: Request, model: type) -> BaseModel:
+    """Parse and validate a JSON body in one pass, for bodies big enough that
+    FastAPI's json.loads before validation shows; errors are the usual 422
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in errors]
+        )
+
+
+def food_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated food fields to return, e.g. name,brand,calories;"
+        " food_id is always included. All of them when left out.",
+    ),
+) -> Optional[tuple]:
+    """Dependency of the food read routes: the fields asked for, in FoodModel
+    order and with food_id, or None for all of them
+    """
+    wanted = parse_fields(fields, FOOD_FIELDS)
+    if wanted is None:
+        return None
+    return tuple(f for f in FOOD_FIELDS if f in wanted or f == "food_id")
+
+
+def nutrient_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated weight and nutrient fields, e.g."
+        " calories,protein. All of them when left out.",
+    ),
+) -> tuple:
+    """Dependency of GET /food/stats: the fields asked for, in matrix
+    order, or all of NUMERIC_FIELDS
+    """
+    return parse_fields(fields, NUMERIC_FIELDS) or NUMERIC_FIELDS
+
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> Optional[tuple]:
+    """The comma-separated `fields`, in `allowed` order, or None if left out"""
+    if not fields:
+        return None
+    wanted = {field.strip() for field in fields.split(",")} - {""}
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise BadRequestError(detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in allowed if f in wanted)
+
+
+FieldsDep = Annotated[Optional[tuple], Depends(food_fields)]
+NutrientFieldsDep = Annotated[tuple, Depends(nutrient_fields)]
+
+
+def food_query(fields: Optional[tuple]):
+    """SELECT of whole FoodDB rows, or of only the `fields` columns"""
+    if fields is None:
+        return select(FoodDB)
+    return select_rows(*(FoodDB.__table__.c[field] for field in fields))
+
 
 class Food:
     def __init__(self):
@@ -34,7 +179,35 @@ class Food:
     def _add_routes(self):
         self.router.get("/get", response_model=FoodResponses)(self.get_foodlist)
         self.router.get("/get/{food_id}", response_model=FoodResponse)(self.get_food)
+        self.router.get("/batch", response_model=FoodBatchResponses)(
+            self.get_food_batch
+        )
+        self.router.post("/batch", response_model=FoodBatchResponses)(
+            self.post_food_batch
+        )
         self.router.post("/add", response_model=FoodResponse)(self.create_food)
+        self.router.get("/similar/{food_id}", response_model=SimilarFoodsResponses)(
+            self.similar_foods
+        )
+        self.router.post("/search", response_model=FoodSearchResponses)(
+            self.search_nutrients
+        )
+        self.router.get("/stats", response_model=NutrientStatsResponse)(
+            self.get_nutrient_stats
+        )
+        self.router.get("/popular", response_model=PopularFoodsResponses)(
+            self.popular_foods
+        )
+        self.router.post(
+            "/plan/totals",
+            response_model=MealPlanResponses,
+            openapi_extra=body_schema(MealPlanModel),
+        )(self.meal_plan_totals)
+        self.router.post("/plan/optimize", response_model=MealOptimizeResponse)(
+            self.optimize_meal_plan
+        )
+        self.router.post("/import", response_model=MainResponse)(self.import_foods)
+        self.router.get("/export", response_class=StreamingResponse)(self.export_foods)
         self.router.put("/update/{food_id}", response_model=FoodResponse)(
             self.update_food
         )
@@ -43,18 +216,128 @@ class Food:
         )
 
     @staticmethod
-    async def get_food(session: SessionDep, food_id: str) -> FoodResponse:
-        food = session.get(FoodDB, food_id)
-        if not food:
+    async def get_food(
+        session: ReadSessionDep, food_id: str, fields: FieldsDep
+    ) -> Response:
+        if fields is not None:
+            data = await Food.sparse_food(session, food_id, fields)
+            popularity.hit(food_id)
+            return entity_response(data)
+        data = food_cache.get(food_id)
+        if data is None:
+            food = await session.get(FoodDB, food_id)
+            if not food:
+                raise NotFoundError(detail=f"No food item with {food_id} found")
+            data = encode(food_payload(food))
+            food_cache.set(food_id, data)
+        popularity.hit(food_id)
+        return entity_response(data)
+
+    @staticmethod
+    async def sparse_food(session: AsyncSession, food_id: str, fields: tuple) -> bytes:
+        """`fields` of one food, cut from the cached food or read alone"""
+        data = food_cache.get(food_id)
+        if data is not None:
+            food = orjson.loads(data)
+            return encode({field: food[field] for field in fields})
+        query = food_query(fields).where(FoodDB.food_id == food_id)
+        food = (await session.exec(query)).first()
+        if food is None:
             raise NotFoundError(detail=f"No food item with {food_id} found")
-        result = FoodModel.model_validate(
-            food.dict()
-        )  # Convert FoodDB instance to a dictionary
-        return FoodResponse(result="ok", response="entity", data=result)
+        return encode(food_payload(food, fields))
+
+    @staticmethod
+    async def encoded_foods(session: AsyncSession, food_ids: list) -> dict:
+        """food_id -> encoded food for those of `food_ids` that exist,
+        from the food cache where possible and one query for the rest
+        """
+        found = {}
+        missing = []
+        for food_id in food_ids:
+            data = food_cache.get(food_id)
+            if data is None:
+                missing.append(food_id)
+            else:
+                found[food_id] = data
+        for start in range(0, len(missing), IN_CHUNK):
+            chunk = missing[start : start + IN_CHUNK]
+            query = select(FoodDB).where(FoodDB.food_id.in_(chunk))
+            for food in (await session.exec(query)).all():
+                data = encode(food_payload(food))
+                food_cache.set(food.food_id, data)
+                found[food.food_id] = data
+        return found
+
+    @staticmethod
+    async def food_batch(session: AsyncSession, food_ids: list) -> Response:
+        """`food_ids` in request order, null and listed in not_found where unknown"""
+        foods = await Food.encoded_foods(session, list(dict.fromkeys(food_ids)))
+        not_found = [food_id for food_id in food_ids if food_id not in foods]
+        return list_response(
+            (foods.get(food_id, b"null") for food_id in food_ids),
+            None,
+            not_found=list(dict.fromkeys(not_found)),
+        )
+
+    @staticmethod
+    async def get_food_batch(
+        session: ReadSessionDep,
+        food_id: List[str] = Query(min_length=1, max_length=1000),
+    ) -> Response:
+        """Many foods in one round trip, `?food_id=...&food_id=...`.
+        Unknown ids don't fail the call: their place in `data` is null and
+        they are listed in `not_found`.
+        """
+        return await Food.food_batch(session, food_id)
+
+    @staticmethod
+    async def post_food_batch(
+        batch: FoodBatchModel, session: ReadSessionDep
+    ) -> Response:
+        """Same as GET /batch, for id lists too long for a query string"""
+        return await Food.food_batch(session, batch.food_ids)
+
+    @staticmethod
+    def nutrient_filters(
+        min_calories: Optional[float] = None,
+        max_calories: Optional[float] = None,
+        min_protein: Optional[float] = None,
+        max_protein: Optional[float] = None,
+        min_carbohydrates: Optional[float] = None,
+        max_carbohydrates: Optional[float] = None,
+    ) -> list:
+        """WHERE clauses for the nutrient ranges accepted by get_foodlist.
+        Each of them can be served by one of the indexes from the nutrient
+        index migration, see test/test_query_plans.py.
+        """
+        ranges = [
+            (FoodDB.calories, min_calories, max_calories),
+            (FoodDB.protein, min_protein, max_protein),
+            (FoodDB.total_carbohydrate, min_carbohydrates, max_carbohydrates),
+        ]
+        filters = []
+        for column, low, high in ranges:
+            if low is not None:
+                filters.append(column >= low)
+            if high is not None:
+                filters.append(column <= high)
+        return filters
+
+    @staticmethod
+    def keyset_order(dialect: str, filtered: bool):
+        """ORDER BY of the keyset pages of get_foodlist. With nutrient filters
+        SQLite would rather walk the primary key in order, testing every row,
+        than sort the rows of a range index; `+food_id` keeps the key index
+        out of the ordering.
+        """
+        if filtered and dialect == "sqlite":
+            return literal_column(f"+{FoodDB.__tablename__}.food_id")
+        return FoodDB.food_id
 
     @staticmethod
     async def get_foodlist(
-        session: SessionDep,
+        session: ReadSessionDep,
+        fields: FieldsDep,
         name: Optional[str] = None,
         min_calories: Optional[int] = None,
         max_calories: Optional[int] = None,
@@ -62,66 +345,365 @@ class Food:
         max_protein: Optional[float] = None,
         min_carbohydrates: Optional[float] = None,
         max_carbohydrates: Optional[float] = None,
-        limit: Optional[int] = 5,
-        offset: Optional[int] = 0,
-    ) -> FoodResponses:
-        query = select(FoodDB)
-        filters = [
-            FoodDB.name.ilike(f"%{name}%") if name else None,  # type: ignore
-            FoodDB.calories >= min_calories if min_calories else None,
-            FoodDB.calories <= max_calories if max_calories else None,
-            FoodDB.protein >= min_protein if min_protein else None,
-            FoodDB.protein <= max_protein if max_protein else None,
-            FoodDB.total_carbohydrate >= min_carbohydrates
-            if min_carbohydrates
-            else None,
-            FoodDB.total_carbohydrate <= max_carbohydrates
-            if max_carbohydrates
-            else None,
-        ]
-        query = query.where(*[f for f in filters if f]).offset(offset).limit(limit)
-        results = session.exec(query).all()
+        limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+        offset: Optional[int] = Query(None, ge=0),
+        cursor: Optional[str] = None,
+    ) -> Response:
+        """List foods, a page at a time.
+        Pages are walked with the opaque `next_cursor` of the previous page and
+        ordered by food_id, so deep pages cost the same as the first one.
+        Name searches are ordered by relevance instead. `offset` is the legacy
+        way of paging and returns no cursor. With `fields` only those columns
+        are read and returned.
+        """
+        query = food_query(fields)
+        name = search_term(name)
+        if name:
+            query = await food_search.apply(session, query, name)
+        filters = Food.nutrient_filters(
+            min_calories,
+            max_calories,
+            min_protein,
+            max_protein,
+            min_carbohydrates,
+            max_carbohydrates,
+        )
+        query = query.where(*filters)
+        if offset is not None:
+            results = (await session.exec(query.offset(offset).limit(limit))).all()
+            next_cursor = None
+        elif name:
+            start = decode_cursor(cursor).get("o", 0)
+            if not isinstance(start, int) or start < 0:
+                raise BadRequestError(detail="Invalid cursor")
+            query = query.offset(start).limit(limit + 1)
+            results, next_cursor = next_page(
+                (await session.exec(query)).all(),
+                limit,
+                lambda _: {"o": start + limit},
+            )
+        else:
+            after = decode_cursor(cursor).get("k")
+            if after is not None:
+                query = query.where(FoodDB.food_id > str(after))
+            order = Food.keyset_order(session.bind.dialect.name, bool(filters))
+            query = query.order_by(order).limit(limit + 1)
+            results, next_cursor = next_page(
+                (await session.exec(query)).all(),
+                limit,
+                lambda last: {"k": last.food_id},
+            )
 
         if not results:
             raise NotFoundError(detail="No food items match the criteria")
-        data = [FoodModel.model_validate(f.dict()) for f in results]
-        return FoodResponses(result="ok", response="list", data=data)
+        fields = fields or FOOD_FIELDS
+        return list_response(
+            (encode(food_payload(f, fields)) for f in results), next_cursor
+        )
 
     @staticmethod
-    async def create_food(food: FoodDB, session: SessionDep) -> FoodResponse:
+    async def get_nutrient_stats(
+        session: ReadSessionDep,
+        fields: NutrientFieldsDep,
+        name: Optional[str] = None,
+        min_calories: Optional[int] = None,
+        max_calories: Optional[int] = None,
+        min_protein: Optional[float] = None,
+        max_protein: Optional[float] = None,
+        min_carbohydrates: Optional[float] = None,
+        max_carbohydrates: Optional[float] = None,
+        bins: int = Query(10, ge=1, le=MAX_BINS),
+    ) -> Response:
+        """Count, mean, spread, percentiles and histogram of each field over the
+        foods matching the filters of GET /get. `fields` is a comma-separated
+        subset of weight and the nutrients (default all of them). Results are
+        cached per filter set until the next food write.
+        """
+        name = search_term(name)
+        ranges = {
+            field: (low, high)
+            for field, low, high in (
+                ("calories", min_calories, max_calories),
+                ("protein", min_protein, max_protein),
+                ("total_carbohydrate", min_carbohydrates, max_carbohydrates),
+            )
+            if low is not None or high is not None
+        }
+
+        await nutrient_matrix.ensure_loaded()
+        # taken before any await, a write meanwhile only orphans this entry
+        key = (nutrient_matrix.version, name, tuple(ranges.items()), fields, bins)
+        data = stats_cache.get(key)
+        if data is None:
+            named = None
+            if name:
+                query = await food_search.apply(session, select(FoodDB.food_id), name)
+                named = (await session.exec(query)).all()
+            # no awaits from here on, a reload would move the positions
+            rows = nutrient_matrix.search(ranges)
+            if named is not None:
+                index = nutrient_matrix.index
+                named = np.array([index[i] for i in named if i in index], dtype=np.intp)
+                rows = np.intersect1d(rows, named)
+            data = orjson.dumps(nutrient_stats(nutrient_matrix, rows, fields, bins))
+            stats_cache.set(key, data)
+        return entity_response(data)
+
+    @staticmethod
+    async def search_nutrients(
+        search: NutrientSearchModel, session: ReadSessionDep
+    ) -> Response:
+        """Foods whose fields are within every range of `search.ranges`.
+        Any of weight and the nutrients can be bounded; a range with neither
+        min nor max only requires the value to be present. The ranges are
+        evaluated on the in-memory nutrient matrix, `total` counts all
+        matches and pages are walked with `next_cursor`.
+        """
+        if not search.ranges:
+            raise BadRequestError(detail="At least one range is needed")
+        unknown = set(search.ranges) - set(NUMERIC_FIELDS)
+        if unknown:
+            raise BadRequestError(
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        start = decode_cursor(search.cursor).get("o", 0)
+        if not isinstance(start, int) or start < 0:
+            raise BadRequestError(detail="Invalid cursor")
+
+        await nutrient_matrix.ensure_loaded()
+        rows = nutrient_matrix.search(
+            {field: (r.min, r.max) for field, r in search.ranges.items()}
+        )
+        if not len(rows):
+            raise NotFoundError(detail="No food items match the criteria")
+        end = start + search.limit
+        food_ids = nutrient_matrix.food_ids(rows[start:end])
+        foods = await Food.encoded_foods(session, food_ids)
+        return list_response(
+            (foods[food_id] for food_id in food_ids if food_id in foods),
+            encode_cursor({"o": end}) if end < len(rows) else None,
+            total=len(rows),
+        )
+
+    @staticmethod
+    async def similar_foods(
+        session: ReadSessionDep,
+        food_id: str,
+        k: int = Query(10, ge=1, le=100),
+        metric: Literal[METRICS] = "euclidean",
+        features: Optional[str] = None,
+    ) -> Response:
+        """The `k` foods closest to `food_id` in nutrients per gram, nearest first.
+        `features` is a comma-separated subset of the nutrients to compare
+        (default all of them); `distances` lines up with `data`. Nutrients
+        either food doesn't have are left out of the comparison.
+        """
+        fields = NUTRIENT_FIELDS
+        if features is not None:
+            fields = tuple(dict.fromkeys(f.strip() for f in features.split(",")))
+            unknown = set(fields) - set(NUMERIC_FIELDS)
+            if unknown:
+                raise BadRequestError(
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+                )
+
+        await nutrient_matrix.ensure_loaded()
+        position = nutrient_matrix.index.get(food_id)
+        if position is None:
+            raise NotFoundError(detail=f"No food item with {food_id} found")
+        found = similar(nutrient_matrix, position, k, metric, fields)
+        if found is None:
+            raise BadRequestError(
+                detail="The food needs a weight and one of the compared nutrients"
+            )
+        rows, distances = found
+        food_ids = nutrient_matrix.food_ids(rows)
+        foods = await Food.encoded_foods(session, food_ids)
+        kept = [i for i, food_id in enumerate(food_ids) if food_id in foods]
+        return list_response(
+            (foods[food_ids[i]] for i in kept),
+            None,
+            distances=[float(distances[i]) for i in kept],
+        )
+
+    @staticmethod
+    async def popular_foods(
+        session: ReadSessionDep, k: int = Query(10, ge=1, le=popularity.top.capacity)
+    ) -> Response:
+        """The `k` most read foods, most read first, `hits` lining up with
+        `data`. Reads are counted in memory and written in batches, so the
+        ranking trails them by a few seconds.
+        """
+        ranked = popularity.popular(k)
+        foods = await Food.encoded_foods(session, [food_id for food_id, _ in ranked])
+        kept = [(food_id, hits) for food_id, hits in ranked if food_id in foods]
+        return list_response(
+            (foods[food_id] for food_id, _ in kept),
+            None,
+            hits=[hits for _, hits in kept],
+        )
+
+    @staticmethod
+    async def meal_plan_totals(request: Request, session: ReadSessionDep) -> Response:
+        """Nutrient totals of many meal plans, each a list of (food_id, grams).
+        Every referenced food is read at once and each plan gets its grams,
+        the total of every nutrient, the nutrients some of its foods have no
+        value for and the foods that couldn't be counted (unknown ids or no
+        weight to scale by). Plans come back in request order.
+        """
+        plan = await parse_body(request, MealPlanModel)
+        items = sum(len(p) for p in plan.plans)
+        if items > MAX_PLAN_ITEMS:
+            raise BadRequestError(
+                detail=f"At most {MAX_PLAN_ITEMS} items per request, got {items}"
+            )
+        food_ids = list({food_id for p in plan.plans for food_id, _ in p})
+        index, weights, values = await load_nutrients(session, food_ids)
+        data = plan_totals(plan.plans, index, weights, values)
+        return json_response({"result": "ok", "response": "list", "data": data})
+
+    @staticmethod
+    async def optimize_meal_plan(
+        plan: MealOptimizeModel, session: ReadSessionDep
+    ) -> Response:
+        """Foods and portions (grams) that come closest to daily nutrient targets.
+        Any numeric field can get a `target` and/or `min`/`max`; `include`
+        foods are always part of the plan, `exclude` ones never, and at most
+        `max_items` foods of `min_portion` to `max_portion` grams are used.
+        The search stops after `time_budget_ms` with the best plan so far,
+        `complete` tells whether it ran out of improvements first.
+        """
+        if not plan.targets:
+            raise BadRequestError(detail="At least one target is needed")
+        unknown = set(plan.targets) - set(NUMERIC_FIELDS)
+        if unknown:
+            raise BadRequestError(
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        if plan.min_portion > plan.max_portion:
+            raise BadRequestError(detail="min_portion is above max_portion")
+        include = list(dict.fromkeys(plan.include))
+        if len(include) > plan.max_items:
+            raise BadRequestError(detail="More included foods than max_items")
+
+        await nutrient_matrix.ensure_loaded()
+        m = nutrient_matrix
+        unusable = [
+            food_id
+            for food_id in include
+            if food_id not in m.index
+            or not m.values[m.column["weight"], m.index[food_id]] > 0
+            or any(m.null[m.column[f], m.index[food_id]] for f in plan.targets)
+        ]
+        if unusable:
+            raise BadRequestError(
+                detail="Included foods need a weight and every targeted nutrient: "
+                + ", ".join(unusable)
+            )
+
+        # the solver runs in a thread, on a copy a reload or write can't change
+        exclude = set(plan.exclude) - set(include)
+        matrix = nutrient_matrix.snapshot(
+            ("weight", *plan.targets), [*include, *exclude]
+        )
+        started = time.perf_counter()
+        result = await run_in_threadpool(
+            optimize,
+            matrix,
+            plan.targets,
+            include,
+            exclude,
+            plan.max_items,
+            plan.min_portion,
+            plan.max_portion,
+            plan.time_budget_ms / 1000,
+        )
+        if result is None:
+            raise NotFoundError(
+                detail="No food has a weight and every targeted nutrient"
+            )
+        food_ids = matrix.food_ids(result["positions"])
+        query = select(FoodDB.food_id, FoodDB.name).where(FoodDB.food_id.in_(food_ids))
+        names = dict((await session.exec(query)).all())
+        data = {
+            "foods": [
+                {"food_id": food_id, "name": names.get(food_id), "grams": round(g, 1)}
+                for food_id, g in zip(food_ids, result["grams"].tolist())
+            ],
+            "nutrients": {
+                field: {**target.model_dump(), "value": value}
+                for (field, target), value in zip(
+                    plan.targets.items(), result["achieved"].tolist()
+                )
+            },
+            "deviation": result["deviation"],
+            "candidates": result["candidates"],
+            "complete": result["complete"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return json_response({"result": "ok", "response": "entity", "data": data})
+
+    @staticmethod
+    async def create_food(food: FoodDB, session: SessionDep) -> Response:
         db_food = FoodDB(**food.model_dump(exclude_unset=True))
         if food.food_id:  # Use the provided UUID if it exists
             db_food.food_id = food.food_id
         try:
             session.add(db_food)
-            session.commit()
-            session.refresh(db_food)
+            await session.commit()
+            await session.refresh(db_food)
         except IntegrityError:
             raise AlreadyExistsError(
                 detail=f"Food with id {db_food.food_id} already exists"
             )
-        return FoodResponse(
-            result="ok",
-            response="entity",
-            data=FoodModel.model_validate(db_food.dict()),
+        data = encode(food_payload(db_food))
+        food_cache.set(db_food.food_id, data)
+        nutrient_matrix.upsert([db_food.model_dump()])
+        return entity_response(data)
+
+    @staticmethod
+    async def import_foods(
+        request: Request,
+        session: SessionDep,
+        current_user: CurrentUserDep,
+        format: Literal["ndjson", "csv"] = "ndjson",
+        batch_size: Annotated[int, Query(ge=1, le=10_000)] = 1000,
+    ) -> MainResponse:
+        """Bulk import foods from a streamed NDJSON or CSV request body.
+        Rows are validated as they arrive and inserted `batch_size` at a time;
+        invalid or conflicting rows are reported without stopping the import.
+        """
+        if not current_user.is_admin:
+            raise ForbiddenError(detail="Admin privileges needed to import food.")
+        lines = iter_lines(request.stream())
+        rows = iter_csv(lines) if format == "csv" else iter_ndjson(lines)
+        report = await load_foods(session, rows, batch_size)
+        return MainResponse(result="ok", data=report.as_dict())
+
+    @staticmethod
+    async def export_foods(
+        format: Literal["ndjson", "csv"] = "ndjson",
+    ) -> StreamingResponse:
+        """Stream the whole food table as NDJSON or CSV (same columns as import)."""
+        return StreamingResponse(
+            export_foods(format),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f"attachment; filename=foods.{format}"},
         )
 
     @staticmethod
-    async def update_food(
-        food_id: str, food: FoodDB, session: SessionDep
-    ) -> FoodResponse:
-        existing = session.get(FoodDB, food_id)
+    async def update_food(food_id: str, food: FoodDB, session: SessionDep) -> Response:
+        existing = await session.get(FoodDB, food_id)
         if not existing:
             raise NotFoundError(detail=f"Food with id {food_id} not found")
         for k, v in food.model_dump(exclude_unset=True).items():
             setattr(existing, k, v)
-        session.commit()
-        session.refresh(existing)
-        return FoodResponse(
-            result="ok",
-            response="entity",
-            data=FoodModel.model_validate(existing.dict()),  # Convert to dictionary
-        )
+        await session.commit()
+        await session.refresh(existing)
+        data = encode(food_payload(existing))
+        food_cache.set(food_id, data)
+        nutrient_matrix.upsert([existing.model_dump()])
+        return entity_response(data)
 
     @staticmethod
     async def delete_food(
@@ -129,11 +711,14 @@ class Food:
     ) -> MainResponse:
         if not current_user.is_admin:
             raise ForbiddenError(detail="Admin privileges needed to delete food.")
-        db_food = session.get(FoodDB, food_id)
+        db_food = await session.get(FoodDB, food_id)
         if not db_food:
             raise NotFoundError(detail=f"Food with id {food_id} not found")
-        session.delete(db_food)
-        session.commit()
+        await session.delete(db_food)
+        await popularity.forget(session, food_id)
+        await session.commit()
+        food_cache.pop(food_id)
+        nutrient_matrix.discard(food_id)
         return MainResponse(result="ok", data={"food_id": food_id})
 
 
@@ -145,7 +730,9 @@ class User:
     def _add_routes(self):
         self.router.get("/get", response_model=UserResponses)(self.get_userlist)
         self.router.get("/get/{user_id}", response_model=UserResponse)(self.get_user)
-        self.router.post("/add", response_model=UserResponse)(self.create_user)
+        self.router.post(
+            "/add", response_model=UserResponse, dependencies=[Depends(limit_signup)]
+        )(self.create_user)
         self.router.put("/update/{user_id}", response_model=UserResponse)(
             self.update_user
         )
@@ -154,56 +741,62 @@ class User:
         )
 
     @staticmethod
-    async def get_user(session: SessionDep, user_id: str) -> UserResponse:
-        user = session.get(UserDB, user_id)
+    async def get_user(session: ReadSessionDep, user_id: str) -> Response:
+        user = await session.get(UserDB, user_id)
         if not user:
             raise NotFoundError(detail="No users found")
-        data = UserModel.model_validate(user).model_dump(
-            exclude={"password", "is_admin"}
-        )
-        return UserResponse(result="ok", response="entity", data=data)
+        return entity_response(encode(user_payload(user, public=True)))
 
     @staticmethod
     async def get_userlist(
-        session: SessionDep, limit: int = 5, offset: int = 0
-    ) -> UserResponses:
-        query = select(UserDB).offset(offset).limit(limit)
-        results = session.exec(query).all()
+        session: ReadSessionDep,
+        limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+        offset: Optional[int] = Query(None, ge=0),
+        cursor: Optional[str] = None,
+    ) -> Response:
+        """List users ordered by user_id, a page at a time (see get_foodlist)."""
+        query = select(UserDB)
+        if offset is not None:
+            results = (await session.exec(query.offset(offset).limit(limit))).all()
+            next_cursor = None
+        else:
+            after = decode_cursor(cursor).get("k")
+            if after is not None:
+                query = query.where(UserDB.user_id > str(after))
+            query = query.order_by(UserDB.user_id).limit(limit + 1)
+            results, next_cursor = next_page(
+                (await session.exec(query)).all(),
+                limit,
+                lambda last: {"k": last.user_id},
+            )
         if not results:
             raise NotFoundError(detail="No users found")
-        data = [
-            UserModel.model_validate(u).model_dump(exclude={"password", "is_admin"})
-            for u in results
-        ]
-        return UserResponses(result="ok", response="list", data=data)
+        return list_response(
+            (encode(user_payload(u, public=True)) for u in results), next_cursor
+        )
 
     @staticmethod
-    async def create_user(user: UserDB, session: SessionDep) -> UserResponse:
-        user.password = UserDB.hash_password(user.password)
+    async def create_user(user: UserDB, session: SessionDep) -> Response:
+        user.password = await hasher.hash(user.password)
         db_user = UserDB(**user.model_dump(exclude_unset=True))
         session.add(db_user)
-        session.commit()
-        session.refresh(db_user)
-        return UserResponse(
-            result="ok", response="entity", data=UserModel.model_validate(db_user)
-        )
+        await session.commit()
+        await session.refresh(db_user)
+        return entity_response(encode(user_payload(db_user)))
 
     @staticmethod
-    async def update_user(
-        user_id: str, user: UserDB, session: SessionDep
-    ) -> UserResponse:
-        db_user = session.get(UserDB, user_id)
+    async def update_user(user_id: str, user: UserDB, session: SessionDep) -> Response:
+        db_user = await session.get(UserDB, user_id)
         if not db_user:
             raise NotFoundError(detail=f"User with id {user_id} not found")
         if user.password:
-            user.password = UserDB.hash_password(user.password)
+            user.password = await hasher.hash(user.password)
         for k, v in user.model_dump(exclude_unset=True).items():
             setattr(db_user, k, v)
-        session.commit()
-        session.refresh(db_user)
-        return UserResponse(
-            result="ok", response="entity", data=UserModel.model_validate(db_user)
-        )
+        await session.commit()
+        await session.refresh(db_user)
+        Auth.invalidate_user(user_id)
+        return entity_response(encode(user_payload(db_user)))
 
     @staticmethod
     async def delete_user(
@@ -213,9 +806,10 @@ class User:
             raise ForbiddenError(
                 detail="Admin privileges needed to delete another user."
             )
-        db_user = session.get(UserDB, user_id)
+        db_user = await session.get(UserDB, user_id)
         if not db_user:
             raise NotFoundError(detail=f"User with id {user_id} not found")
-        session.delete(db_user)
-        session.commit()
+        await session.delete(db_user)
+        await session.commit()
+        Auth.invalidate_user(user_id)
         return MainResponse(result="ok", data={"user_id": user_id})
@@ -0,0 +1,79 @@
+"""Food name search on top of the index created by the search migration"""
+
+from typing import Optional
+
+from sqlalchemy import column, func, table, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import FoodDB
+
+FTS_TABLE = f"{FoodDB.__tablename__}_fts"
+# the names the FTS table indexes, under a docid that a VACUUM can't renumber
+NAMES_TABLE = f"{FoodDB.__tablename__}_names"
+# trigram tokens are three characters long, shorter terms can't use the index
+MIN_TRIGRAM_LENGTH = 3
+
+_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+_names = table(NAMES_TABLE, column("docid"), column("food_id"))
+
+
+def search_term(name: Optional[str]) -> str:
+    """The `name` filter as every food route applies it: trimmed and
+    lowercased, "" for none. Matching ignores case anyway; the lowercase
+    term also keys caches.
+    """
+    return (name or "").strip().lower()
+
+
+class FoodSearch:
+    """Adds a relevance-ranked name filter to a food query.
+    SQLite uses the FTS5 trigram table, Postgres the pg_trgm index; anything
+    else (or a database that hasn't been migrated yet) falls back to ILIKE.
+    """
+
+    def __init__(self):
+        self._fts_available: Optional[bool] = None
+
+    def reset(self):
+        """Forget what was detected, e.g. after migrations were applied"""
+        self._fts_available = None
+
+    async def fts_available(self, session: AsyncSession) -> bool:
+        """Whether the session's database has the food_id-keyed FTS index.
+        That is the database startup migrates (server/startup.py), so a
+        migrated server never falls back to ILIKE because ALEMBIC_DB_URL
+        points elsewhere.
+        """
+        if self._fts_available is None:
+            found = await session.exec(
+                text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ).bindparams(name=NAMES_TABLE)
+            )
+            self._fts_available = found.first() is not None
+        return self._fts_available
+
+    async def apply(self, session: AsyncSession, query, name: str):
+        """Filter `query` to foods whose name contains `name`, best matches first"""
+        dialect = session.bind.dialect.name
+        use_fts = dialect == "sqlite" and await self.fts_available(session)
+        return self.filter(query, name, dialect, use_fts)
+
+    @staticmethod
+    def filter(query, name: str, dialect: str, use_fts: bool = True):
+        """Add the name filter for `dialect` to `query`"""
+        if use_fts and dialect == "sqlite" and len(name) >= MIN_TRIGRAM_LENGTH:
+            phrase = '"' + name.replace('"', '""') + '"'
+            return (
+                query.join(_names, _names.c.food_id == FoodDB.food_id)
+                .join(_fts, _fts.c.rowid == _names.c.docid)
+                .where(text(f"{FTS_TABLE} MATCH :phrase").bindparams(phrase=phrase))
+                .order_by(_fts.c.rank)
+            )
+        query = query.where(FoodDB.name.ilike(f"%{name}%"))  # type: ignore
+        if dialect == "postgresql":
+            query = query.order_by(func.similarity(FoodDB.name, name).desc())
+        return query
+
+
+food_search = FoodSearch()
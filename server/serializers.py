@@ -0,0 +1,122 @@
+"""Fast JSON responses for the food and user routers.
+Rows are turned into plain dicts of exactly the shape FoodModel/UserModel would
+produce and encoded once with orjson, so the bytes on the wire stay the same
+while both Pydantic validation passes (the handler's and FastAPI's
+response_model one) are skipped.
+"""
+
+import json
+import math
+from typing import Any, Iterable, Optional
+from uuid import UUID
+
+import orjson
+from fastapi.responses import Response
+
+from .models import FoodModel, UserModel
+
+FOOD_FIELDS = tuple(FoodModel.model_fields)
+USER_FIELDS = tuple(UserModel.model_fields)
+
+# same options as starlette's JSONResponse.render
+_encode = json.JSONEncoder(
+    ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+).encode
+
+
+def _uuid(value: Any) -> str:
+    return str(value if isinstance(value, UUID) else UUID(str(value)))
+
+
+def _int(value: Any) -> Any:
+    """Whole floats as ints, like FoodModel's int fields (fractions are kept)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _fields(row: Any, fields: tuple) -> dict:
+    # loaded ORM attributes live in __dict__, skip the descriptors when we can
+    try:
+        state = row.__dict__
+        return {field: state[field] for field in fields}
+    except (AttributeError, KeyError):
+        return {field: getattr(row, field) for field in fields}
+
+
+def food_payload(food: Any, fields: tuple = FOOD_FIELDS) -> dict:
+    """FoodDB row (or any object with its attributes) -> FoodModel-shaped dict,
+    of only `fields` for a sparse one
+    """
+    payload = _fields(food, fields)
+    if "food_id" in payload:
+        payload["food_id"] = _uuid(payload["food_id"])
+    if "calories" in payload:
+        payload["calories"] = _int(payload["calories"])
+    return payload
+
+
+def user_payload(user: Any, public: bool = False) -> dict:
+    """UserDB row -> UserModel-shaped dict.
+    `public` views hide the password and admin flag, which come out as the
+    model defaults.
+    """
+    payload = _fields(user, USER_FIELDS)
+    payload["user_id"] = _uuid(payload["user_id"])
+    if public:
+        payload["password"] = None
+        payload["is_admin"] = False
+    return payload
+
+
+def _exponent_floats(payload: dict) -> bool:
+    """Whether a value is a float repr() writes with an exponent and orjson doesn't"""
+    for value in payload.values():
+        if value.__class__ is float:
+            size = abs(value)
+            if 0 < size < 1e-4 or 1e16 <= size < math.inf:
+                return True
+    return False
+
+
+def encode(payload: dict) -> bytes:
+    """JSON bytes identical to what FastAPI renders for a flat row `payload`.
+    orjson does the work, unless a value would come out differently from it.
+    NaN and infinity, which used to fail the response, come out as null.
+    """
+    if not _exponent_floats(payload):
+        try:
+            return orjson.dumps(payload)
+        except orjson.JSONEncodeError:  # e.g. ints beyond 64 bits, lone surrogates
+            pass
+    return _encode(payload).encode("utf-8")
+
+
+def json_response(content: Any) -> Response:
+    """Plain orjson Response, for endpoints with no older wire format to match"""
+    return Response(orjson.dumps(content), media_type="application/json")
+
+
+def entity_response(data: bytes) -> Response:
+    """Response with the body of FoodResponse/UserResponse for encoded `data`"""
+    return Response(
+        b'{"result":"ok","response":"entity","data":' + data + b"}",
+        media_type="application/json",
+    )
+
+
+def list_response(
+    items: Iterable[bytes], next_cursor: Optional[str], **extra
+) -> Response:
+    """Response with the body of FoodResponses/UserResponses for encoded `items`;
+    `extra` fields follow, e.g. the `total` of FoodSearchResponses
+    """
+    body = (
+        b'{"result":"ok","response":"list","data":['
+        + b",".join(items)
+        + b'],"next_cursor":'
+        + _encode(next_cursor).encode("utf-8")
+    )
+    for field, value in extra.items():
+        body += b',"' + field.encode() + b'":' + _encode(value).encode("utf-8")
+    return Response(body + b"}", media_type="application/json")
@@ -0,0 +1,123 @@
+"""Nearest foods by nutrient profile, searched over the nutrient matrix.
+
+Foods are compared per gram, every feature divided by its spread over the
+catalogue so that milligrams of sodium don't drown grams of protein. The
+search is a blocked brute-force scan: with a few dozen mostly-present
+features a tree prunes little, and the matrix is already kept current by
+the food write handlers, so there is nothing else to update.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from .matrix import NutrientMatrix
+from .mealplan import NUTRIENT_FIELDS
+
+METRICS = ("euclidean", "manhattan", "cosine")
+# foods compared per block, bounds the temporary (features x block) arrays
+BLOCK_ROWS = 32_768
+# foods sampled per feature to estimate its spread
+SCALE_SAMPLE_ROWS = 65_536
+# a food must have at least this share of the query's features to be compared
+MIN_SHARED = 0.5
+
+# (matrix, loaded_at) -> spread per field, recomputed after every reload
+_scales: dict = {}
+
+
+def feature_scales(matrix: NutrientMatrix) -> np.ndarray:
+    """Spread (standard deviation) of every field per gram, 1 where unknown"""
+    key = (id(matrix), matrix.loaded_at)
+    scales = _scales.get(key)
+    if scales is None:
+        weight = matrix.values[matrix.column["weight"], : matrix.size]
+        sample = np.flatnonzero(matrix.alive[: matrix.size] & (weight > 0))
+        if len(sample) > SCALE_SAMPLE_ROWS:
+            sample = sample[:: len(sample) // SCALE_SAMPLE_ROWS]
+        density = matrix.values[:, sample] / weight[sample]
+        present = ~np.isnan(density)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(density, axis=1) / present.sum(axis=1)
+            spread = np.sqrt(
+                np.nansum((density - mean[:, None]) ** 2, axis=1) / present.sum(axis=1)
+            )
+        scales = np.where(np.isfinite(spread) & (spread > 0), spread, 1.0)
+        _scales.clear()
+        _scales[key] = scales
+    return scales
+
+
+def similar(
+    matrix: NutrientMatrix,
+    position: int,
+    k: int,
+    metric: str = "euclidean",
+    features: tuple = NUTRIENT_FIELDS,
+) -> Optional[tuple]:
+    """Positions and distances of the `k` foods nearest to the one at `position`.
+    Only the features the food has count. Other foods are compared on the
+    ones they share with it, the distance scaled up to all of them, and
+    skipped when they share less than MIN_SHARED; foods without a weight
+    are skipped too. None when the food itself has no weight or features.
+    """
+    weight = matrix.values[matrix.column["weight"]]
+    if not weight[position] > 0:
+        return None
+    rows = [matrix.column[field] for field in features]
+    scales = feature_scales(matrix)[rows]
+    query = matrix.values[rows, position] / weight[position] / scales
+    present = ~np.isnan(query)
+    if not present.any():
+        return None
+    rows = np.array(rows)[present]
+    query = query[present]
+    inverse_scales = (1 / scales[present])[:, None]
+    needed = MIN_SHARED * len(rows)
+
+    best_rows = [np.empty(0, dtype=np.intp)]
+    best_distances = [np.empty(0)]
+    for start in range(0, matrix.size, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, matrix.size)
+        values = matrix.values[rows, start:stop]
+        values *= inverse_scales
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values /= weight[start:stop]
+        null = np.isnan(values)
+        shared = len(rows) - null.view(np.uint8).sum(axis=0, dtype=np.uint16)
+        if metric == "cosine":
+            values = np.where(null, 0.0, values)
+            dot = query @ values
+            norms = np.sqrt(np.einsum("ij,ij->j", values, values))
+            norms *= np.sqrt((query * query) @ ~null)
+            distance = 1.0 - np.divide(
+                dot, norms, out=np.full(len(dot), np.nan), where=norms > 0
+            )
+        else:
+            # fmax drops NaN, i.e. the features the food doesn't have
+            diff = values
+            diff -= query[:, None]
+            if metric == "manhattan":
+                np.abs(diff, out=diff)
+            else:
+                diff *= diff
+            distance = np.fmax(diff, 0.0, out=diff).sum(axis=0)
+            distance *= len(rows) / np.maximum(shared, 1)
+            if metric == "euclidean":
+                np.sqrt(distance, out=distance)
+        # dead, weightless and too sparse foods, and the food itself
+        distance[shared < needed] = np.inf
+        distance[~(weight[start:stop] > 0)] = np.inf
+        distance[np.isnan(distance)] = np.inf
+        if start <= position < stop:
+            distance[position - start] = np.inf
+        top = min(k, len(distance))
+        picked = np.argpartition(distance, top - 1)[:top]
+        picked = picked[np.isfinite(distance[picked])]
+        best_rows.append(picked + start)
+        best_distances.append(distance[picked])
+
+    positions = np.concatenate(best_rows)
+    distances = np.concatenate(best_distances)
+    order = np.argsort(distances, kind="stable")[:k]
+    return positions[order], distances[order]
@@ -0,0 +1,137 @@
+"""Cheap startup steps: a migration check that only loads Alembic when the
+database is behind, and an on-disk cache of the generated OpenAPI schema.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+import fastapi
+from sqlalchemy import create_engine, inspect, text
+
+from .database import DATABASE_URL
+
+try:
+    import fcntl
+except ImportError:  # Windows, a single worker doesn't need the lock
+    fcntl = None
+
+ROOT = Path(__file__).resolve().parent.parent
+ALEMBIC_INI = ROOT / "alembic.ini"
+VERSIONS_DIR = ROOT / "alembic" / "versions"
+LOCK_FILE = os.environ.get(
+    "MIGRATION_LOCK_FILE", os.path.join(tempfile.gettempdir(), "meal-migrations.lock")
+)
+OPENAPI_CACHE_DIR = os.environ.get("OPENAPI_CACHE_DIR", tempfile.gettempdir())
+
+_REVISION = re.compile(r"^(down_)?revision(?:\s*:[^=]+)?\s*=\s*(.+)$", re.MULTILINE)
+_REVISION_ID = re.compile(r"['\"](\w+)['\"]")
+
+
+def script_heads(directory: Path = VERSIONS_DIR) -> set:
+    """Head revisions of the migration scripts, read from the files as text
+    rather than through Alembic (which imports every script)
+    """
+    revisions, parents = set(), set()
+    for script in directory.glob("*.py"):
+        for down, value in _REVISION.findall(script.read_text(encoding="utf-8")):
+            (parents if down else revisions).update(_REVISION_ID.findall(value))
+    return revisions - parents
+
+
+def current_revisions(url: str = DATABASE_URL) -> set:
+    """Revisions stamped in the database's alembic_version table"""
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            if not inspect(conn).has_table("alembic_version"):
+                return set()
+            rows = conn.execute(text("SELECT version_num FROM alembic_version"))
+            return {row[0] for row in rows}
+    finally:
+        engine.dispose()
+
+
+def upgrade(url: str = DATABASE_URL):
+    """alembic upgrade head on `url`, importing Alembic only now. The app
+    migrates the database it serves (create_db_and_tables made its tables
+    there), not ALEMBIC_DB_URL, so the indexes are where the queries run.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    config.attributes["url"] = url
+    command.upgrade(config, "head")
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock across the processes of this host (all uvicorn workers)"""
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def migrate_if_needed(url: str = DATABASE_URL) -> bool:
+    """Upgrade to head unless the database is already there; True if it ran.
+    Workers starting together queue on a file lock and the ones after the
+    first find the database current.
+    """
+    heads = script_heads()
+    if heads and current_revisions(url) == heads:
+        return False
+    with file_lock(LOCK_FILE):
+        if heads and current_revisions(url) == heads:
+            return False
+        upgrade(url)
+        return True
+
+
+def _fingerprint(app) -> str:
+    """Changes with the routes and with the code that declares them"""
+    digest = hashlib.sha256(fastapi.__version__.encode())
+    for route in app.routes:
+        methods = sorted(getattr(route, "methods", None) or ())
+        digest.update(repr((getattr(route, "path", ""), methods)).encode())
+    for source in sorted([ROOT / "main.py", *(ROOT / "server").glob("*.py")]):
+        stat = source.stat()
+        digest.update(f"{source.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def cached_openapi(
+    app, build: Callable[[], dict], directory: Optional[str] = None
+) -> dict:
+    """The app's OpenAPI schema from disk when the routes and code are
+    unchanged, otherwise `build()` it and store it for the next worker.
+    An empty OPENAPI_CACHE_DIR turns the cache off.
+    """
+    directory = directory or OPENAPI_CACHE_DIR
+    if not directory:
+        return build()
+    path = Path(directory) / f"meal-openapi-{_fingerprint(app)}.json"
+    try:
+        return json.loads(path.read_bytes())
+    except (OSError, ValueError):
+        pass
+    schema = build()
+    try:
+        # written aside and renamed, readers never see half a file
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(schema), encoding="utf-8")
+        os.replace(temporary, path)
+    except OSError:
+        pass
+    return schema
@@ -0,0 +1,201 @@
+"""Engine settings per database backend, chosen by the STORAGE_PROFILE variable.
+
+`auto` (the default) picks the profile matching DATABASE_URL, `default`
+keeps SQLAlchemy's stock settings. Every setting of a profile can be
+overridden by its environment variable, see `from_env`.
+"""
+
+import os
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+
+def _is_memory(url: str) -> bool:
+    path = url.partition("://")[2].lstrip("/").partition("?")[0]
+    return path in ("", ":memory:") or "mode=memory" in url
+
+
+class StorageProfile:
+    """SQLAlchemy's defaults, only what the driver needs to work at all"""
+
+    name = "default"
+
+    def engine_options(self, url: str, is_async: bool) -> dict:
+        """Keyword arguments for create_engine/create_async_engine"""
+        return {"connect_args": _connect_args(url)}
+
+    def on_connect(self, dbapi_connection):
+        """Run on every new DBAPI connection"""
+
+    def configure(self, engine: Engine):
+        """Hook on_connect into a (sync) engine, `async_engine.sync_engine` too"""
+        if type(self).on_connect is not StorageProfile.on_connect:
+            event.listen(engine, "connect", lambda conn, _: self.on_connect(conn))
+
+    def stats(self) -> dict:
+        return {"profile": self.name}
+
+
+class SQLiteProfile(StorageProfile):
+    """WAL journaling so readers and the writer don't block each other,
+    synchronous=NORMAL (durable at checkpoints, safe under WAL), memory
+    mapped reads, a larger page cache per connection and a busy timeout
+    so a second writer waits for the lock instead of failing at once.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size: int = -64 * 1024,
+        busy_timeout: int = 5000,
+        pool_size: int = 8,
+        max_overflow: int = 8,
+        pool_timeout: float = 30,
+    ):
+        self.pragmas = {
+            "journal_mode": journal_mode,
+            "synchronous": synchronous,
+            "mmap_size": mmap_size,
+            "cache_size": cache_size,  # negative: KiB rather than pages
+            "busy_timeout": busy_timeout,
+        }
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+
+    @classmethod
+    def from_env(cls) -> "SQLiteProfile":
+        """Configured from the SQLITE_* and DB_POOL_* environment variables"""
+        env = os.environ.get
+        return cls(
+            journal_mode=env("SQLITE_JOURNAL_MODE", "WAL"),
+            synchronous=env("SQLITE_SYNCHRONOUS", "NORMAL"),
+            mmap_size=int(env("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+            cache_size=int(env("SQLITE_CACHE_SIZE", -64 * 1024)),
+            busy_timeout=int(env("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+            pool_size=int(env("DB_POOL_SIZE", 8)),
+            max_overflow=int(env("DB_MAX_OVERFLOW", 8)),
+            pool_timeout=float(env("DB_POOL_TIMEOUT", 30)),
+        )
+
+    def engine_options(self, url: str, is_async: bool) -> dict:
+        options = super().engine_options(url, is_async)
+        # the driver's own lock wait, in seconds, matching busy_timeout
+        options["connect_args"]["timeout"] = self.pragmas["busy_timeout"] / 1000
+        if not _is_memory(url):
+            # in-memory databases keep their single shared connection
+            options.update(
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout,
+            )
+        return options
+
+    def on_connect(self, dbapi_connection):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in self.pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        return {
+            "profile": self.name,
+            "pragmas": self.pragmas,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+        }
+
+
+class PostgresProfile(StorageProfile):
+    """A fixed pool with room to burst, connections checked before use and
+    recycled before server-side idle timeouts, and a statement timeout so a
+    runaway query can't hold a connection forever.
+    """
+
+    name = "postgres"
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        pool_timeout: float = 30,
+        pool_recycle: int = 1800,
+        pre_ping: bool = True,
+        statement_timeout_ms: int = 30_000,
+    ):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.pre_ping = pre_ping
+        self.statement_timeout_ms = statement_timeout_ms
+
+    @classmethod
+    def from_env(cls) -> "PostgresProfile":
+        """Configured from the DB_POOL_* and DB_STATEMENT_TIMEOUT_MS variables"""
+        env = os.environ.get
+        return cls(
+            pool_size=int(env("DB_POOL_SIZE", 10)),
+            max_overflow=int(env("DB_MAX_OVERFLOW", 20)),
+            pool_timeout=float(env("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=int(env("DB_POOL_RECYCLE", 1800)),
+            pre_ping=env("DB_POOL_PRE_PING", "true").lower() != "false",
+            statement_timeout_ms=int(env("DB_STATEMENT_TIMEOUT_MS", 30_000)),
+        )
+
+    def engine_options(self, url: str, is_async: bool) -> dict:
+        options = super().engine_options(url, is_async)
+        timeout = str(self.statement_timeout_ms)
+        if is_async:
+            # asyncpg sends these as startup parameters
+            options["connect_args"]["server_settings"] = {"statement_timeout": timeout}
+        else:
+            options["connect_args"]["options"] = f"-c statement_timeout={timeout}"
+        options.update(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=self.pre_ping,
+        )
+        return options
+
+    def stats(self) -> dict:
+        return {
+            "profile": self.name,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "statement_timeout_ms": self.statement_timeout_ms,
+        }
+
+
+PROFILES = {
+    "default": StorageProfile,
+    "sqlite": SQLiteProfile.from_env,
+    "postgres": PostgresProfile.from_env,
+}
+
+
+def storage_profile(url: str, name: Optional[str] = None) -> StorageProfile:
+    """The profile called `name` (default: STORAGE_PROFILE, else auto) for `url`"""
+    name = name or os.environ.get("STORAGE_PROFILE", "auto")
+    if name == "auto":
+        scheme = url.partition("://")[0].partition("+")[0]
+        name = {"postgresql": "postgres"}.get(scheme, scheme)
+        if name not in PROFILES:
+            name = "default"
+    if name not in PROFILES:
+        raise ValueError(f"STORAGE_PROFILE must be one of auto, {', '.join(PROFILES)}")
+    return PROFILES[name]()
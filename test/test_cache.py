@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from server.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" is now least recently used
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_expiry(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_memory_bound(self):
+        cache = TTLCache(maxsize=100, ttl=60, max_bytes=10, sizeof=lambda k, v: 4)
+        for i in range(5):
+            cache.set(i, i)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.bytes, 10)
+
+    def test_discard_where_and_counters(self):
+        cache = TTLCache()
+        cache.set("t1", {"user_id": "u1"})
+        cache.set("t2", {"user_id": "u1"})
+        cache.set("t3", {"user_id": "u2"})
+        self.assertEqual(cache.discard_where(lambda _, v: v["user_id"] == "u1"), 2)
+        self.assertIsNone(cache.get("t1"))
+        self.assertIsNotNone(cache.get("t3"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import gzip
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from server import compression
+from server.compression import CompressionMiddleware, RouteCompression, negotiate
+
+BODY = "food,calories\n" + "".join(f"food {i},{i}\n" for i in range(500))
+
+
+def make_app(**options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse(BODY)
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/quiet")
+    async def quiet():
+        return PlainTextResponse(BODY)
+
+    @app.get("/image")
+    async def image():
+        return PlainTextResponse(BODY, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(50):
+                yield f"row {i}\n" * 20
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    routes = {"/quiet": RouteCompression(enabled=False)}
+    app.add_middleware(CompressionMiddleware, routes=routes, **options)
+    return app
+
+
+class TestNegotiate(unittest.TestCase):
+    encodings = ("zstd", "br", "gzip")
+
+    def test_preference(self):
+        self.assertEqual(negotiate("gzip, br", self.encodings), "br")
+        self.assertEqual(negotiate("gzip;q=1, br;q=0.5", self.encodings), "gzip")
+        self.assertEqual(negotiate("deflate, gzip", ("gzip",)), "gzip")
+
+    def test_refused(self):
+        self.assertIsNone(negotiate("", self.encodings))
+        self.assertIsNone(negotiate("identity", self.encodings))
+        self.assertIsNone(negotiate("gzip;q=0", ("gzip",)))
+        self.assertIsNone(negotiate("*;q=0", self.encodings))
+
+    def test_wildcard(self):
+        self.assertEqual(negotiate("*", self.encodings), "zstd")
+        self.assertEqual(negotiate("zstd;q=0, *", self.encodings), "br")
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(make_app(encodings=("gzip",)))
+
+    def get(self, path: str, encoding: str = "gzip", method: str = "GET"):
+        return self.client.request(method, path, headers={"accept-encoding": encoding})
+
+    def test_compresses(self):
+        response = self.get("/big")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.text, BODY)
+
+    def test_passes_through(self):
+        for path, encoding in (
+            ("/small", "gzip"),  # under the minimum size
+            ("/big", "identity"),
+            ("/quiet", "gzip"),  # turned off for the route
+            ("/image", "gzip"),
+        ):
+            with self.subTest(path=path, encoding=encoding):
+                response = self.get(path, encoding)
+                self.assertNotIn("content-encoding", response.headers)
+                self.assertEqual(
+                    int(response.headers["content-length"]), len(response.content)
+                )
+        self.assertNotIn("content-encoding", self.get("/big", method="HEAD").headers)
+
+    def test_stream_compressed_as_it_goes(self):
+        app = make_app(encodings=("gzip",), minimum_size=100)
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/stream",
+            "raw_path": b"/stream",
+            "query_string": b"",
+            "headers": [(b"accept-encoding", b"gzip")],
+        }
+        messages = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(app(scope, receive, send))
+        start, *bodies = messages
+        self.assertIn((b"content-encoding", b"gzip"), start["headers"])
+        self.assertGreater(len(bodies), 40)  # a message per chunk, nothing held
+        self.assertTrue(all(body["body"] for body in bodies[:-1]))
+        data = gzip.decompress(b"".join(body["body"] for body in bodies))
+        self.assertEqual(data.decode(), "".join(f"row {i}\n" * 20 for i in range(50)))
+
+    @unittest.skipUnless(
+        compression.brotli and compression.zstandard, "brotli and zstandard"
+    )
+    def test_optional_encodings(self):
+        client = TestClient(make_app(encodings=("zstd", "br", "gzip")))
+        for encoding in ("zstd", "br"):
+            response = client.get("/stream", headers={"accept-encoding": encoding})
+            self.assertEqual(response.headers["content-encoding"], encoding)
+            self.assertTrue(response.text.startswith("row 0\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+import numpy as np
+
+from server.aggregates import nutrient_stats
+from server.matrix import NUMERIC_FIELDS, NutrientMatrix
+from server.similar import feature_scales, similar
+
+
+class TestNutrientMatrix(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        values = rng.lognormal(2, 1, (len(NUMERIC_FIELDS), 5000))
+        values[rng.random(values.shape) < 0.1] = np.nan
+        self.matrix = NutrientMatrix()
+        self.matrix.replace([f"{i:05d}" for i in range(5000)], values)
+
+    def brute_force(self, ranges: dict) -> list:
+        m = self.matrix
+        mask = m.alive[: m.size].copy()
+        for field, (low, high) in ranges.items():
+            values = m.values[m.column[field], : m.size]
+            if low is None and high is None:
+                mask &= ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return np.flatnonzero(mask).tolist()
+
+    def test_search_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        for _ in range(50):
+            fields = rng.choice(NUMERIC_FIELDS, size=rng.integers(1, 21), replace=False)
+            ranges = {}
+            for field in fields:
+                low, high = np.sort(rng.lognormal(2, 1, 2))
+                ranges[field] = (
+                    None if rng.random() < 0.2 else low,
+                    None if rng.random() < 0.2 else high,
+                )
+            with self.subTest(ranges=ranges):
+                self.assertEqual(
+                    self.matrix.search(ranges).tolist(), self.brute_force(ranges)
+                )
+
+    def test_writes(self):
+        m = self.matrix
+        m.upsert([{"food_id": "new", "iron": 1e6, "zinc": None}])
+        rows = m.search({"iron": (1e6, None)})
+        self.assertEqual(m.food_ids(rows), ["new"])
+        self.assertTrue(m.null[m.column["zinc"], rows[0]])
+
+        m.upsert([{"food_id": "new", "iron": 2.0}])
+        self.assertEqual(m.search({"iron": (1e6, None)}).tolist(), [])
+        m.discard("00000")
+        self.assertNotIn(0, m.search({"iron": (None, None)}).tolist())
+        self.assertEqual(m.stats()["foods"], 5000)
+
+    def test_similar_matches_brute_force(self):
+        m = self.matrix
+        fields = ("protein", "iron", "zinc", "sodium")
+        rows = [m.column[field] for field in fields]
+        scales = feature_scales(m)[rows]
+        density = m.values[rows, : m.size] / m.values[m.column["weight"], : m.size]
+        density /= scales[:, None]
+        for position in (0, 17, 4999):
+            query = density[:, position]
+            present = ~np.isnan(query)
+            diff = density[present] - query[present, None]
+            shared = (~np.isnan(diff)).sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                expected = np.nansum(diff**2, axis=0) * present.sum() / shared
+            expected = np.sqrt(expected)
+            expected[(shared < present.sum() / 2) | (shared == 0)] = np.inf
+            expected[position] = np.inf
+            with self.subTest(position=position):
+                found, distances = similar(m, position, 5, "euclidean", fields)
+                self.assertEqual(found.tolist(), np.argsort(expected)[:5].tolist())
+                np.testing.assert_allclose(distances, np.sort(expected)[:5])
+
+    def test_similar_skips_deleted_and_weightless(self):
+        m = self.matrix
+        m.upsert([{"food_id": "twin", **dict(zip(m.fields, m.values[:, 0]))}])
+        found, distances = similar(m, 0, 1)
+        self.assertEqual(m.food_ids(found), ["twin"])
+        self.assertAlmostEqual(distances[0], 0)
+        m.discard("twin")
+        self.assertNotIn("twin", m.food_ids(similar(m, 0, 10)[0]))
+        m.upsert([{"food_id": "light", "weight": 0, "protein": 1}])
+        self.assertIsNone(similar(m, m.index["light"], 10))
+
+    def test_stats_match_numpy(self):
+        m = self.matrix
+        rows = m.search({"calories": (5, 20)})
+        stats = nutrient_stats(m, rows, ("calories", "iron"), bins=5)
+        self.assertEqual(stats["foods"], len(rows))
+        for field in ("calories", "iron"):
+            values = m.values[m.column[field], rows]
+            present = values[~np.isnan(values)]
+            found = stats["fields"][field]
+            self.assertEqual(found["count"] + found["nulls"], len(rows))
+            self.assertEqual(found["count"], len(present))
+            self.assertAlmostEqual(found["mean"], present.mean())
+            self.assertAlmostEqual(found["percentiles"]["p50"], np.median(present))
+            self.assertEqual(sum(found["histogram"]["counts"]), len(present))
+        empty = nutrient_stats(m, np.empty(0, dtype=np.intp), ("iron",))
+        self.assertIsNone(empty["fields"]["iron"]["mean"])
+
+    def test_version_follows_writes(self):
+        m = self.matrix
+        versions = [m.version]
+        m.upsert([{"food_id": "new", "iron": 1.0}])
+        versions.append(m.version)
+        m.discard("new")
+        versions.append(m.version)
+        self.assertEqual(len(set(versions)), 3)
+
+    def test_snapshot_keeps_positions(self):
+        m = self.matrix
+        copy = m.snapshot(("weight", "iron"), ["00003", "missing"])
+        iron = m.values[m.column["iron"], : m.size].copy()
+        m.discard("00001")
+        m.upsert([{"food_id": "00002", "iron": 1e6}, {"food_id": "new"}])
+        m.replace(["other"], np.zeros((len(NUMERIC_FIELDS), 1)))
+        self.assertEqual(copy.size, 5000)
+        self.assertEqual(copy.food_ids([1, 2]), ["00001", "00002"])
+        np.testing.assert_array_equal(copy.values[copy.column["iron"]], iron)
+        self.assertTrue(copy.alive[1])
+        self.assertEqual(copy.index, {"00003": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from server.metrics import (
+    QUERY_SECONDS,
+    REQUEST_QUERIES,
+    Histogram,
+    MetricsMiddleware,
+    Registry,
+    instrument_engine,
+)
+
+
+class TestRegistry(unittest.TestCase):
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("latency", "Latency", ("route",), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, "/a")
+        lines = registry.render().splitlines()
+        self.assertEqual(
+            lines[:2], ["# HELP latency Latency", "# TYPE latency histogram"]
+        )
+        self.assertEqual(
+            lines[2:],
+            [
+                'latency_bucket{route="/a",le="0.1"} 2',
+                'latency_bucket{route="/a",le="1.0"} 3',
+                'latency_bucket{route="/a",le="+Inf"} 4',
+                'latency_sum{route="/a"} 3.65',
+                'latency_count{route="/a"} 4',
+            ],
+        )
+
+    def test_escaping_and_collectors(self):
+        registry = Registry()
+        registry.counter("hits", "Hits", ("name",)).inc('say "hi"\n')
+
+        @registry.collector("depth", "Queue depth")
+        def depth():
+            yield (), 3
+
+        text = registry.render()
+        self.assertIn('hits{name="say \\"hi\\"\\n"} 1', text)
+        self.assertIn("# TYPE depth gauge\ndepth 3", text)
+
+
+def series(histogram: Histogram, *labels) -> tuple:
+    counts, total = histogram._series.get(labels, ([0], 0.0))
+    return sum(counts), total
+
+
+class TestRequestMetrics(unittest.TestCase):
+    def test_queries_per_request(self):
+        path = os.path.join(tempfile.mkdtemp(), "metrics.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        instrument_engine(engine.sync_engine, "metrics-test")
+        app = FastAPI()
+
+        @app.get("/count/{n}")
+        async def count(n: int):
+            async with engine.connect() as conn:
+                for _ in range(n):
+                    await conn.execute(text("SELECT 1"))
+            return n
+
+        app.add_middleware(MetricsMiddleware)
+        with TestClient(app) as client:
+            client.get("/count/3")
+            client.get("/count/2")
+        asyncio.run(engine.dispose())
+
+        self.assertEqual(series(REQUEST_QUERIES, "GET", "/count/{n}"), (2, 5))
+        self.assertEqual(series(QUERY_SECONDS, "metrics-test", "SELECT")[0], 5)
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.database import StatsDB
+from server.popularity import Popularity, TopK
+
+
+class TestTopK(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        top = TopK(10)
+        counts = {}
+        for _ in range(5000):
+            key = f"food {rng.randrange(200)}"
+            counts[key] = counts.get(key, 0) + rng.randrange(1, 5)
+            top.update(key, counts[key])
+        # counts only grow, so the largest ten always made it in
+        expected = sorted(counts.items(), key=lambda i: (-i[1], i[0]))[:10]
+        self.assertEqual(top.top(10), expected)
+        self.assertLessEqual(len(top._heap), 4 * 10 + 64)
+
+    def test_discard(self):
+        top = TopK(2)
+        for key, count in (("a", 3), ("b", 2), ("c", 1)):
+            top.update(key, count)
+        self.assertEqual(top.top(5), [("a", 3), ("b", 2)])
+        top.discard("a")
+        top.update("c", 1)
+        self.assertEqual(top.top(5), [("b", 2), ("c", 1)])
+
+
+class TestPopularity(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "stats.db")
+        sync = create_engine(f"sqlite:///{path}")
+        StatsDB.__table__.create(sync)
+        sync.dispose()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        self.sessions = async_sessionmaker(self.engine, class_=AsyncSession)
+
+    def run_async(self, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await self.engine.dispose()
+
+        return asyncio.run(run())
+
+    def test_workers_add_up(self):
+        async def scenario():
+            one = Popularity(self.sessions, capacity=2)
+            two = Popularity(self.sessions, capacity=2, reload_interval=0)
+            for food_id, hits in (("a", 3), ("b", 1), ("c", 2)):
+                for _ in range(hits):
+                    one.hit(food_id)
+            await one.flush()
+            self.assertEqual(one.popular(5), [("a", 3), ("c", 2)])
+
+            for _ in range(4):
+                two.hit("b")
+            await two.flush()
+            # the upsert returned b's total of both workers
+            self.assertEqual(two.popular(1), [("b", 5)])
+            two.hit("c")
+            await two.flush()  # reloads first, a is only in the table
+            self.assertEqual(two.popular(2), [("b", 5), ("a", 3)])
+            self.assertEqual(two.flushed_hits, 5)
+
+        self.run_async(scenario())
+
+    def test_failed_flush_keeps_hits(self):
+        async def scenario():
+            popularity = Popularity(self.sessions)
+            popularity.hit("a")
+            popularity._upsert = broken
+            with self.assertRaises(RuntimeError):
+                await popularity.flush()
+            self.assertEqual(popularity.stats()["pending_hits"], 1)
+            self.assertEqual(popularity.failures, 1)
+
+        async def broken(hits):
+            raise RuntimeError("database is locked")
+
+        self.run_async(scenario())
+
+    def test_pending_is_capped(self):
+        async def scenario():
+            popularity = Popularity(self.sessions, max_pending=3)
+            popularity._upsert = broken
+            for batch in range(3):
+                for food_id in range(5):
+                    popularity.hit(f"food {batch} {food_id}")
+                with self.assertRaises(RuntimeError):
+                    await popularity.flush()
+            stats = popularity.stats()
+            self.assertEqual(stats["pending_foods"], 3)
+            self.assertEqual(stats["pending_hits"] + stats["dropped_hits"], 15)
+
+        async def broken(hits):
+            raise RuntimeError("database is locked")
+
+        self.run_async(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Checks that every filter combination of GET /api/food/get is index-backed.
+
+Runs against a throwaway SQLite database migrated to head. Set
+QUERY_PLAN_DATABASE_URL to a (sync) Postgres URL to check Postgres plans instead.
+"""
+
+import itertools
+import os
+import re
+import tempfile
+import unittest
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine, select
+
+from server.database import FoodDB
+from server.router import Food
+from server.search import FoodSearch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOUNDS = {
+    "min_calories": 100,
+    "max_calories": 500,
+    "min_protein": 10.0,
+    "max_protein": 40.0,
+    "min_carbohydrates": 5.0,
+    "max_carbohydrates": 60.0,
+}
+FOOD_TABLE = FoodDB.__tablename__
+
+
+def filter_combinations():
+    """Every combination of filters the endpoint can build, except no filter at all"""
+    for name in (None, "chicken"):
+        for n in range(len(BOUNDS) + 1):
+            for keys in itertools.combinations(BOUNDS, n):
+                if name or keys:
+                    yield name, {k: BOUNDS[k] for k in keys}
+
+
+class TestQueryPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        url = os.environ.get("QUERY_PLAN_DATABASE_URL")
+        if not url:
+            url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "plans.db")
+        cls.engine = create_engine(url)
+        SQLModel.metadata.create_all(cls.engine)
+
+        previous = os.environ.get("ALEMBIC_DB_URL")
+        os.environ["ALEMBIC_DB_URL"] = url
+        try:
+            config = Config(os.path.join(ROOT, "alembic.ini"))
+            config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+            command.upgrade(config, "head")
+        finally:
+            if previous is None:
+                del os.environ["ALEMBIC_DB_URL"]
+            else:
+                os.environ["ALEMBIC_DB_URL"] = previous
+        # pooled connections still hold the pre-migration schema
+        cls.engine.dispose()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def query_plan(self, query) -> list:
+        dialect = self.engine.dialect
+        sql = str(
+            query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        )
+        with self.engine.connect() as conn:
+            if dialect.name == "postgresql":
+                # tiny tables are always cheaper to scan, make the planner show its hand
+                conn.execute(text("SET enable_seqscan = off"))
+                return [row[0] for row in conn.execute(text("EXPLAIN " + sql))]
+            return [row[3] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+    def test_filters_use_indexes(self):
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            full_scan = re.compile(rf"Seq Scan on {FOOD_TABLE}\b")
+        else:
+            full_scan = re.compile(rf"^SCAN {FOOD_TABLE}\b")
+        for name, bounds in filter_combinations():
+            with self.subTest(name=name, **bounds):
+                query = select(FoodDB)
+                if name:
+                    query = FoodSearch.filter(query, name, dialect)
+                query = query.where(*Food.nutrient_filters(**bounds))
+                if not name:
+                    # keyset pages, as get_foodlist sends them
+                    query = query.order_by(Food.keyset_order(dialect, bool(bounds)))
+                query = query.limit(5)
+                plan = self.query_plan(query)
+                scans = [line for line in plan if full_scan.search(line)]
+                self.assertFalse(scans, f"full table scan in plan: {plan}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from server.errors import TooManyRequestsError, register_exceptions
+from server.ratelimit import (
+    Limit,
+    MemoryBuckets,
+    RateLimiter,
+    SQLiteBuckets,
+)
+
+
+class TestLimit(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(Limit.parse("20/60"), Limit(20, 60.0))
+        self.assertEqual(Limit.parse("5"), Limit(5, 60.0))
+        self.assertIsNone(Limit.parse("off"))
+        self.assertIsNone(Limit.parse("0/60"))
+
+
+class TestBuckets(unittest.TestCase):
+    limit = Limit(3, 30)  # a token every 10 s
+
+    def check_refill(self, store):
+        waits = [store.take("ip:1", self.limit, 1000.0) for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 10)
+        self.assertAlmostEqual(store.take("ip:1", self.limit, 1004.0), 6)
+        self.assertEqual(store.take("ip:1", self.limit, 1010.0), 0)
+        self.assertGreater(store.take("ip:1", self.limit, 1010.0), 0)
+        self.assertEqual(store.take("ip:2", self.limit, 1010.0), 0)
+
+    def test_memory(self):
+        self.check_refill(MemoryBuckets())
+
+    def test_memory_bounded(self):
+        store = MemoryBuckets(maxsize=2)
+        for key in ("a", "b", "c"):
+            store.take(key, self.limit, 0.0)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.evictions, 1)
+
+    def test_sqlite_shared(self):
+        path = os.path.join(tempfile.mkdtemp(), "buckets.db")
+        self.check_refill(SQLiteBuckets(path, MemoryBuckets()))
+        # another worker sees the same buckets
+        other = SQLiteBuckets(path, MemoryBuckets())
+        self.assertGreater(other.take("ip:1", self.limit, 1010.0), 0)
+        self.assertEqual(other.failures, 0)
+
+    def test_sqlite_unavailable(self):
+        path = os.path.join(tempfile.mkdtemp(), "missing", "buckets.db")
+        store = SQLiteBuckets(path, MemoryBuckets())
+        self.assertEqual(store.take("ip:1", self.limit, 0.0), 0)
+        self.assertEqual(store.failures, 1)
+        self.assertEqual(len(store.fallback), 1)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_rejected_before_handler(self):
+        limiter = RateLimiter({"login_ip": Limit(2, 60)})
+        calls = []
+        app = FastAPI()
+        register_exceptions(app)
+
+        async def limit():
+            limiter.check("login_ip", "127.0.0.1")
+
+        @app.post("/login", dependencies=[Depends(limit)])
+        async def login():
+            calls.append(1)
+            return "ok"
+
+        client = TestClient(app)
+        statuses = [client.post("/login").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(len(calls), 2)
+        resp = client.post("/login")
+        self.assertGreaterEqual(int(resp.headers["retry-after"]), 1)
+        self.assertEqual(limiter.rejected["login_ip"], 2)
+
+    def test_off(self):
+        limiter = RateLimiter({"signup_ip": None})
+        for _ in range(100):
+            limiter.check("signup_ip", "127.0.0.1")
+        self.assertEqual(limiter.rejected, {"signup_ip": 0})
+
+        limiter = RateLimiter({"signup_ip": Limit(1, 60)})
+        limiter.check("signup_ip", "127.0.0.1")
+        with self.assertRaises(TooManyRequestsError):
+            limiter.check("signup_ip", "127.0.0.1")
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import text
+from starlette.requests import Request
+
+from server.database import async_engine
+from server.replicas import STICKY_COOKIE, ReplicaSet
+
+
+def request_with_cookie(value: str) -> Request:
+    cookie = f"{STICKY_COOKIE}={value}".encode()
+    return Request({"type": "http", "headers": [(b"cookie", cookie)]})
+
+
+class TestReplicaSet(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "replica.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE marker (name TEXT)")
+            conn.execute("INSERT INTO marker VALUES ('replica')")
+        broken = os.path.join(directory, "missing", "replica.db")
+        self.replicas = ReplicaSet(
+            [f"sqlite:///{path}", f"sqlite:///{broken}"], retry_seconds=60
+        )
+
+    def tearDown(self):
+        asyncio.run(self.replicas.dispose())
+
+    def test_failover(self):
+        async def read(request=None):
+            async with self.replicas.session(request) as session:
+                if session.bind is async_engine:
+                    return "primary"
+                return (await session.exec(text("SELECT name FROM marker"))).scalar()
+
+        async def run():
+            # the broken replica falls back to the primary once, then sits out
+            first = [await read() for _ in range(2)]
+            later = [await read() for _ in range(3)]
+            return first, later
+
+        first, later = asyncio.run(run())
+        self.assertEqual(sorted(first), ["primary", "replica"])
+        self.assertEqual(later, ["replica"] * 3)
+        good, broken = self.replicas.stats()["replicas"]
+        self.assertTrue(good["healthy"])
+        self.assertFalse(broken["healthy"])
+        self.assertEqual(broken["failures"], 1)
+
+    def test_read_your_writes(self):
+        async def bind(request):
+            async with self.replicas.session(request) as session:
+                return session.bind
+
+        self.replicas.mark_down(self.replicas.replicas[1])
+        fresh = request_with_cookie(str(time.time() + 5))
+        stale = request_with_cookie(str(time.time() - 5))
+        self.assertIs(asyncio.run(bind(fresh)), async_engine)
+        self.assertIsNot(asyncio.run(bind(stale)), async_engine)
+        self.assertFalse(self.replicas.sticky(request_with_cookie("junk")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine, select
+
+from server import startup
+from server.database import FoodDB
+from server.search import FoodSearch
+
+
+class TestFoodSearch(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'search.db')}"
+        self.engine = create_engine(url)
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(
+                FoodDB.__table__.insert(),
+                [
+                    {"food_id": f"{i:03d}", "name": f"{kind} {i}"}
+                    for i, kind in enumerate(["apple pie", "cherry tart"] * 50)
+                ],
+            )
+        lock = os.path.join(directory, "migrations.lock")
+        with mock.patch.object(startup, "LOCK_FILE", lock):
+            startup.migrate_if_needed(url)
+        self.engine.dispose()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def search(self, name: str) -> set:
+        query = FoodSearch.filter(select(FoodDB.food_id, FoodDB.name), name, "sqlite")
+        with self.engine.connect() as conn:
+            return {tuple(row) for row in conn.execute(query)}
+
+    def test_matches_after_renumbering(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM testfood WHERE food_id < '040'"))
+            conn.execute(
+                text("UPDATE testfood SET name = 'apple crumble' WHERE food_id = '041'")
+            )
+            # new rowids for every food, as VACUUM or a table rebuild may give
+            conn.execute(text("UPDATE testfood SET rowid = 1000 - rowid"))
+        with self.engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+        self.assertEqual(
+            self.search("apple"),
+            {(f"{i:03d}", f"apple pie {i}") for i in range(40, 100, 2)}
+            | {("041", "apple crumble")},
+        )
+        self.assertEqual(self.search("cherry tart 41"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from server.database import FoodDB, UserDB
+from server.responses import FoodResponse, FoodResponses, UserResponse
+from server.serializers import (
+    FOOD_FIELDS,
+    encode,
+    entity_response,
+    food_payload,
+    list_response,
+    user_payload,
+)
+from server.models import FoodModel, UserModel
+
+
+def pydantic_body(model, content) -> bytes:
+    """The body FastAPI renders for `content` returned by a route with `model`"""
+    field = create_model_field(name="Response", type_=model, mode="serialization")
+    value = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(value).body
+
+
+def sample_food(**values) -> FoodDB:
+    food = FoodDB(**{field: float(i) for i, field in enumerate(FOOD_FIELDS)})
+    defaults = dict(
+        food_id="0f8fad5b-d9cb-469f-a165-70867728950e",
+        name='Crème "brûlée"\n\tΣ',
+        brand=None,
+        weight=100.0,
+        calories=250.0,
+        protein=1e-05,
+        total_fat=12.5,
+        sodium=1e16,
+        vitamin_c=0.1 + 0.2,
+    )
+    for k, v in {**defaults, **values}.items():
+        setattr(food, k, v)
+    return food
+
+
+class TestSerializers(unittest.TestCase):
+    def test_food_matches_response_model(self):
+        for food in (
+            sample_food(),
+            sample_food(protein=35.25, sodium=1e15),  # no exponents, all orjson
+        ):
+            expected = pydantic_body(
+                FoodResponse,
+                FoodResponse(data=FoodModel.model_validate(food.model_dump())),
+            )
+            body = entity_response(encode(food_payload(food))).body
+            self.assertEqual(body, expected)
+
+    def test_food_list_matches_response_model(self):
+        foods = [sample_food(), sample_food(brand="Acme", calories=None, protein=2.5)]
+        for cursor in (None, "eyJrIjoxfQ"):
+            expected = pydantic_body(
+                FoodResponses,
+                FoodResponses(
+                    data=[FoodModel.model_validate(f.model_dump()) for f in foods],
+                    next_cursor=cursor,
+                ),
+            )
+            body = list_response((encode(food_payload(f)) for f in foods), cursor)
+            self.assertEqual(body.body, expected)
+
+    def test_user_matches_response_model(self):
+        user = UserDB(
+            user_id="6ba7b810-9dad-11d1-80b4-00c04fd430c8",
+            username="ünï",
+            password="$argon2id$hash",
+            email="a@b.c",
+            first_name=None,
+            last_name="Doe",
+            is_admin=True,
+        )
+        public = UserModel.model_validate(user).model_dump(
+            exclude={"password", "is_admin"}
+        )
+        for payload, data in (
+            (user_payload(user, public=True), public),
+            (user_payload(user), UserModel.model_validate(user)),
+        ):
+            expected = pydantic_body(UserResponse, UserResponse(data=data))
+            self.assertEqual(entity_response(encode(payload)).body, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
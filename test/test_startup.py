@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, inspect
+
+from server import startup
+from server.database import FoodDB
+from server.search import FTS_TABLE
+
+
+class TestMigrationCheck(unittest.TestCase):
+    def test_heads(self):
+        self.assertEqual(startup.script_heads(), {"d6c557ec2a7e"})
+
+    def test_migrates_once(self):
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+        lock = os.path.join(directory, "migrations.lock")
+        with mock.patch.object(startup, "LOCK_FILE", lock), mock.patch.object(
+            startup, "upgrade"
+        ) as upgrade:
+            self.assertTrue(startup.migrate_if_needed(url))
+            upgrade.assert_called_once()
+        self.assertEqual(startup.current_revisions(url), set())
+
+    def test_migrates_the_given_database(self):
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'served.db')}"
+        engine = create_engine(url)
+        FoodDB.__table__.create(engine)
+        lock = os.path.join(directory, "migrations.lock")
+        with mock.patch.object(startup, "LOCK_FILE", lock), mock.patch.dict(
+            os.environ, {"ALEMBIC_DB_URL": f"sqlite:///{directory}/other.db"}
+        ):
+            self.assertTrue(startup.migrate_if_needed(url))
+        self.assertEqual(startup.current_revisions(url), startup.script_heads())
+        self.assertTrue(inspect(engine).has_table(FTS_TABLE))
+        engine.dispose()
+
+    def test_migrates_without_food_table(self):
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'empty.db')}"
+        lock = os.path.join(directory, "migrations.lock")
+        with mock.patch.object(startup, "LOCK_FILE", lock):
+            self.assertTrue(startup.migrate_if_needed(url))
+        self.assertEqual(startup.current_revisions(url), startup.script_heads())
+
+
+class TestOpenAPICache(unittest.TestCase):
+    def test_reused(self):
+        app = FastAPI()
+        app.get("/thing")(lambda: None)
+        directory = tempfile.mkdtemp()
+        build = mock.Mock(return_value={"openapi": "3.1.0"})
+        self.assertEqual(startup.cached_openapi(app, build, directory), build())
+        build.reset_mock()
+        self.assertEqual(
+            startup.cached_openapi(app, build, directory), {"openapi": "3.1.0"}
+        )
+        build.assert_not_called()
+
+        app.get("/other")(lambda: None)  # new routes, new schema
+        startup.cached_openapi(app, build, directory)
+        build.assert_called_once()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from server.storage import (
+    PostgresProfile,
+    SQLiteProfile,
+    StorageProfile,
+    storage_profile,
+)
+
+
+class TestStorageProfiles(unittest.TestCase):
+    def test_auto(self):
+        self.assertIsInstance(storage_profile("sqlite:///a.db", "auto"), SQLiteProfile)
+        self.assertIsInstance(
+            storage_profile("postgresql+psycopg2://h/db", "auto"), PostgresProfile
+        )
+        self.assertIs(type(storage_profile("mysql://h/db", "auto")), StorageProfile)
+        with self.assertRaises(ValueError):
+            storage_profile("sqlite:///a.db", "oracle")
+
+    def test_sqlite_pragmas(self):
+        path = os.path.join(tempfile.mkdtemp(), "profile.db")
+        url = f"sqlite:///{path}"
+        profile = SQLiteProfile(busy_timeout=1234)
+        engine = create_engine(url, **profile.engine_options(url, False))
+        profile.configure(engine)
+        with engine.connect() as conn:
+
+            def pragma(name):
+                return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+            self.assertEqual(pragma("journal_mode"), "wal")
+            self.assertEqual(pragma("busy_timeout"), 1234)
+            self.assertEqual(pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(engine.pool.size(), profile.pool_size)
+        engine.dispose()
+
+    def test_sqlite_memory_keeps_pool(self):
+        options = SQLiteProfile().engine_options("sqlite://", True)
+        self.assertNotIn("pool_size", options)
+
+    def test_postgres_statement_timeout(self):
+        profile = PostgresProfile(statement_timeout_ms=500)
+        options = profile.engine_options("postgresql+asyncpg://h/db", True)
+        settings = options["connect_args"]["server_settings"]
+        self.assertEqual(settings, {"statement_timeout": "500"})
+        self.assertTrue(options["pool_pre_ping"])
+        options = profile.engine_options("postgresql://h/db", False)
+        self.assertEqual(options["connect_args"]["options"], "-c statement_timeout=500")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import json
 import requests
 import unittest
 from uuid import uuid4
@@ -34,6 +35,25 @@ class TestAPI(unittest.TestCase):
         resp = resp.content
         self.assertEqual(resp, b'"pong"')
 
+    def test_status(self):
+        resp = requests.get(f"{baseUrl}/api/status")
+        self.assertEqual(resp.status_code, 200)
+        hashing = resp.json()["data"]["hashing"]
+        self.assertLessEqual(hashing["in_flight"], hashing["max_pending"])
+        self.assertIn("hit_ratio", resp.json()["data"]["auth_cache"])
+        self.assertIn("hit_ratio", resp.json()["data"]["food_cache"])
+
+    def test_metrics(self):
+        requests.get(f"{baseUrl}/api/ping")
+        resp = requests.get(f"{baseUrl}/api/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/plain"))
+        self.assertIn(
+            'meal_http_responses_total{method="GET",route="/api/ping",status="200"}',
+            resp.text,
+        )
+        self.assertIn('meal_db_pool_connections{engine="primary"', resp.text)
+
     def test_api(self):
         resp = requests.get(f"{baseUrl}/test")
         self.assertEqual(resp.status_code, 404)
@@ -102,6 +122,10 @@ class TestFood(unittest.TestCase):
         self.assertEqual(resp["food_id"], self.food_id)
         self.assertEqual(resp["weight"], 2)
 
+        # cached entity was refreshed by the update
+        resp = requests.get(f"{baseUrl}/api/food/get/{self.food_id}").json()
+        self.assertEqual(resp["data"]["weight"], 2)
+
     def _delete(self):
         jwt_code = TestUser.login(username, password)
         headers = {"Authorization": f"Bearer {jwt_code}"}
@@ -110,6 +134,321 @@ class TestFood(unittest.TestCase):
         ).json()
         self.assertEqual(resp["result"], "ok")
 
+        resp = requests.get(f"{baseUrl}/api/food/get/{self.food_id}")
+        self.assertEqual(resp.status_code, 404)
+
+
+class TestImport(unittest.TestCase):
+    timeout = 5
+
+    def test_import_ndjson(self):
+        jwt_code = TestUser.login(username, password)
+        headers = {"Authorization": f"Bearer {jwt_code}"}
+        food_id = str(uuid4())
+        body = "\n".join(
+            [
+                f'{{"food_id": "{food_id}", "name": "Imported", "calories": 10}}',
+                '{"name": "Broken", "calories": "lots"}',
+                "not json",
+            ]
+        )
+        resp = requests.post(
+            f"{baseUrl}/api/food/import",
+            params={"batch_size": 2},
+            data=body.encode(),
+            headers=headers,
+        ).json()
+        self.assertEqual(resp["result"], "ok")
+        self.assertEqual(resp["data"]["inserted"], 1)
+        self.assertEqual(resp["data"]["failed"], 2)
+        self.assertEqual([e["line"] for e in resp["data"]["errors"]], [2, 3])
+
+        resp = requests.get(f"{baseUrl}/api/food/get/{food_id}").json()
+        self.assertEqual(resp["data"]["name"], "Imported")
+
+    def test_export(self):
+        requests.post(f"{baseUrl}/api/food/add", json={"name": "Exported"})
+        with requests.get(f"{baseUrl}/api/food/export", stream=True) as resp:
+            self.assertEqual(resp.headers["content-type"], "application/x-ndjson")
+            rows = [json.loads(line) for line in resp.iter_lines() if line]
+        self.assertIn("Exported", [row["name"] for row in rows])
+
+        resp = requests.get(f"{baseUrl}/api/food/export", params={"format": "csv"})
+        header = resp.text.splitlines()[0].split(",")
+        self.assertEqual(header[:3], ["food_id", "name", "brand"])
+
+
+class TestPagination(unittest.TestCase):
+    timeout = 5
+
+    def test_food_cursor_pages(self):
+        created = set()
+        for i in range(3):
+            food_id = str(uuid4())
+            requests.post(
+                f"{baseUrl}/api/food/add",
+                json={"food_id": food_id, "name": f"Page food {i}", "brand": "Paged"},
+            )
+            created.add(food_id)
+
+        seen = []
+        params = {"limit": 1}
+        while True:
+            resp = requests.get(f"{baseUrl}/api/food/get", params=params).json()
+            self.assertEqual(resp["result"], "ok")
+            seen.extend(food["food_id"] for food in resp["data"])
+            if not resp["next_cursor"]:
+                break
+            params["cursor"] = resp["next_cursor"]
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen, sorted(seen))
+        self.assertTrue(created.issubset(seen))
+
+    def test_invalid_cursor(self):
+        resp = requests.get(f"{baseUrl}/api/food/get", params={"cursor": "%%%"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_invalid_limit(self):
+        for path in ("/api/food/get", "/api/user/get"):
+            for limit in (0, -1, 1001):
+                resp = requests.get(f"{baseUrl}{path}", params={"limit": limit})
+                self.assertEqual(resp.status_code, 422, (path, limit))
+
+    def test_negative_name_cursor(self):
+        # {"o": -5}, a forged offset into a name search
+        resp = requests.get(
+            f"{baseUrl}/api/food/get", params={"name": "food", "cursor": "eyJvIjotNX0"}
+        )
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestSparseFields(unittest.TestCase):
+    timeout = 5
+
+    def test_fields(self):
+        food_id = str(uuid4())
+        requests.post(
+            f"{baseUrl}/api/food/add",
+            json={"food_id": food_id, "name": "Sparse food", "brand": "Few", "iron": 2},
+        )
+        params = {"name": "Sparse food", "fields": "brand, name,calories"}
+        resp = requests.get(f"{baseUrl}/api/food/get", params=params).json()
+        self.assertEqual(
+            resp["data"][0],
+            {
+                "name": "Sparse food",
+                "food_id": food_id,
+                "brand": "Few",
+                "calories": None,
+            },
+        )
+
+        params = {"fields": "iron"}
+        for _ in range(2):  # read alone, then cut from the cached food
+            resp = requests.get(f"{baseUrl}/api/food/get/{food_id}", params=params)
+            self.assertEqual(resp.json()["data"], {"food_id": food_id, "iron": 2.0})
+
+    def test_unknown_field(self):
+        params = {"fields": "name,flavour"}
+        resp = requests.get(f"{baseUrl}/api/food/get", params=params)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("flavour", resp.text)
+
+
+class TestBatch(unittest.TestCase):
+    timeout = 5
+
+    def test_batch_keeps_order(self):
+        ids = [str(uuid4()) for _ in range(3)]
+        for i, food_id in enumerate(ids):
+            requests.post(
+                f"{baseUrl}/api/food/add",
+                json={"food_id": food_id, "name": f"Batch food {i}"},
+            )
+        missing = str(uuid4())
+        wanted = [ids[2], missing, ids[0], ids[1]]
+
+        resp = requests.get(f"{baseUrl}/api/food/batch", params={"food_id": wanted})
+        resp = resp.json()
+        self.assertEqual(resp["result"], "ok")
+        self.assertEqual(
+            [food and food["food_id"] for food in resp["data"]],
+            [ids[2], None, ids[0], ids[1]],
+        )
+        self.assertEqual(resp["not_found"], [missing])
+
+        resp = requests.post(
+            f"{baseUrl}/api/food/batch", json={"food_ids": wanted}
+        ).json()
+        self.assertEqual(resp["data"][3]["name"], "Batch food 1")
+        self.assertEqual(resp["not_found"], [missing])
+
+
+class TestNutrientSearch(unittest.TestCase):
+    timeout = 5
+
+    def search(self, **ranges):
+        return requests.post(f"{baseUrl}/api/food/search", json={"ranges": ranges})
+
+    def test_search_follows_writes(self):
+        food_id = str(uuid4())
+        requests.post(
+            f"{baseUrl}/api/food/add",
+            json={"food_id": food_id, "name": "Iron rich", "iron": 4321.5, "zinc": 7},
+        )
+        ranges = {"iron": {"min": 4321, "max": 4322}, "zinc": {"min": 7}}
+        resp = self.search(**ranges).json()
+        self.assertEqual(resp["result"], "ok")
+        self.assertIn(food_id, [food["food_id"] for food in resp["data"]])
+
+        requests.put(f"{baseUrl}/api/food/update/{food_id}", json={"iron": 1.0})
+        resp = self.search(**ranges)
+        ids = [food["food_id"] for food in resp.json().get("data", [])]
+        self.assertNotIn(food_id, ids)
+
+    def test_unknown_field(self):
+        resp = self.search(flavour={"min": 1})
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestNutrientStats(unittest.TestCase):
+    timeout = 5
+
+    def stats(self, **params):
+        return requests.get(f"{baseUrl}/api/food/stats", params=params)
+
+    def test_stats_follow_writes(self):
+        params = {"name": "Stats food", "fields": "iron", "bins": 2}
+        for iron in (1, 3):
+            requests.post(
+                f"{baseUrl}/api/food/add",
+                json={"name": f"Stats food {iron}", "iron": iron},
+            )
+        data = self.stats(**params).json()["data"]
+        self.assertEqual(data["foods"], 2)
+        self.assertEqual(data["fields"]["iron"]["mean"], 2)
+        self.assertEqual(data["fields"]["iron"]["histogram"]["counts"], [1, 1])
+        self.assertEqual(list(data["fields"]), ["iron"])
+
+        requests.post(f"{baseUrl}/api/food/add", json={"name": "Stats food 5"})
+        iron = self.stats(**params).json()["data"]["fields"]["iron"]
+        self.assertEqual((iron["count"], iron["nulls"]), (2, 1))
+
+    def test_unknown_field(self):
+        self.assertEqual(self.stats(fields="name").status_code, 400)
+
+    def test_name_matches_list(self):
+        for n in range(2):
+            requests.post(
+                f"{baseUrl}/api/food/add", json={"name": f"Normalized name {n}"}
+            )
+        name = "  NORMALIZED name "
+        listed = requests.get(
+            f"{baseUrl}/api/food/get", params={"name": name, "limit": 100}
+        ).json()["data"]
+        self.assertEqual(len(listed), 2)
+        self.assertEqual(self.stats(name=name).json()["data"]["foods"], len(listed))
+
+
+class TestPopularFoods(unittest.TestCase):
+    timeout = 5
+
+    def test_popular(self):
+        resp = requests.get(f"{baseUrl}/api/food/popular", params={"k": 5}).json()
+        self.assertEqual(resp["result"], "ok")
+        self.assertEqual(len(resp["hits"]), len(resp["data"]))
+        self.assertEqual(resp["hits"], sorted(resp["hits"], reverse=True))
+
+        resp = requests.get(f"{baseUrl}/api/food/popular", params={"k": 0})
+        self.assertEqual(resp.status_code, 422)
+
+
+class TestSimilarFoods(unittest.TestCase):
+    timeout = 5
+
+    def test_similar(self):
+        oats, half_oats, oil = str(uuid4()), str(uuid4()), str(uuid4())
+        for food_id, weight, calories, fat in (
+            (oats, 100, 380, 7),
+            (half_oats, 50, 190, 3.5),
+            (oil, 100, 884, 100),
+        ):
+            requests.post(
+                f"{baseUrl}/api/food/add",
+                json={
+                    "food_id": food_id,
+                    "name": "Similar",
+                    "weight": weight,
+                    "calories": calories,
+                    "total_fat": fat,
+                },
+            )
+        resp = requests.get(
+            f"{baseUrl}/api/food/similar/{oats}",
+            params={"k": 1, "features": "calories,total_fat"},
+        ).json()
+        self.assertEqual(resp["result"], "ok")
+        self.assertEqual([food["food_id"] for food in resp["data"]], [half_oats])
+        self.assertAlmostEqual(resp["distances"][0], 0)
+
+        resp = requests.get(
+            f"{baseUrl}/api/food/similar/{oats}", params={"features": "flavour"}
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = requests.get(f"{baseUrl}/api/food/similar/{uuid4()}")
+        self.assertEqual(resp.status_code, 404)
+
+
+class TestMealPlan(unittest.TestCase):
+    timeout = 5
+
+    def test_plan_totals(self):
+        full, partial = str(uuid4()), str(uuid4())
+        for food in (
+            {"food_id": full, "weight": 100, "calories": 200, "protein": 10},
+            {"food_id": partial, "weight": 50, "calories": 100, "protein": None},
+        ):
+            requests.post(f"{baseUrl}/api/food/add", json={"name": "Meal", **food})
+
+        plans = [[[full, 150], [partial, 25]], [], [["no-such-food", 10]]]
+        resp = requests.post(
+            f"{baseUrl}/api/food/plan/totals", json={"plans": plans}
+        ).json()
+        self.assertEqual(resp["result"], "ok")
+        first, empty, unknown = resp["data"]
+        self.assertEqual(first["grams"], 175)
+        self.assertEqual(first["totals"]["calories"], 350)
+        self.assertEqual(first["totals"]["protein"], 15)
+        self.assertIn("protein", first["missing"])
+        self.assertNotIn("calories", first["missing"])
+        self.assertEqual(empty["grams"], 0)
+        self.assertEqual(unknown["unknown_foods"], ["no-such-food"])
+
+    def test_optimize(self):
+        food_id = str(uuid4())
+        requests.post(
+            f"{baseUrl}/api/food/add",
+            json={"food_id": food_id, "name": "Rice", "weight": 100, "calories": 200},
+        )
+        body = {
+            "targets": {"calories": {"target": 300}},
+            "include": [food_id],
+            "max_items": 1,
+        }
+        resp = requests.post(f"{baseUrl}/api/food/plan/optimize", json=body).json()
+        self.assertEqual(resp["result"], "ok")
+        (food,) = resp["data"]["foods"]
+        self.assertEqual(food["food_id"], food_id)
+        self.assertAlmostEqual(food["grams"], 150, delta=1)
+        self.assertAlmostEqual(
+            resp["data"]["nutrients"]["calories"]["value"], 300, delta=1
+        )
+
+        body = {"targets": {"calories": {"target": 300}}, "include": ["no-such-food"]}
+        resp = requests.post(f"{baseUrl}/api/food/plan/optimize", json=body)
+        self.assertEqual(resp.status_code, 400)
+
 
 class TestUser(unittest.TestCase):
     user_id = str(uuid4())